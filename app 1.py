@@ -1,9 +1,14 @@
 import streamlit as st
-import json
+import os
 import random
+import threading
 import re
 from collections import Counter
 
+from journal import JournaledDict
+from song_index import TermStats
+from songbook import SongbookStore, ensure_packed
+
 # ------------------------------
 # 1. Konfiguracja i Style
 # ------------------------------
@@ -22,50 +27,102 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 ADMIN_PIN = "1234"
+SONGS_JSON = "songs.json"
+SONGS_PACK = "songs.pack"     # + songs.journal; eksport: python songbook.py unpack songs.pack songs.json
 
 # ------------------------------
 # 2. Funkcje danych
 # ------------------------------
-def load_json(filename, default):
+# każdy zapis (edycja, ocena, tag) dopisuje jedną linię do dziennika *.journal pod blokadą
+# pliku, a pełny plik jest przepisywany dopiero przy kompakcji dziennika; magazyny są
+# wspólne dla sesji procesu i przy rerunie doczytują tylko zmiany innych procesów
+@st.cache_resource
+def open_songbook():
+    # paczka powstaje z songs.json przy pierwszym starcie; rerun czyta tylko indeks tytułów,
+    # a piosenki dekoduje z mmap pojedynczo
+    if not os.path.exists(SONGS_PACK):
+        ensure_packed(SONGS_JSON, SONGS_PACK)
+    return SongbookStore(SONGS_PACK)
+
+def songs_json_mtime():
     try:
-        with open(filename, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except: return default
+        return os.path.getmtime(SONGS_JSON)
+    except OSError:
+        return None
+
+@st.cache_resource(max_entries=1)
+def pack_from_json(json_mtime, _book):
+    # przebudowa paczki, gdy songs.json jest nowszy (np. po import_word.py) — sprawdzana po zmianie
+    # jego mtime; zmiany z aplikacji, które przebudowa by zastąpiła, zostają w kopii (ścieżka albo None)
+    return ensure_packed(SONGS_JSON, SONGS_PACK, _book)
+
+@st.cache_resource
+def open_ratings():
+    return JournaledDict("ratings.json")
 
-def save_json(filename, data):
-    with open(filename, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+@st.cache_resource
+def open_user_tags():
+    return JournaledDict("user_tags.json")
 
-songs = load_json("songs.json", [])
-ratings = load_json("ratings.json", {}) 
-user_tags = load_json("user_tags.json", {})
+@st.cache_resource(max_entries=1)
+def get_search_texts(revision):
+    # tytuł i tekst małymi literami, dekodowane dopiero przy pierwszym wyszukiwaniu
+    # i ponownie tylko po zmianie śpiewnika (nowa `revision`)
+    texts = []
+    for s in open_songbook():
+        texts.append((s["title"].lower(), " ".join([l["text"] for l in s["lyrics"]]).lower()))
+    return texts
+
+book = open_songbook()
+pack_backup = pack_from_json(songs_json_mtime(), book)
+ratings = open_ratings()
+user_tags = open_user_tags()
+for store in (book, ratings, user_tags):
+    store.refresh()
+titles = book.titles()
+if "seen_backups" not in st.session_state: st.session_state.seen_backups = set()
+if pack_backup and pack_backup not in st.session_state.seen_backups:
+    st.session_state.seen_backups.add(pack_backup)
+    st.warning(f"Śpiewnik zbudowano od nowa z nowszego {SONGS_JSON}. Wcześniejsze zmiany z aplikacji "
+               f"są w kopii {pack_backup} — eksport: python songbook.py unpack {pack_backup}")
 
 # ------------------------------
 # 3. Logika Analizy
 # ------------------------------
-STOPWORDS = {"się", "i", "w", "z", "na", "do", "że", "o", "a", "to", "jak", "nie", "co", "mnie", "mi", "ci", "za", "ale", "bo", "jest", "tylko", "przez", "jeszcze", "kiedy"}
+@st.cache_resource
+def open_term_stats():
+    # jedne statystyki słów na proces, pod kluczami z book.keys()
+    return TermStats(), threading.Lock()
+
+def get_term_stats():
+    # po zmianie śpiewnika przeliczane są tylko piosenki dodane, zmienione i usunięte
+    stats, lock = open_term_stats()
+    with lock, book.lock:
+        keys = book.keys()
+        current = set(keys)
+        for key in [k for k in stats.vectors if k not in current]:
+            stats.remove_song(key)
+        for i, key in enumerate(keys):
+            if key not in stats.vectors:
+                stats.add_song(key, book.get(i))
+    return stats
 
-def get_keywords(songs_list, source="lyrics", limit=8):
-    all_words = []
-    for s in songs_list:
-        text = " ".join([l["text"] for l in s["lyrics"] if "<br>" not in l["text"]]).lower() if source == "lyrics" else s["title"].lower()
-        words = re.findall(r'\b\w{4,}\b', text)
-        all_words.extend([w for w in words if w not in STOPWORDS])
-    most_common = Counter(all_words).most_common(30)
+def get_keywords(source="lyrics", limit=8):
+    most_common = get_term_stats().top(source, 30)
     return random.sample(most_common, min(limit, len(most_common))) if most_common else []
 
 # ------------------------------
 # 4. Stan aplikacji
 # ------------------------------
 if "current_idx" not in st.session_state:
-    st.session_state.current_idx = random.randint(0, len(songs) - 1) if songs else 0
+    st.session_state.current_idx = random.randint(0, len(book) - 1) if len(book) else 0
 if "transposition" not in st.session_state: st.session_state.transposition = 0
-if "kw_lyrics" not in st.session_state: st.session_state.kw_lyrics = get_keywords(songs, "lyrics")
-if "kw_titles" not in st.session_state: st.session_state.kw_titles = get_keywords(songs, "title")
+if "kw_lyrics" not in st.session_state: st.session_state.kw_lyrics = get_keywords("lyrics")
+if "kw_titles" not in st.session_state: st.session_state.kw_titles = get_keywords("title")
 
 def set_song_by_idx(idx):
-    if songs:
-        st.session_state.current_idx = idx % len(songs)
+    if len(book):
+        st.session_state.current_idx = idx % len(book)
         st.session_state.transposition = 0
 
 # ------------------------------
@@ -73,21 +130,21 @@ def set_song_by_idx(idx):
 # ------------------------------
 with st.sidebar:
     st.title("📂 Biblioteka")
-    st.info(f"Piosenek w bazie: **{len(songs)}**")
+    st.info(f"Piosenek w bazie: **{len(book)}**")
     
     query = st.text_input("🔍 Szukaj piosenki:").lower()
     if query:
-        found = [i for i, s in enumerate(songs) if query in (s["title"] + " " + " ".join([l["text"] for l in s["lyrics"]])).lower()]
+        found = [i for i, (t, l) in enumerate(get_search_texts(book.revision)) if query in t + " " + l]
         if found:
-            sel = st.selectbox("Wyniki:", [songs[i]['title'] for i in found])
-            if st.button("Pokaż"): set_song_by_idx(found[[songs[i]['title'] for i in found].index(sel)]); st.rerun()
+            sel = st.selectbox("Wyniki:", [titles[i] for i in found])
+            if st.button("Pokaż"): set_song_by_idx(found[[titles[i] for i in found].index(sel)]); st.rerun()
 
     st.markdown("---")
 
     # 1. Chmura TAGÓW UŻYTKOWNIKA
     st.subheader("⭐ Twoje Tagi")
     all_user_tags = []
-    for tags in user_tags.values():
+    for tags in user_tags.data.values():
         all_user_tags.extend(tags)
     
     if all_user_tags:
@@ -96,7 +153,7 @@ with st.sidebar:
         for i, (tag, count) in enumerate(common_user_tags):
             if (c_u1 if i % 2 == 0 else c_u2).button(f"{tag}", key=f"side_ut_{tag}", use_container_width=True):
                 # Szukamy piosenek, które mają ten tag
-                matches = [j for j, s in enumerate(songs) if tag in user_tags.get(s["title"], [])]
+                matches = [j for j, t in enumerate(titles) if tag in user_tags.get(t, [])]
                 if matches:
                     set_song_by_idx(random.choice(matches))
                     st.rerun()
@@ -108,7 +165,7 @@ with st.sidebar:
     c1, c2 = st.columns(2)
     for i, (w, c) in enumerate(st.session_state.kw_lyrics):
         if (c1 if i%2==0 else c2).button(f"#{w}", key=f"side_l_{w}", use_container_width=True):
-            matches = [j for j, s in enumerate(songs) if w in " ".join([l["text"] for l in s["lyrics"]]).lower()]
+            matches = [j for j, (t, l) in enumerate(get_search_texts(book.revision)) if w in l]
             set_song_by_idx(random.choice(matches)); st.rerun()
 
     # 3. Chmura z TYTUŁÓW
@@ -116,27 +173,28 @@ with st.sidebar:
     c3, c4 = st.columns(2)
     for i, (w, c) in enumerate(st.session_state.kw_titles):
         if (c3 if i%2==0 else c4).button(f"{w.capitalize()}", key=f"side_t_{w}", use_container_width=True):
-            matches = [j for j, s in enumerate(songs) if w in s["title"].lower()]
+            matches = [j for j, t in enumerate(titles) if w in t.lower()]
             set_song_by_idx(random.choice(matches)); st.rerun()
     
     if st.button("🔄 Odśwież chmury", key="refresh_sidebar"):
-        st.session_state.kw_lyrics = get_keywords(songs, "lyrics")
-        st.session_state.kw_titles = get_keywords(songs, "title")
+        st.session_state.kw_lyrics = get_keywords("lyrics")
+        st.session_state.kw_titles = get_keywords("title")
         st.rerun()
 
 # ------------------------------
 # 6. NAGŁÓWEK
 # ------------------------------
-if not songs: st.stop()
-song = songs[st.session_state.current_idx]
+if not len(book): st.stop()
+st.session_state.current_idx %= len(book)
+song = book.get(st.session_state.current_idx)
 
 h_col1, h_col2, h_col3 = st.columns([1.5, 3.5, 1.5])
 with h_col1:
     c_n1, c_n2, c_n3, c_n4 = st.columns(4)
-    if c_n1.button("🎲"): set_song_by_idx(random.randint(0, len(songs)-1)); st.rerun()
+    if c_n1.button("🎲"): set_song_by_idx(random.randint(0, len(book)-1)); st.rerun()
     if c_n2.button("⬅️"): set_song_by_idx(st.session_state.current_idx-1); st.rerun()
     if c_n3.button("➡️"): set_song_by_idx(st.session_state.current_idx+1); st.rerun()
-    if c_n4.button("🆕"): set_song_by_idx(len(songs)-1); st.rerun()
+    if c_n4.button("🆕"): set_song_by_idx(len(book)-1); st.rerun()
 with h_col2:
     st.markdown(f'<p class="song-title">{song["title"]}</p>', unsafe_allow_html=True)
 with h_col3:
@@ -181,8 +239,10 @@ with r_col1:
     st.write(f"Ocena: **{avg:.1f}** ⭐ ({stats['count']} gł.)")
     score = st.radio("Twoja ocena:", [1,2,3,4,5], horizontal=True, key=f"vote_radio_{st.session_state.current_idx}")
     if st.button("Zatwierdź ocenę", key="btn_vote"):
-        stats["sum"] += score; stats["count"] += 1; ratings[song["title"]] = stats
-        save_json("ratings.json", ratings); st.rerun()
+        # suma liczona pod blokadą na najnowszym stanie — głosy z innych procesów nie giną
+        ratings.update(song["title"], lambda s: {"sum": s["sum"] + score, "count": s["count"] + 1},
+                       {"sum": 0, "count": 0})
+        st.rerun()
 with r_col2:
     st.write("Tagi:")
     current_ut = user_tags.get(song["title"], [])
@@ -190,8 +250,8 @@ with r_col2:
     nt = st.text_input("Dodaj tag:", key=f"input_tag_{st.session_state.current_idx}")
     if st.button("Zapisz tag", key="btn_tag"):
         if nt and nt not in current_ut:
-            current_ut.append(nt); user_tags[song["title"]] = current_ut
-            save_json("user_tags.json", user_tags); st.rerun()
+            user_tags.update(song["title"], lambda tags: None if nt in tags else tags + [nt], [])
+            st.rerun()
 
 # ------------------------------
 # 9. PANEL ZARZĄDZANIA
@@ -209,17 +269,17 @@ with st.expander("🛠️ PANEL ZARZĄDZANIA"):
                     new_lyrics.append({"text": p[0].strip(), "chords": p[1].strip().split()})
                 else:
                     new_lyrics.append({"text": line.strip(), "chords": []})
-            songs[st.session_state.current_idx]["lyrics"] = new_lyrics
-            save_json("songs.json", songs); st.success("Zapisano!"); st.rerun()
+            song["lyrics"] = new_lyrics
+            book.put(st.session_state.current_idx, song, title=song["title"])
+            st.success("Zapisano!"); st.rerun()
     with tab2:
         n_t = st.text_input("Tytuł nowej piosenki:", key="new_title")
         n_l = st.text_area("Tekst | Akordy:", height=200, key="new_content")
         if st.button("Dodaj piosenkę", key="btn_add_song"):
             parsed = [{"text": p.split("|")[0].strip(), "chords": p.split("|")[1].strip().split()} if "|" in p else {"text": p.strip(), "chords": []} for p in n_l.split("\n")]
-            songs.append({"title": n_t, "lyrics": parsed})
-            save_json("songs.json", songs); st.rerun()
+            book.add({"title": n_t, "lyrics": parsed}); st.rerun()
     with tab3:
         pin = st.text_input("PIN administratora:", type="password", key="admin_pin")
         if pin == ADMIN_PIN:
             if st.button("POTWIERDŹ USUNIĘCIE", key="btn_delete"):
-                songs.pop(st.session_state.current_idx); save_json("songs.json", songs); st.rerun()
\ No newline at end of file
+                book.delete(st.session_state.current_idx, title=song["title"]); st.rerun()
\ No newline at end of file
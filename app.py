@@ -1,177 +1,228 @@
 import streamlit as st
-import gspread
-from google.oauth2.service_account import Credentials
 import json
 import random
-import re
-from collections import Counter
 import urllib.parse
 import requests
-import base64
+import streamlit.components.v1 as components
+import os
+import time
+
+from chords import chord_html
+from catalog import CatalogPlaylist, Playlist, SharedCatalog, parse_song_row, song_to_row
+from sheet_sync import SheetSync, open_worksheet
+from render_cache import RenderCache
+from snapshot import SnapshotStore
+from storage import SQLiteStorage
+from publish import GitHubPublisher, encode_catalog
 
 # ─────────────────────────────────────────────
 #  POŁĄCZENIE Z GOOGLE SHEETS
 # ─────────────────────────────────────────────
 
 def init_gsheet():
-    try:
-        if "gcp_service_account" in st.secrets:
-            creds = Credentials.from_service_account_info(
-                st.secrets["gcp_service_account"],
-                scopes=["https://www.googleapis.com/auth/spreadsheets"],
-            )
-            client = gspread.authorize(creds)
-            return client.open_by_key("1RG82ZtUZfNsOjXI7xHKDnwbnDUl2SwE5oDLMNJNYdkw").worksheet("Songs")
-        else:
-            st.error("Brak konfiguracji 'gcp_service_account' w secrets.toml")
-            return None
-    except Exception as e:
-        st.error(f"Błąd połączenia z Google Sheets: {e}")
-        return None
-
-ws = init_gsheet()
-
-# ─────────────────────────────────────────────
-#  FUNKCJA WYPYCHAJĄCA PLIK DO GITHUB API
-# ─────────────────────────────────────────────
-def push_json_to_github(json_content_str):
-    GITHUB_TOKEN = st.secrets.get("github_token", "TWÓJ_TOKEN_GITHUB")
-    GITHUB_REPO = st.secrets.get("github_repo", "TWOJ_LOGIN/TWOJE_REPO")
-    GITHUB_FILE_PATH = "songs.json"
-    
-    url = f"https://api.github.com/repos/{GITHUB_REPO}/contents/{GITHUB_FILE_PATH}"
-    headers = {
-        "Authorization": f"token {GITHUB_TOKEN}",
-        "Accept": "application/vnd.github.v3+json"
-    }
-    
-    sha = None
-    res = requests.get(url, headers=headers)
-    if res.status_code == 200:
-        sha = res.json().get("sha")
-        
-    message = "Aktualizacja bazy utworów via Streamlit"
-    content_b64 = base64.b64encode(json_content_str.encode('utf-8')).decode('utf-8')
-    
-    payload = {
-        "message": message,
-        "content": content_b64
-    }
-    if sha:
-        payload["sha"] = sha
-        
-    put_res = requests.put(url, headers=headers, json=payload)
-    return put_res.status_code in [200, 201], put_res.text
+    """Funkcja otwierająca arkusz albo None, gdy brak konfiguracji — bez łączenia się z Google."""
+    if "gcp_service_account" in st.secrets:
+        info = dict(st.secrets["gcp_service_account"])
+        return lambda: open_worksheet(info)
+    st.error("Brak konfiguracji 'gcp_service_account' w secrets.toml")
+    return None
 
 # ─────────────────────────────────────────────
 #  LOGIKA BIZNESOWA
 # ─────────────────────────────────────────────
 
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+SHEET_CHECK_INTERVAL = 60
+SNAPSHOT_PATH = os.path.join(APP_DIR, "songs_snapshot.json")
+
+# Magazyn danych wybierany w secrets.toml: storage = "sheets" (domyślnie) albo "sqlite".
+# Baza SQLite przy pierwszym uruchomieniu wczytuje migawkę katalogu albo songs.json.
+STORAGE_BACKEND = st.secrets.get("storage", "sheets")
+SQLITE_PATH = st.secrets.get("sqlite_path", os.path.join(APP_DIR, "spiewnik.db"))
+
+RENDER_CACHE_SIZE = 256
+PUBLISH_STATE_PATH = os.path.join(APP_DIR, "publish_state.json")
+
+@st.cache_resource(show_spinner=False)
+def get_snapshot_store():
+    return SnapshotStore(SNAPSHOT_PATH)
+
+@st.cache_resource(show_spinner=False)
+def get_publisher():
+    """Publikacja songs.json na GitHubie; pamięta skrót ostatnio wysłanej treści."""
+    return GitHubPublisher(
+        st.secrets.get("github_repo", "TWOJ_LOGIN/TWOJE_REPO"),
+        st.secrets.get("github_token", "TWÓJ_TOKEN_GITHUB"),
+        state_path=PUBLISH_STATE_PATH,
+    )
+
+@st.cache_resource(show_spinner=False)
+def get_render_cache():
+    """Wyrenderowany HTML piosenek (id, wersja, transpozycja) wspólny dla wszystkich sesji."""
+    return RenderCache(RENDER_CACHE_SIZE)
+
+def open_sqlite_storage(path):
+    storage = SQLiteStorage(path)
+    if not len(storage):
+        seed = get_snapshot_store().load()
+        if seed is None and os.path.exists(os.path.join(APP_DIR, "songs.json")):
+            with open(os.path.join(APP_DIR, "songs.json"), "r", encoding="utf-8") as f:
+                seed = json.load(f)
+        if seed:
+            storage.import_songs(seed)
+    return storage
+
+@st.cache_resource(show_spinner=False)
+def get_storage():
+    """Wspólny dla wszystkich sesji magazyn piosenek (arkusz odświeżany w tle albo SQLite)."""
+    if STORAGE_BACKEND == "sqlite":
+        return open_sqlite_storage(SQLITE_PATH)
+    connect = init_gsheet()
+    if not connect:
+        return None
+    sync = SheetSync(connect)
+    sync.start_background(SHEET_CHECK_INTERVAL)
+    return sync
+
 @st.cache_data(ttl=120, show_spinner=False)
 def load_songs_cached():
-    """Ładuje piosenki z cache'em 2 minuty — szybkie przełączanie bez callów API."""
-    if not ws:
+    """Ładuje piosenki z cache'em 2 minuty — po wygaśnięciu pobiera z arkusza tylko zmienione wiersze."""
+    storage = get_storage()
+    if not storage:
         return []
     try:
-        rows = ws.get_all_values()
-        if not rows or len(rows) < 2:
-            return []
-        songs = []
-        for i, row in enumerate(rows[1:], start=2):
-            if len(row) >= 2 and row[0].strip():
-                title = row[0].strip()
-                lyrics_raw = row[1].strip() if len(row) > 1 else ""
-                ratings_sum = int(row[2]) if len(row) > 2 and row[2].isdigit() else 0
-                ratings_count = int(row[3]) if len(row) > 3 and row[3].isdigit() else 0
-                tags_raw = row[4].strip() if len(row) > 4 else ""
-                lyrics = []
-                if lyrics_raw.startswith("["):
-                    try:
-                        for item in json.loads(lyrics_raw):
-                            if isinstance(item, dict):
-                                chords = item.get("chords", [])
-                                if isinstance(chords, str):
-                                    chords = chords.split()
-                                lyrics.append({"text": item.get("text", "").strip(), "chords": chords})
-                    except Exception:
-                        lyrics.append({"text": lyrics_raw, "chords": []})
-                else:
-                    for line in lyrics_raw.split("\n"):
-                        if "|" in line:
-                            parts = line.split("|", 1)
-                            lyrics.append({"text": parts[0].strip(), "chords": parts[1].strip().split() if parts[1].strip() else []})
-                        else:
-                            lyrics.append({"text": line.strip(), "chords": []})
-                songs.append({
-                    "title": title,
-                    "lyrics": lyrics,
-                    "ratings_sum": ratings_sum,
-                    "ratings_count": ratings_count,
-                    "tags": [t.strip() for t in tags_raw.split(",") if t.strip()],
-                    "row": i,
-                })
-        return songs
+        return storage.load()
     except Exception as e:
         st.error(f"Błąd podczas ładowania piosenek: {e}")
         return []
 
+@st.cache_resource(show_spinner=False)
+def get_shared_catalog():
+    """Jeden sparsowany katalog z indeksami dla wszystkich sesji; sesja trzyma tylko id i playlistę.
+
+    Przy zimnym starcie katalog pochodzi z migawki na dysku, a arkusz wczytuje wątek
+    w tle (reconcile_with_storage naniesie różnice). Bez migawki czekamy na arkusz.
+    """
+    storage = get_storage()
+    shift_rows = storage.SHIFTS_ROWS if storage else True
+    songs = get_snapshot_store().load()
+    if songs is not None:
+        return SharedCatalog(songs, shift_rows=shift_rows)
+    songs = load_songs_cached()
+    shared = SharedCatalog(songs, shift_rows=shift_rows)
+    if songs:
+        get_snapshot_store().save(songs, shared.version)
+    return shared
+
+def save_snapshot_soon(force=False):
+    """Odkłada ostatni dobry katalog na dysk — tylko gdy pochodzi z wczytanego magazynu."""
+    storage = get_storage()
+    if not storage or not storage.loaded:
+        return
+    shared = get_shared_catalog()
+    catalog = shared.catalog
+    store = get_snapshot_store()
+    if force:
+        store.save(list(catalog.values()), catalog.version)
+    else:
+        store.maybe_save(catalog.version, lambda: list(catalog.values()))
+
+def fix_session_view():
+    """Po zmianie wspólnego katalogu poprawia playlistę i bieżącą piosenkę tej sesji."""
+    catalog = get_shared_catalog().catalog
+    if st.session_state.get("catalog_version") == catalog.version:
+        return
+    pl = st.session_state.get("playlist")
+    if pl is not None:
+        st.session_state.playlist = pl.restricted_to(catalog)
+    if "current_id" in st.session_state and st.session_state.current_id not in catalog:
+        st.session_state.current_id = catalog.ids()[0] if catalog else None
+    st.session_state.catalog_version = catalog.version
+
 def reload_songs():
     """Czyści cache i przeładowuje piosenki, ZACHOWUJĄC bieżącą playlistę/filtr."""
     load_songs_cached.clear()
-    st.session_state.songs = load_songs_cached()
-    if "playlist" not in st.session_state:
-        st.session_state.playlist = list(range(len(st.session_state.songs)))
-        st.session_state.playlist_name = "Wszystkie"
-
-def save_song_to_sheets(row_idx, title, lyrics, ratings_sum, ratings_count, tags):
-    if not ws:
+    get_shared_catalog().replace_all(load_songs_cached())
+    fix_session_view()
+    save_snapshot_soon(force=True)
+
+# ── Zmiany lokalne: wspólny katalog poprawiany od razu zamiast przeładowania ──
+
+def add_song_local(song):
+    return get_shared_catalog().add_song(song)
+
+def replace_song_local(sid, song):
+    get_shared_catalog().replace_song(sid, song)
+
+def remove_song_local(sid):
+    get_shared_catalog().remove_song(sid)
+    get_render_cache().invalidate(sid)
+    fix_session_view()
+
+def reconcile_with_storage():
+    """Uzgadnia wspólny katalog z magazynem, gdy ten się zmienił (zapisy, wątek w tle, inny proces)."""
+    storage = get_storage()
+    shared = get_shared_catalog()
+    # przed pierwszym odczytem arkusza (start z migawki) nie ma z czym uzgadniać
+    if storage and storage.loaded and storage.revision != shared.storage_revision:
+        shared.reconcile(*storage.snapshot())
+    fix_session_view()
+    save_snapshot_soon()
+
+def save_song_to_storage(row_idx, title, lyrics, ratings_sum, ratings_count, tags):
+    storage = get_storage()
+    if not storage:
         return False
     try:
-        lyrics_str = "\n".join([f"{l['text']} | {' '.join(l.get('chords', []))}" for l in lyrics])
-        ws.update([[title, lyrics_str, str(ratings_sum), str(ratings_count), ", ".join(tags)]], f"A{row_idx}:E{row_idx}", raw=False)
+        storage.upsert({"title": title, "lyrics": lyrics, "ratings_sum": ratings_sum,
+                        "ratings_count": ratings_count, "tags": tags}, row_idx)
         return True
     except Exception as e:
         st.error(f"Błąd podczas zapisywania: {e}")
         return False
 
-def add_song_to_sheets(title, lyrics, ratings_sum=0, ratings_count=0, tags=None):
+def add_song_to_storage(title, lyrics, ratings_sum=0, ratings_count=0, tags=None):
+    """Dopisuje piosenkę do magazynu; zwraca jej klucz (numer wiersza / id) albo False."""
     if tags is None:
         tags = []
-    if not ws:
+    storage = get_storage()
+    if not storage:
         return False
     try:
-        lyrics_str = "\n".join([f"{l['text']} | {' '.join(l.get('chords', []))}" for l in lyrics])
-        ws.append_row([title, lyrics_str, str(ratings_sum), str(ratings_count), ", ".join(tags)])
-        return True
+        return storage.upsert({"title": title, "lyrics": lyrics, "ratings_sum": ratings_sum,
+                               "ratings_count": ratings_count, "tags": tags})
     except Exception as e:
         st.error(f"Błąd podczas dodawania piosenki: {e}")
         return False
 
-def delete_song_from_sheets(row_idx):
-    if not ws:
+def delete_song_from_storage(row_idx):
+    storage = get_storage()
+    if not storage:
         return False
     try:
-        ws.delete_rows(row_idx)
+        storage.delete(row_idx)
         return True
     except Exception as e:
         st.error(f"Błąd podczas usuwania: {e}")
         return False
 
 def update_song_tags(row_idx, tags):
-    if not ws:
+    storage = get_storage()
+    if not storage:
         return False
     try:
-        ws.update([[", ".join(tags)]], f"E{row_idx}")
+        storage.update_tags(row_idx, tags)
         return True
     except Exception as e:
         st.error(f"Błąd podczas aktualizacji tagów: {e}")
         return False
 
 def update_song_ratings(row_idx, ratings_sum, ratings_count):
-    if not ws:
+    storage = get_storage()
+    if not storage:
         return False
     try:
-        ws.update([[str(ratings_sum), str(ratings_count)]], f"C{row_idx}")
+        storage.update_ratings(row_idx, ratings_sum, ratings_count)
         return True
     except Exception as e:
         st.error(f"Błąd podczas aktualizacji ocen: {e}")
@@ -185,6 +236,8 @@ st.set_page_config(layout="wide", page_title="Śpiewnik", initial_sidebar_state=
 
 ADMIN_PIN = "1234"
 
+SEARCH_TOP_K = 12
+
 RATING_TAGS = {
     1: ["Nie lubię", "Nie graj", "Żenada", "Pomiń", "Trudne", "Słabe", "Nudne"],
     2: ["Później", "Kiedyś", "Nie teraz", "Ćwiczyć", "Średnie", "Zapomnij"],
@@ -193,7 +246,8 @@ RATING_TAGS = {
     5: ["HIT", "Koniecznie", "Ulubiona", "TOP", "Mistrz", "Hymn", "Wszyscy", "Legenda"],
 }
 
-STOPWORDS = {"się","i","w","z","na","do","że","o","a","to","jak","nie","co","mnie","mi","ci","za","ale","bo","jest","tylko","przez","jeszcze","kiedy","już","dla","od","ten","ta"}
+# waga słów w chmurach: "count" — liczba wystąpień, "tfidf" — słowa charakterystyczne dla części piosenek
+KEYWORD_WEIGHTING = st.secrets.get("keyword_weighting", "tfidf")
 
 # ─────────────────────────────────────────────
 #  CSS
@@ -257,6 +311,44 @@ st.markdown("""
         font-size: 16px;
     }
 
+    .tr-bar {
+        display: flex;
+        justify-content: center;
+        align-items: center;
+        gap: 8px;
+        margin-bottom: 6px;
+        font-size: 13px;
+        opacity: 0.85;
+    }
+    .tr-bar select, .tr-bar button {
+        background-color: var(--secondary-background-color);
+        color: var(--text-color);
+        border: 1px solid rgba(255,75,75,0.4);
+        border-radius: 8px;
+        padding: 2px 8px;
+        font-size: 13px;
+        cursor: pointer;
+    }
+
+    .pg-bar {
+        display: flex;
+        justify-content: center;
+        gap: 10px;
+        margin-bottom: 8px;
+    }
+    .pg-bar button {
+        background-color: var(--secondary-background-color);
+        color: var(--text-color);
+        border: 1px solid rgba(255,75,75,0.4);
+        border-radius: 8px;
+        padding: 4px 18px;
+        font-size: 16px;
+        cursor: pointer;
+    }
+    .st-key-pg_sync { display: none; }
+    body.pg-swapped .st-key-pg_sync { display: block; }
+    body.pg-swapped [data-testid="stExpander"]:has(.st-key-nav_prev) { display: none; }
+
     div.stButton > button { border-radius: 8px; transition: all 0.2s; }
 
     .nav-btn div.stButton > button {
@@ -292,69 +384,85 @@ st.markdown("""
 #  HELPERS & NAWIGACJA Z PLAYLISTĄ
 # ─────────────────────────────────────────────
 
-def get_keywords(songs_list, source="lyrics", limit=40):
-    all_words = []
-    for s in songs_list:
-        text = (" ".join([l["text"] for l in s["lyrics"]]) if source == "lyrics" else s["title"]).lower()
-        all_words.extend([w for w in re.findall(r'\b\w{4,}\b', text) if w not in STOPWORDS])
-    return Counter(all_words).most_common(limit)
+def get_keywords(shared, source="lyrics", limit=40):
+    return shared.keywords(source, limit, KEYWORD_WEIGHTING)
 
-def get_most_common_tags(songs, limit=10):
-    c = Counter(t for s in songs for t in s.get("tags", []))
-    return [t[0] for t in c.most_common(limit)]
+def get_most_common_tags(shared, limit=10):
+    return [t for t, _ in shared.most_common_tags(limit)]
 
-def get_most_visited_songs(songs, limit=10):
-    return sorted([s for s in songs if s["ratings_count"] > 0], key=lambda x: x["ratings_count"], reverse=True)[:limit]
+def get_most_visited_songs(shared, limit=10):
+    """Id najczęściej ocenianych piosenek."""
+    return shared.top_songs("count", limit)
 
-def get_recommended_songs_rotational(songs, limit=5):
-    if not songs:
+def get_top_rated_songs(shared, limit=10):
+    """Id najlepiej ocenianych piosenek (średnia bayesowska — jeden głos nie wystarczy do czołówki)."""
+    return shared.top_songs("score", limit)
+
+def get_recommended_songs_rotational(catalog, limit=5):
+    """Id losowych poleceń: trochę ocenionych, trochę nieodkrytych, reszta dowolna."""
+    if not catalog:
         return []
     neg = set(RATING_TAGS.get(1, []))
-    rated_safe = [s for s in songs if s["ratings_count"] > 0 and not any(t in neg for t in s.get("tags", []))]
-    unexplored = [s for s in songs if s["ratings_count"] == 0 and not s.get("tags")]
+    rated_safe = [sid for sid, s in catalog.items() if s["ratings_count"] > 0 and not any(t in neg for t in s.get("tags", []))]
+    unexplored = [sid for sid, s in catalog.items() if s["ratings_count"] == 0 and not s.get("tags")]
     selection = []
     selection.extend(random.sample(rated_safe, min(2, len(rated_safe))))
     selection.extend(random.sample(unexplored, min(2, len(unexplored))))
     needed = max(0, (limit - 1) - len(selection))
-    remaining = [s for s in songs if s not in selection]
+    chosen = set(selection)
+    remaining = [sid for sid in catalog.ids() if sid not in chosen]
     selection.extend(random.sample(remaining, min(needed, len(remaining))))
-    if songs:
-        selection.append(random.choice(songs))
+    selection.append(random.choice(catalog.ids()))
     random.shuffle(selection)
     return selection[:limit]
 
-def set_song_by_idx(idx, keep_playlist=False):
-    if st.session_state.songs:
-        st.session_state.current_idx = idx % len(st.session_state.songs)
+def set_song_by_id(sid, keep_playlist=False):
+    shared = get_shared_catalog()
+    if sid in shared.catalog:
+        st.session_state.current_id = sid
         st.session_state.transposition = 0
+        for param in ("tr", "song"):
+            if param in st.query_params:
+                del st.query_params[param]
         if not keep_playlist:
-            st.session_state.playlist = list(range(len(st.session_state.songs)))
-            st.session_state.playlist_name = "Wszystkie"
+            st.session_state.playlist = CatalogPlaylist(shared)
+
+def set_playlist(ids, name):
+    """Ustawia aktywny filtr i przechodzi do jego pierwszej piosenki."""
+    if ids:
+        st.session_state.playlist = Playlist(ids, name)
+        set_song_by_id(st.session_state.playlist.first_id(), keep_playlist=True)
+
+def set_song_tags(sid, new_tags):
+    """Zapisuje nowe tagi piosenki i aktualizuje indeks tagów o samą różnicę."""
+    shared = get_shared_catalog()
+    song = shared.catalog[sid]
+    new_tags = [t.strip() for t in new_tags if t.strip()]
+    if not update_song_tags(song["row"], new_tags):
+        return False
+    shared.patch_song(sid, tags=new_tags)
+    return True
+
+def rate_song(sid, value):
+    """Dodaje ocenę piosenki: zapis do kolejki arkusza i od razu we wspólnym katalogu."""
+    shared = get_shared_catalog()
+    song = shared.catalog[sid]
+    new_sum, new_count = song["ratings_sum"] + value, song["ratings_count"] + 1
+    if not update_song_ratings(song["row"], new_sum, new_count):
+        return False
+    shared.patch_song(sid, ratings_sum=new_sum, ratings_count=new_count)
+    return True
 
 def go_next_song():
     pl = st.session_state.playlist
-    curr = st.session_state.current_idx
-    try:
-        pl_idx = pl.index(curr)
-        next_idx = pl[(pl_idx + 1) % len(pl)]
-    except ValueError:
-        next_idx = pl[0] if pl else 0
-    set_song_by_idx(next_idx, keep_playlist=True)
+    set_song_by_id(pl.next_id(st.session_state.current_id), keep_playlist=True)
 
 def go_prev_song():
     pl = st.session_state.playlist
-    curr = st.session_state.current_idx
-    try:
-        pl_idx = pl.index(curr)
-        prev_idx = pl[(pl_idx - 1) % len(pl)]
-    except ValueError:
-        prev_idx = pl[-1] if pl else 0
-    set_song_by_idx(prev_idx, keep_playlist=True)
+    set_song_by_id(pl.prev_id(st.session_state.current_id), keep_playlist=True)
 
 def go_rand_song():
-    pl = st.session_state.playlist
-    if pl:
-        set_song_by_idx(random.choice(pl), keep_playlist=True)
+    set_song_by_id(st.session_state.playlist.random_id(), keep_playlist=True)
 
 # ─────────────────────────────────────────────
 #  RENDEROWANIE TAGÓW / CHMURY
@@ -398,49 +506,28 @@ def render_compact_tags(items, key_prefix, on_click_action, limit=None):
     st.markdown('</div>', unsafe_allow_html=True)
 
 # ─────────────────────────────────────────────
-#  TRANSPOZYCJA
+#  WIDOK PIOSENKI (akordy i transpozycja: chords.py)
 # ─────────────────────────────────────────────
 
-_NOTES_MAJ = ["C","Cis","D","Dis","E","F","Fis","G","Gis","A","B","H"]
-_NOTES_MIN = ["c","cis","d","dis","e","f","fis","g","gis","a","b","h"]
-_ALIASES_MAJ = {"Ais": "B", "Es": "Dis", "As": "Gis", "Des": "Cis", "Ges": "Fis", "Ces": "H"}
-_ALIASES_MIN = {"ais": "b", "es": "dis", "as": "gis", "des": "cis", "ges": "fis", "ces": "h"}
-
-def _normalize_base(base):
-    if base in _ALIASES_MAJ: return _ALIASES_MAJ[base]
-    if base in _ALIASES_MIN: return _ALIASES_MIN[base]
-    return base
-
-def transpose_chord(chord, steps):
-    if steps == 0:
-        return chord
-    m = re.match(r"^([A-H][a-z]*|[a-h][a-z]*)(.*)$", chord)
-    if m:
-        base, suffix = m.groups()
-        base_norm = _normalize_base(base)
-        if base_norm in _NOTES_MAJ:
-            return _NOTES_MAJ[(_NOTES_MAJ.index(base_norm) + steps) % 12] + suffix
-        if base_norm in _NOTES_MIN:
-            return _NOTES_MIN[(_NOTES_MIN.index(base_norm) + steps) % 12] + suffix
-    return chord
-
-def get_first_chord(song):
-    for line in song.get("lyrics", []):
-        for c in line.get("chords", []):
-            if c.strip():
-                return c.strip()
-    return None
-
-def chord_to_index(chord):
-    m = re.match(r"^([A-H][a-z]*|[a-h][a-z]*)", chord)
-    if not m:
-        return None
-    base_norm = _normalize_base(m.group(1))
-    if base_norm in _NOTES_MAJ: return _NOTES_MAJ.index(base_norm)
-    if base_norm in _NOTES_MIN: return _NOTES_MIN.index(base_norm)
-    return None
-
-def build_song_html(song, transposition):
+SCALE_LABELS = ["C","Cis","D","Dis","E","F","Fis","G","Gis","A","B (=Ais)","H"]
+
+def build_transpose_bar(sid, first_idx, transposition):
+    """Wybór akordu startowego obsługiwany w przeglądarce (TRANSPOSE_JS) — bez reruna."""
+    current = (first_idx + transposition) % 12
+    options = "".join(
+        f'<option value="{i}"{" selected" if i == current else ""}>{label}</option>'
+        for i, label in enumerate(SCALE_LABELS)
+    )
+    return (
+        f'<div class="tr-bar" id="tr-bar" data-song="{sid}" data-base="{first_idx}" data-steps="{transposition}">'
+        f'<span>Tonacja (oryginał {SCALE_LABELS[first_idx]}):</span>'
+        f'<select>{options}</select>'
+        f'<span class="tr-info">{transposition:+d} pół.</span>'
+        f'<button type="button" class="tr-reset">↺</button>'
+        f'</div>'
+    )
+
+def build_song_html(sid, song, song_chords, transposition):
     lines = []
     lines.append(f'<div class="song-title">{song["title"]}</div>')
 
@@ -452,14 +539,15 @@ def build_song_html(song, transposition):
         tags_html += '</div>'
         lines.append(tags_html)
 
+    if song_chords.key is not None:
+        lines.append(build_transpose_bar(sid, song_chords.key, transposition))
+
     lines.append('<hr style="margin: 5px 0 12px 0; opacity: 0.2;">')
     lines.append('<div class="song-container" id="song-container">')
-    for l in song["lyrics"]:
-        text = l["text"].strip()
-        orig_chords = l.get("chords", [])
-        transposed = [transpose_chord(c, transposition) for c in orig_chords]
-        c_str = " ".join(transposed)
-        if text or orig_chords:
+    for l, line_chords in zip(song["lyrics"], song_chords.lines):
+        text = l["text"]
+        c_str = " ".join(chord_html(c, transposition) for c in line_chords)
+        if text or line_chords:
             lines.append(
                 f'<div class="song-row">'
                 f'<div class="lyrics-col">{text or "&nbsp;"}</div>'
@@ -471,42 +559,197 @@ def build_song_html(song, transposition):
     lines.append('</div>')
     return "\n".join(lines)
 
+# Transpozycja po stronie przeglądarki: skrypt z niewidocznego komponentu podpina się
+# raz pod dokument aplikacji (delegacja zdarzeń przeżywa podmianę widoku piosenki)
+# i przelicza akordy z atrybutów data-* (chords.chord_html). Wybrane przesunięcie
+# trafia do adresu jako ?tr=<id>:<kroki>, a serwer odczytuje je przy najbliższym rerunie.
+TRANSPOSE_JS = """
+<script>
+(function () {
+  const w = window.parent, d = w.document;
+  if (w.__spiewnikTranspose) return;
+  w.__spiewnikTranspose = true;
+  const MAJ = ["C","Cis","D","Dis","E","F","Fis","G","Gis","A","B","H"];
+  const MIN = ["c","cis","d","dis","e","f","fis","g","gis","a","b","h"];
+  const name = (p, m) => (m ? MIN : MAJ)[((p % 12) + 12) % 12];
+  function apply(bar, steps) {
+    bar.dataset.steps = steps;
+    d.querySelectorAll("#song-container .ch").forEach(function (el) {
+      if (steps % 12 === 0 && el.dataset.t !== undefined) {
+        el.textContent = el.dataset.t;
+        return;
+      }
+      let t = name(+el.dataset.r + steps, el.dataset.m === "1") + el.dataset.s;
+      if (el.dataset.b !== undefined) t += "/" + name(+el.dataset.b + steps, el.dataset.bm === "1");
+      el.textContent = t;
+    });
+    bar.querySelector("select").value = String(((+bar.dataset.base + steps) % 12 + 12) % 12);
+    bar.querySelector(".tr-info").textContent = (steps > 0 ? "+" : "") + steps + " pół.";
+    const url = new URL(w.location.href);
+    if (steps) url.searchParams.set("tr", bar.dataset.song + ":" + steps);
+    else url.searchParams.delete("tr");
+    w.history.replaceState(w.history.state, "", url);
+  }
+  d.addEventListener("change", function (e) {
+    const bar = e.target.closest && e.target.closest("#tr-bar");
+    if (!bar || e.target.tagName !== "SELECT") return;
+    let steps = ((+e.target.value - +bar.dataset.base) % 12 + 12) % 12;
+    if (steps > 6) steps -= 12;
+    apply(bar, steps);
+  });
+  d.addEventListener("click", function (e) {
+    const btn = e.target.closest && e.target.closest("#tr-bar .tr-reset");
+    if (btn) apply(btn.closest("#tr-bar"), 0);
+  });
+})();
+</script>
+"""
+
+# Przeglądanie bez serwera: przy każdym renderze komponent dostaje gotowy HTML kilku
+# sąsiadów bieżącej piosenki w aktywnej playliście i kilku losowych z niej. Przyciski
+# paska #pg-bar podmieniają widok na miejscu i zapisują wybór w adresie (?song=<id>);
+# gdy cel nie był pobrany zawczasu, klikają zwykłe przyciski Wstecz / Dalej / Losowa.
+# Panel sterowania dotyczy piosenki z ostatniego renderu serwera, więc po podmianie
+# na inną jest chowany (klasa pg-swapped), a przycisk pg_sync przeładowuje go dla
+# piosenki z adresu.
+PREFETCH_NEIGHBOURS = 2
+PREFETCH_RANDOM = 3
+
+PAGING_BAR = (
+    '<div class="pg-bar" id="pg-bar">'
+    '<button type="button" data-go="prev" title="Wstecz">⬅️</button>'
+    '<button type="button" data-go="rand" title="Losowa">🎲</button>'
+    '<button type="button" data-go="next" title="Dalej">➡️</button>'
+    '</div>'
+)
+
+PAGING_JS = """
+<script>
+(function () {
+  const w = window.parent, d = w.document;
+  w.__spiewnikPages = __PAGES__;
+  w.__spiewnikCurrent = String(w.__spiewnikPages.current);
+  d.body.classList.remove("pg-swapped");
+  if (w.__spiewnikPaging) return;
+  w.__spiewnikPaging = true;
+  const FALLBACK = {prev: "nav_prev", next: "nav_next", rand: "nav_rand"};
+  function show(id) {
+    const page = w.__spiewnikPages.pages[id], view = d.getElementById("song-view");
+    if (!page || !view) return false;
+    view.innerHTML = page.html;
+    w.__spiewnikCurrent = id;
+    d.body.classList.toggle("pg-swapped", id !== String(w.__spiewnikPages.current));
+    const url = new URL(w.location.href);
+    url.searchParams.set("song", id);
+    url.searchParams.delete("tr");
+    w.history.replaceState(w.history.state, "", url);
+    d.getElementById("pg-bar").scrollIntoView({block: "start"});
+    return true;
+  }
+  d.addEventListener("click", function (e) {
+    const btn = e.target.closest && e.target.closest("#pg-bar button");
+    if (!btn) return;
+    const data = w.__spiewnikPages, cur = data.pages[w.__spiewnikCurrent], go = btn.dataset.go;
+    let target = null;
+    if (go === "rand") {
+      const pool = data.pool.map(String).filter(function (id) { return id !== w.__spiewnikCurrent; });
+      if (pool.length) target = pool[Math.floor(Math.random() * pool.length)];
+    } else if (cur && cur[go] !== null) {
+      target = String(cur[go]);
+    }
+    if (target === null || !show(target)) {
+      const fallback = d.querySelector(".st-key-" + FALLBACK[go] + " button");
+      if (fallback) fallback.click();
+    }
+  });
+})();
+</script>
+"""
+
+def render_song(sid, transposition=0):
+    """HTML piosenki z bieżącej migawki katalogu, przez wspólny cache renderów."""
+    song = catalog[sid]
+    song_chords = shared.song_chords(sid, song)
+    return get_render_cache().get(
+        sid, catalog.song_version[sid], transposition,
+        lambda: build_song_html(sid, song, song_chords, transposition),
+    )
+
+def build_page_data(current_id, transposition):
+    """Strony do przeglądania w przeglądarce: bieżąca, sąsiedzi w playliście i próbka losowych."""
+    pl = st.session_state.playlist
+    ids = [current_id]
+    prev_id = next_id = current_id
+    for _ in range(PREFETCH_NEIGHBOURS):
+        next_id, prev_id = pl.next_id(next_id), pl.prev_id(prev_id)
+        ids += [next_id, prev_id]
+    pool = random.sample(pl.ids, min(PREFETCH_RANDOM, len(pl)))
+    pages = {}
+    for sid in ids + pool:
+        if sid is None or sid in pages or sid not in catalog:
+            continue
+        pages[sid] = {
+            "html": render_song(sid, transposition if sid == current_id else 0),
+            "prev": pl.prev_id(sid),
+            "next": pl.next_id(sid),
+        }
+    return {"current": current_id, "pages": pages, "pool": [sid for sid in pool if sid in pages]}
+
+def paging_script(data):
+    # "</" w danych zamknąłby znacznik <script>
+    return PAGING_JS.replace("__PAGES__", json.dumps(data, ensure_ascii=False).replace("</", "<\\/"))
+
+def sync_song_from_url():
+    """Przenosi do sesji piosenkę wybraną w przeglądarce (?song=<id>); playlista zostaje bez zmian."""
+    raw = st.query_params.get("song")
+    if raw and raw.isdigit() and int(raw) in catalog and int(raw) != st.session_state.current_id:
+        st.session_state.current_id = int(raw)
+        st.session_state.transposition = 0
+
+def is_panel_song(sid):
+    """Czy panel sterowania renderowany dla `sid` dotyczy piosenki, którą widać w przeglądarce."""
+    raw = st.query_params.get("song")
+    return sid == st.session_state.current_id and (not raw or raw == str(sid))
+
+def sync_transposition_from_url():
+    """Przenosi do sesji transpozycję ustawioną w przeglądarce (?tr=<id>:<kroki>), jeśli dotyczy bieżącej piosenki."""
+    raw = st.query_params.get("tr")
+    if not raw:
+        return
+    sid, _, steps = raw.partition(":")
+    if sid == str(st.session_state.current_id) and steps.lstrip("-").isdigit():
+        st.session_state.transposition = int(steps)
+
 # ─────────────────────────────────────────────
 #  STATE
 # ─────────────────────────────────────────────
 
-if "songs" not in st.session_state:
-    st.session_state.songs = load_songs_cached()
+shared = get_shared_catalog()
+reconcile_with_storage()
+catalog = shared.catalog     # niezmienna migawka na ten rerun
 
 if "playlist" not in st.session_state:
-    if st.session_state.songs:
-        st.session_state.playlist = list(range(len(st.session_state.songs)))
-    else:
-        st.session_state.playlist = []
-    st.session_state.playlist_name = "Wszystkie"
+    st.session_state.playlist = CatalogPlaylist(shared)
 
-if "current_idx" not in st.session_state:
-    st.session_state.current_idx = random.randint(0, max(0, len(st.session_state.songs) - 1)) if st.session_state.songs else 0
+if "current_id" not in st.session_state:
+    st.session_state.current_id = st.session_state.playlist.random_id()
 
 if "transposition" not in st.session_state:
     st.session_state.transposition = 0
 
-if "kw_lyrics" not in st.session_state:
-    st.session_state.kw_lyrics = get_keywords(st.session_state.songs, "lyrics")
+sync_song_from_url()
+sync_transposition_from_url()
 
-if "kw_titles" not in st.session_state:
-    st.session_state.kw_titles = get_keywords(st.session_state.songs, "title")
+# chmury słów: odczyt rankingu ze statystyk słów aktualizowanych przy każdej zmianie tekstu
+kw_lyrics = get_keywords(shared, "lyrics")
+kw_titles = get_keywords(shared, "title")
 
 if "random_sample" not in st.session_state:
-    st.session_state.random_sample = get_recommended_songs_rotational(st.session_state.songs, limit=5)
+    st.session_state.random_sample = get_recommended_songs_rotational(catalog, limit=5)
 
 if "tag" in st.query_params:
     tag = st.query_params.get("tag")
-    matches = [j for j, s in enumerate(st.session_state.songs) if tag in s.get("tags", [])]
-    if matches:
-        st.session_state.playlist = matches
-        st.session_state.playlist_name = f"Tag: {tag}"
-        set_song_by_idx(matches[0], keep_playlist=True)
+    set_playlist(shared.songs_with_tag(tag), f"Tag: {tag}")
     st.query_params.clear()
     st.rerun()
 
@@ -519,25 +762,19 @@ with st.sidebar:
 
     query = st.text_input("Szukaj:", placeholder="Tytuł lub tekst...", key="main_search_input").lower()
     if query:
-        found = [i for i, s in enumerate(st.session_state.songs)
-                 if query in (s["title"] + " " + " ".join(l["text"] for l in s["lyrics"])).lower()]
+        found = [sid for sid, _ in shared.search(query, k=SEARCH_TOP_K)]
         if found:
-            for idx in found:
-                if st.button(st.session_state.songs[idx]["title"], key=f"search_res_{idx}", use_container_width=True):
-                    set_song_by_idx(idx)
+            for sid in found:
+                if st.button(catalog[sid]["title"], key=f"search_res_{sid}", use_container_width=True):
+                    set_song_by_id(sid)
                     st.rerun()
 
     st.markdown("---")
     st.caption("🏷️ TAGI")
-    all_tags_flat = [t for s in st.session_state.songs for t in s.get("tags", [])]
-    if all_tags_flat:
-        common_tags = [t for t, _ in Counter(all_tags_flat).most_common(50)]
+    common_tags = get_most_common_tags(shared, limit=50)
+    if common_tags:
         def _jump_to_tag(t):
-            m = [j for j, s in enumerate(st.session_state.songs) if t in s.get("tags", [])]
-            if m:
-                st.session_state.playlist = m
-                st.session_state.playlist_name = f"Tag: {t}"
-                set_song_by_idx(m[0], keep_playlist=True)
+            set_playlist(shared.songs_with_tag(t), f"Tag: {t}")
             st.rerun()
         render_expandable_cloud(common_tags, "side_tags", _jump_to_tag, initial_count=9)
     else:
@@ -545,62 +782,82 @@ with st.sidebar:
 
     st.markdown("---")
     st.caption("Z TEKSTU")
-    if st.session_state.kw_lyrics:
+    if kw_lyrics:
         def _jump_to_lyrics_kw(w):
-            m = [j for j, s in enumerate(st.session_state.songs) if w in " ".join(l["text"] for l in s["lyrics"]).lower()]
-            if m: set_song_by_idx(random.choice(m))
+            m = shared.lookup_prefix(w, "lyrics")
+            if m: set_song_by_id(random.choice(m))
             st.rerun()
-        render_expandable_cloud([w for w, _ in st.session_state.kw_lyrics], "side_l", _jump_to_lyrics_kw, initial_count=9)
+        render_expandable_cloud([w for w, _ in kw_lyrics], "side_l", _jump_to_lyrics_kw, initial_count=9)
 
     st.markdown("---")
     st.caption("Z TYTUŁÓW")
-    if st.session_state.kw_titles:
+    if kw_titles:
         def _jump_to_title_kw(w):
-            m = [j for j, s in enumerate(st.session_state.songs) if w in s["title"].lower()]
-            if m: set_song_by_idx(random.choice(m))
+            m = shared.lookup_prefix(w, "title")
+            if m: set_song_by_id(random.choice(m))
             st.rerun()
-        render_expandable_cloud([w for w, _ in st.session_state.kw_titles], "side_t", _jump_to_title_kw, initial_count=6)
+        render_expandable_cloud([w for w, _ in kw_titles], "side_t", _jump_to_title_kw, initial_count=6)
 
     st.markdown("---")
     if st.button("🔄 Odśwież bazę", key="refresh_sidebar", use_container_width=True):
+        if get_storage():
+            get_storage().invalidate()
         reload_songs()
-        st.session_state.kw_lyrics = get_keywords(st.session_state.songs, "lyrics")
-        st.session_state.kw_titles = get_keywords(st.session_state.songs, "title")
         st.rerun()
 
+    storage = get_storage()
+    if not storage or not storage.loaded:
+        snap_time = get_snapshot_store().saved
+        if storage and storage.last_sync_error:
+            st.warning(f"Brak połączenia z arkuszem ({storage.last_sync_error}) — pokazuję zapisaną kopię.")
+        elif storage:
+            st.caption("⏳ Sprawdzam arkusz w tle…")
+        if snap_time:
+            st.caption(f"📦 Kopia lokalna z {time.strftime('%d.%m %H:%M', time.localtime(snap_time))}")
+    if storage:
+        write_status = storage.status()
+        if write_status["error"]:
+            st.error(f"Zapis do arkusza nie powiódł się ({write_status['error']}) — ponowię za chwilę.")
+        elif write_status["pending"]:
+            st.caption(f"⏳ Czeka na zapis do arkusza: {write_status['pending']} komórek")
+        elif write_status["time"]:
+            st.caption(f"✅ Zapisano w arkuszu ({write_status['cells']} komórek w ostatniej paczce)")
+        if write_status["pending"] and st.button("💾 Zapisz teraz", key="flush_writes", use_container_width=True):
+            storage.flush()
+            st.rerun()
+
 # ─────────────────────────────────────────────
 #  GUARD
 # ─────────────────────────────────────────────
 
-if not st.session_state.songs:
+if not catalog or st.session_state.current_id not in catalog:
     st.warning("Baza piosenek jest pusta lub brak połączenia.")
     st.stop()
 
-song = st.session_state.songs[st.session_state.current_idx]
+song = catalog[st.session_state.current_id]
 
 # ─────────────────────────────────────────────
 #  INFORMACJA O FILTRZE (PLAYLIŚCIE)
 # ─────────────────────────────────────────────
-if st.session_state.playlist_name != "Wszystkie":
+if st.session_state.playlist.name != "Wszystkie":
     pl_len = len(st.session_state.playlist)
-    try:
-        pos = st.session_state.playlist.index(st.session_state.current_idx) + 1
-    except:
-        pos = 1
+    pos = (st.session_state.playlist.position(st.session_state.current_id) or 0) + 1
     
     col_inf1, col_inf2 = st.columns([4, 1])
-    col_inf1.info(f"🎵 Aktywny filtr: **{st.session_state.playlist_name}** (Piosenka {pos} z {pl_len})")
+    col_inf1.info(f"🎵 Aktywny filtr: **{st.session_state.playlist.name}** (Piosenka {pos} z {pl_len})")
     if col_inf2.button("✕ Wyczyść", use_container_width=True):
-        st.session_state.playlist = list(range(len(st.session_state.songs)))
-        st.session_state.playlist_name = "Wszystkie"
+        st.session_state.playlist = CatalogPlaylist(shared)
         st.rerun()
 
 # ─────────────────────────────────────────────
 #  PIOSENKA — widok główny
 # ─────────────────────────────────────────────
 
-song_html = build_song_html(song, st.session_state.transposition)
-st.markdown(song_html, unsafe_allow_html=True)
+song_chords = shared.song_chords(st.session_state.current_id, song)
+page_data = build_page_data(st.session_state.current_id, st.session_state.transposition)
+song_html = page_data["pages"][st.session_state.current_id]["html"]
+st.markdown(f'{PAGING_BAR}<div id="song-view">{song_html}</div>', unsafe_allow_html=True)
+components.html(TRANSPOSE_JS + paging_script(page_data), height=0)
 
 # ─────────────────────────────────────────────
 #  PANEL STEROWANIA
@@ -608,6 +865,11 @@ st.markdown(song_html, unsafe_allow_html=True)
 
 st.markdown('<div class="controls-section">', unsafe_allow_html=True)
 
+# widoczny tylko po podmianie piosenki w przeglądarce; kliknięcie = rerun z ?song=<id>
+st.button("🎛️ Sterowanie tej piosenki", key="pg_sync", use_container_width=True)
+
+panel_id = st.session_state.current_id     # klucze widżetów z id piosenki — kliknięcie w panelu innej piosenki nic nie zmienia
+
 with st.expander("🎛️ Sterowanie", expanded=False):
 
     st.markdown('<div class="nav-btn">', unsafe_allow_html=True)
@@ -626,40 +888,14 @@ with st.expander("🎛️ Sterowanie", expanded=False):
             st.rerun()
     with c4:
         if st.button("⭐️ Ostatnia", key="nav_last", use_container_width=True):
-            set_song_by_idx(st.session_state.playlist[-1], keep_playlist=True)
+            set_song_by_id(st.session_state.playlist.last_id(), keep_playlist=True)
             st.rerun()
     st.markdown('</div>', unsafe_allow_html=True)
 
     st.markdown('<hr style="opacity: 0.15;">', unsafe_allow_html=True)
 
-    first_chord = get_first_chord(song)
-    first_idx = chord_to_index(first_chord) if first_chord else None
-
-    st.caption("Zmień tonację (wybierz akord, od którego zaczyna się piosenka):")
-    _SCALE_LABELS = ["C","Cis","D","Dis","E","F","Fis","G","Gis","A","B (=Ais)","H"]
-
-    if first_idx is not None:
-        current_chord_idx = (first_idx + st.session_state.transposition) % 12
-        target = st.selectbox(
-            "Akord startowy:",
-            options=list(range(12)),
-            index=current_chord_idx,
-            format_func=lambda i: _SCALE_LABELS[i],
-            key="tr_target_chord",
-            label_visibility="collapsed",
-        )
-        new_steps = (target - first_idx) % 12
-        if new_steps > 6: new_steps -= 12
-        if new_steps != st.session_state.transposition:
-            st.session_state.transposition = new_steps
-            st.rerun()
-        t_info_col, t_reset_col = st.columns([3, 1])
-        with t_info_col:
-            st.caption(f"Oryginał: **{_SCALE_LABELS[first_idx]}** → teraz: **{_SCALE_LABELS[current_chord_idx]}** ({st.session_state.transposition:+d} pół.)")
-        with t_reset_col:
-            if st.button("↺ Reset", key="tr_reset", use_container_width=True):
-                st.session_state.transposition = 0
-                st.rerun()
+    if song_chords.key is not None:
+        st.caption("Tonację zmienisz nad tekstem piosenki — od razu, bez przeładowania strony.")
     else:
         st.caption("Brak akordów w tej piosence — transpozycja niedostępna.")
 
@@ -670,34 +906,30 @@ with st.expander("🎛️ Sterowanie", expanded=False):
         avg = song["ratings_sum"] / song["ratings_count"] if song["ratings_count"] > 0 else 0
         st.markdown(f"<div style='font-size:12px; opacity:0.7;'>Średnia: <b>{avg:.1f}</b><br>Głosów: {song['ratings_count']}</div>", unsafe_allow_html=True)
     with col_rate_act:
-        score = st.feedback("stars", key="rating_feedback")
+        score = st.feedback("stars", key=f"rating_feedback_{panel_id}")
         if score is None:
-            score_rad = st.radio("Oceń:", [1, 2, 3, 4, 5], horizontal=True, label_visibility="collapsed", key="rating_radio_backup")
-            if st.button("Zapisz ocenę", key="save_rating_btn", use_container_width=True):
-                update_song_ratings(song["row"], song["ratings_sum"] + score_rad, song["ratings_count"] + 1)
-                st.success("Zapisano!")
-                reload_songs()
+            score_rad = st.radio("Oceń:", [1, 2, 3, 4, 5], horizontal=True, label_visibility="collapsed", key=f"rating_radio_backup_{panel_id}")
+            if st.button("Zapisz ocenę", key=f"save_rating_btn_{panel_id}", use_container_width=True):
+                if is_panel_song(panel_id) and rate_song(panel_id, score_rad):
+                    st.success("Zapisano!")
                 st.rerun()
         elif score is not None:
             r_val = score + 1
-            if st.button(f"Wyślij ocenę {r_val}/5", key="send_stars", use_container_width=True):
-                update_song_ratings(song["row"], song["ratings_sum"] + r_val, song["ratings_count"] + 1)
-                st.toast("Ocena dodana!")
-                reload_songs()
+            if st.button(f"Wyślij ocenę {r_val}/5", key=f"send_stars_{panel_id}", use_container_width=True):
+                if is_panel_song(panel_id) and rate_song(panel_id, r_val):
+                    st.toast("Ocena dodana!")
                 st.rerun()
 
     st.markdown('<hr style="opacity: 0.15;">', unsafe_allow_html=True)
 
     st.caption("Sugerowane tagi (kliknij by dodać):")
-    score_for_tags = st.session_state.get("rating_radio_backup", 3)
+    score_for_tags = st.session_state.get(f"rating_radio_backup_{panel_id}", 3)
     if score_for_tags in RATING_TAGS:
         def _add_suggested_tag(t):
-            if t not in song.get("tags", []):
-                song["tags"].append(t)
-                update_song_tags(song["row"], song["tags"])
-                reload_songs()
+            if is_panel_song(panel_id) and t not in song.get("tags", []):
+                set_song_tags(panel_id, song["tags"] + [t])
                 st.rerun()
-        render_compact_tags(RATING_TAGS[score_for_tags], f"sug_{score_for_tags}", _add_suggested_tag)
+        render_compact_tags(RATING_TAGS[score_for_tags], f"sug_{panel_id}_{score_for_tags}", _add_suggested_tag)
 
     st.caption("Tagi tej piosenki (X = usuń):")
     current_tags = song.get("tags", [])
@@ -706,85 +938,100 @@ with st.expander("🎛️ Sterowanie", expanded=False):
         cols = st.columns(4)
         for i, tag in enumerate(current_tags):
             with cols[i % 4]:
-                if st.button(f"✕ {tag}", key=f"del_tag_{i}", use_container_width=True):
-                    song["tags"].remove(tag)
-                    update_song_tags(song["row"], song["tags"])
-                    reload_songs()
+                if st.button(f"✕ {tag}", key=f"del_tag_{panel_id}_{i}", use_container_width=True):
+                    if is_panel_song(panel_id):
+                        set_song_tags(panel_id, [t for t in current_tags if t != tag])
                     st.rerun()
         st.markdown('</div>', unsafe_allow_html=True)
 
     c_add_t1, c_add_t2 = st.columns([3, 1])
     with c_add_t1:
-        new_tag_txt = st.text_input("Nowy tag", placeholder="Wpisz...", label_visibility="collapsed", key="new_tag_input")
+        new_tag_txt = st.text_input("Nowy tag", placeholder="Wpisz...", label_visibility="collapsed", key=f"new_tag_input_{panel_id}")
     with c_add_t2:
-        if st.button("➕", key="add_tag_plus", use_container_width=True):
-            if new_tag_txt and new_tag_txt not in current_tags:
-                song["tags"].append(new_tag_txt)
-                update_song_tags(song["row"], song["tags"])
-                reload_songs()
-                if "new_tag_input" in st.session_state:
-                    del st.session_state["new_tag_input"]
+        if st.button("➕", key=f"add_tag_plus_{panel_id}", use_container_width=True):
+            if is_panel_song(panel_id) and new_tag_txt and new_tag_txt not in current_tags:
+                set_song_tags(panel_id, current_tags + [new_tag_txt])
+                if f"new_tag_input_{panel_id}" in st.session_state:
+                    del st.session_state[f"new_tag_input_{panel_id}"]
                 st.rerun()
 
     st.markdown('<hr style="opacity: 0.15;">', unsafe_allow_html=True)
 
     st.subheader("📚 Polecane")
-    tab_same_tag, tab_tags, tab_rand, tab_top = st.tabs(["🔗 Inne tego tagu", "🏷️ Wg Tagów", "🎲 Losowe", "🏆 Top"])
+    tab_same_tag, tab_same_chords, tab_tags, tab_rand, tab_top = st.tabs(
+        ["🔗 Inne tego tagu", "🎸 Podobne akordy", "🏷️ Wg Tagów", "🎲 Losowe", "🏆 Top"])
 
     with tab_same_tag:
         if not current_tags:
             st.caption("Ta piosenka nie ma żadnych tagów.")
         else:
-            def _tag_match_score(s):
-                return len(set(s.get("tags", [])) & set(current_tags))
-            same_tag_songs = [s for s in st.session_state.songs if s["title"] != song["title"] and _tag_match_score(s) > 0]
-            same_tag_songs.sort(key=_tag_match_score, reverse=True)
+            same_tag_songs = [sid for sid, _ in shared.similar_by_tags(st.session_state.current_id) if sid in catalog]
             if same_tag_songs:
                 st.caption(f"Piosenki z pasującymi tagami ({', '.join(current_tags)}):")
                 st.markdown('<div class="list-btn">', unsafe_allow_html=True)
-                for i, ts in enumerate(same_tag_songs[:20]):
+                for i, sid in enumerate(same_tag_songs):
+                    ts = catalog[sid]
                     common = set(ts.get("tags", [])) & set(current_tags)
                     label = f"{ts['title']}  [{', '.join(sorted(common))}]"
                     if st.button(label, key=f"same_tag_res_{i}", use_container_width=True):
-                        real_idx = next((j for j, s in enumerate(st.session_state.songs) if s["title"] == ts["title"]), 0)
-                        set_song_by_idx(real_idx)
+                        set_song_by_id(sid)
                         st.rerun()
                 st.markdown('</div>', unsafe_allow_html=True)
             else:
                 st.caption("Brak innych piosenek z tymi samymi tagami.")
 
+    with tab_same_chords:
+        similar_chords = [(sid, sim) for sid, sim in shared.similar_by_chords(st.session_state.current_id) if sid in catalog]
+        if song_chords.key is None:
+            st.caption("Ta piosenka nie ma akordów.")
+        elif similar_chords:
+            st.caption("Piosenki, które gra się podobnie (te same przejścia akordów, w dowolnej tonacji):")
+            st.markdown('<div class="list-btn">', unsafe_allow_html=True)
+            for i, (sid, sim) in enumerate(similar_chords):
+                if st.button(f"{catalog[sid]['title']}  [{sim:.0%}]", key=f"same_chords_res_{i}", use_container_width=True):
+                    set_song_by_id(sid)
+                    st.rerun()
+            st.markdown('</div>', unsafe_allow_html=True)
+        else:
+            st.caption("Brak piosenek o podobnym przebiegu akordów.")
+
     with tab_tags:
-        all_unique_tags = sorted(set(t for s in st.session_state.songs for t in s.get("tags", [])))
+        all_unique_tags = shared.all_tags()
         selected_tag = st.selectbox("Wybierz tag:", [""] + all_unique_tags, key="tag_search_box")
         if selected_tag:
-            tagged = [s for s in st.session_state.songs if selected_tag in s.get("tags", [])]
+            tagged = shared.songs_with_tag(selected_tag)
             st.caption(f"{len(tagged)} piosenek:")
             st.markdown('<div class="list-btn">', unsafe_allow_html=True)
-            for i, ts in enumerate(tagged):
-                if st.button(ts["title"], key=f"tag_search_res_{i}", use_container_width=True):
-                    real_idx = next((j for j, s in enumerate(st.session_state.songs) if s["title"] == ts["title"]), 0)
-                    set_song_by_idx(real_idx)
+            for i, tid in enumerate(tagged):
+                if st.button(catalog[tid]["title"], key=f"tag_search_res_{i}", use_container_width=True):
+                    set_song_by_id(tid)
                     st.rerun()
             st.markdown('</div>', unsafe_allow_html=True)
 
     with tab_rand:
         if st.button("🔄 Losuj inne", key="reroll_recs", use_container_width=True):
-            st.session_state.random_sample = get_recommended_songs_rotational(st.session_state.songs, limit=5)
+            st.session_state.random_sample = get_recommended_songs_rotational(catalog, limit=5)
             st.rerun()
         st.markdown('<div class="list-btn">', unsafe_allow_html=True)
-        for i, rs in enumerate(st.session_state.random_sample):
+        for i, rid in enumerate(st.session_state.random_sample):
+            rs = catalog.get(rid)
+            if rs is None:
+                continue
             prefix = "⭐" if rs["ratings_count"] > 0 else "🆕"
             if st.button(f"{prefix} {rs['title']}", key=f"rec_r_{i}", use_container_width=True):
-                set_song_by_idx(next((j for j, s in enumerate(st.session_state.songs) if s["title"] == rs["title"]), 0))
+                set_song_by_id(rid)
                 st.rerun()
         st.markdown('</div>', unsafe_allow_html=True)
 
     with tab_top:
-        top_visited = get_most_visited_songs(st.session_state.songs, limit=5)
+        top_rated = [tid for tid in get_top_rated_songs(shared, limit=5) if tid in catalog]
+        st.caption("Ranking ważony liczbą ocen — piosenka z jednym głosem 5★ nie wyprzedza tych, które mają wiele wysokich ocen.")
         st.markdown('<div class="list-btn">', unsafe_allow_html=True)
-        for i, ts in enumerate(top_visited):
-            if st.button(f"{i+1}. {ts['title']} ({ts['ratings_count']} głosów)", key=f"rec_t_{i}", use_container_width=True):
-                set_song_by_idx(next((j for j, s in enumerate(st.session_state.songs) if s["title"] == ts["title"]), 0))
+        for i, tid in enumerate(top_rated):
+            ts = catalog[tid]
+            avg = ts["ratings_sum"] / ts["ratings_count"]
+            if st.button(f"{i+1}. {ts['title']} (śr. {avg:.1f}, {ts['ratings_count']} głosów)", key=f"rec_t_{i}", use_container_width=True):
+                set_song_by_id(tid)
                 st.rerun()
         st.markdown('</div>', unsafe_allow_html=True)
 
@@ -796,11 +1043,11 @@ with st.expander("🎛️ Sterowanie", expanded=False):
         tab_edit, tab_add, tab_del, tab_stats, tab_pub = st.tabs(["✏️ Edytuj", "➕ Dodaj", "🗑️ Usuń", "📊 Statystyki", "🚀 Publikacja"])
 
         with tab_edit:
-            curr_id = st.session_state.current_idx
+            curr_id = panel_id
             et = st.text_input("Tytuł:", value=song["title"], key=f"edit_title_{curr_id}")
             el = [f"{l['text']} | {' '.join(l.get('chords', []))}" for l in song["lyrics"]]
             nc = st.text_area("Treść (Tekst | Chwyty):", value="\n".join(el), height=200, key=f"edit_area_{curr_id}")
-            if st.button("Zapisz zmiany", key=f"btn_save_edit_{curr_id}", use_container_width=True):
+            if st.button("Zapisz zmiany", key=f"btn_save_edit_{curr_id}", use_container_width=True) and is_panel_song(curr_id):
                 nl = []
                 for line in nc.split("\n"):
                     p = line.split("|", 1)
@@ -808,9 +1055,10 @@ with st.expander("🎛️ Sterowanie", expanded=False):
                         nl.append({"text": p[0].strip(), "chords": p[1].strip().split() if p[1].strip() else []})
                     else:
                         nl.append({"text": line.strip(), "chords": []})
-                if save_song_to_sheets(song["row"], et, nl, song["ratings_sum"], song["ratings_count"], song["tags"]):
+                if save_song_to_storage(song["row"], et, nl, song["ratings_sum"], song["ratings_count"], song["tags"]):
+                    replace_song_local(curr_id, parse_song_row(
+                        song_to_row(et, nl, song["ratings_sum"], song["ratings_count"], song["tags"]), song["row"]))
                     st.success("Zmiany zapisane!")
-                    reload_songs()
                     st.rerun()
 
         with tab_add:
@@ -827,10 +1075,10 @@ with st.expander("🎛️ Sterowanie", expanded=False):
                             parsed_lyrics.append({"text": parts[0].strip(), "chords": parts[1].strip().split() if parts[1].strip() else []})
                         else:
                             parsed_lyrics.append({"text": line.strip(), "chords": []})
-                    if add_song_to_sheets(new_t, parsed_lyrics):
+                    new_row = add_song_to_storage(new_t, parsed_lyrics)
+                    if new_row:
                         st.success(f"Dodano: {new_t}")
-                        reload_songs()
-                        set_song_by_idx(len(st.session_state.songs) - 1)
+                        set_song_by_id(add_song_local(parse_song_row(song_to_row(new_t, parsed_lyrics), new_row)))
                         st.rerun()
                 else:
                     st.error("Podaj tytuł i treść!")
@@ -839,34 +1087,37 @@ with st.expander("🎛️ Sterowanie", expanded=False):
             pin_input = st.text_input("PIN blokady", type="password", key="del_pin")
             if pin_input == ADMIN_PIN:
                 st.warning(f"⚠️ Zamierzasz usunąć: **{song['title']}**")
-                if st.button("POTWIERDZAM USUNIĘCIE", type="primary", use_container_width=True):
-                    if delete_song_from_sheets(song["row"]):
+                if st.button("POTWIERDZAM USUNIĘCIE", key=f"btn_del_{panel_id}", type="primary", use_container_width=True):
+                    if is_panel_song(panel_id) and delete_song_from_storage(song["row"]):
                         st.success("Piosenka usunięta!")
-                        reload_songs()
-                        set_song_by_idx(0)
+                        remove_song_local(panel_id)
+                        set_song_by_id(panel_id)
                         st.rerun()
             elif pin_input:
                 st.error("Błędny PIN!")
 
         with tab_stats:
             col1, col2, col3, col4 = st.columns(4)
-            total_ratings = sum(s["ratings_count"] for s in st.session_state.songs)
+            totals = shared.rating_totals()
             with col1:
-                st.metric("📚 Piosenek", len(st.session_state.songs))
+                st.metric("📚 Piosenek", len(catalog))
             with col2:
-                st.metric("⭐ Ocenianych", len([s for s in st.session_state.songs if s["ratings_count"] > 0]))
+                st.metric("⭐ Ocenianych", totals["rated"])
             with col3:
-                st.metric("🗳️ Ocen łącznie", total_ratings)
+                st.metric("🗳️ Ocen łącznie", totals["count"])
             with col4:
-                avg_r = sum(s["ratings_sum"] for s in st.session_state.songs) / max(total_ratings, 1) if total_ratings else 0
-                st.metric("⬇️ Średnia", f"{avg_r:.2f}")
+                st.metric("⬇️ Średnia", f"{totals['average']:.2f}")
 
             st.markdown("---")
             st.caption("🔥 Najczęściej odwiedzane:")
-            for i, s in enumerate(get_most_visited_songs(st.session_state.songs, limit=10), 1):
+            for i, s in enumerate((catalog[sid] for sid in get_most_visited_songs(shared, limit=10) if sid in catalog), 1):
                 a = s["ratings_sum"] / s["ratings_count"] if s["ratings_count"] else 0
                 st.write(f"{i}. **{s['title']}** — {s['ratings_count']} ocen (śr. {a:.1f})")
 
+            rc = get_render_cache().stats()
+            st.caption(f"🧩 Cache widoku piosenek: {rc['entries']}/{rc['max_entries']} pozycji, "
+                       f"trafienia {rc['hits']}, chybienia {rc['misses']} ({rc['hit_rate']:.0%}), usunięte {rc['evictions']}")
+
         with tab_pub:
             st.write("Dzięki tej funkcji jednym kliknięciem wygenerujesz statyczną bazę utworów (`songs.json`) wprost ze swoich Arkuszy Google. Gotowy plik wyślesz na GitHuba, co natychmiast zaktualizuje superszybką stronę (HTML).")
 
@@ -883,48 +1134,45 @@ with st.expander("🎛️ Sterowanie", expanded=False):
                     st.write(f"Status: {_r.status_code}")
                     st.json(_r.json())
 
-            def _build_clean_json_from_fresh_data():
-                """Czyści cache, pobiera świeże dane z arkusza i buduje JSON bez pola 'row'."""
+            def _refresh_from_storage():
+                """Czyści cache i pobiera świeże dane z arkusza; zwraca listę piosenek."""
                 load_songs_cached.clear()
                 fresh_songs = load_songs_cached()
-                st.session_state.songs = fresh_songs
-
-                clean_songs = []
-                for s in fresh_songs:
-                    s_clean = s.copy()
-                    s_clean.pop("row", None)
-                    clean_songs.append(s_clean)
+                shared.replace_all(fresh_songs)
+                fix_session_view()
+                save_snapshot_soon(force=True)
+                return fresh_songs
 
-                return json.dumps(clean_songs, ensure_ascii=False, indent=2)
+            pub_compact = st.checkbox("Zwarty JSON (bez wcięć, mniejszy plik)", value=True, key="pub_compact")
+            pub_gzip = st.checkbox("Dołącz songs.json.gz", value=False, key="pub_gzip")
 
             if st.button("⚡ GENERUJ I PUBLIKUJ NA GITHUB", type="primary", use_container_width=True):
                 with st.spinner("Pobieranie najnowszych danych i wysyłanie pliku..."):
-                    json_string = _build_clean_json_from_fresh_data()
-                    success, response_text = push_json_to_github(json_string)
-                    if success:
-                        st.success("🎉 Sukces! Śpiewnik został zaktualizowany na serwerze.")
+                    result = get_publisher().publish(_refresh_from_storage(), compact=pub_compact, gzip_sidecar=pub_gzip)
+                    size_info = f"{result['size'] / 1024:.0f} KB"
+                    if result["gzip_size"]:
+                        size_info += f", gzip {result['gzip_size'] / 1024:.0f} KB"
+                    if result["status"] == "skipped":
+                        st.info(f"Baza nie zmieniła się od ostatniej publikacji ({size_info}) — nic nie wysłano.")
+                    elif result["status"] == "published":
+                        st.success(f"🎉 Sukces! Śpiewnik został zaktualizowany na serwerze ({size_info}).")
                     else:
-                        st.error(f"Błąd publikacji. Upewnij się, że podałeś w secrets.toml zmienne: github_token oraz github_repo. Kod błędu: {response_text}")
+                        st.error(f"Błąd publikacji. Upewnij się, że podałeś w secrets.toml zmienne: github_token oraz github_repo. Kod błędu: {result['error']}")
 
             st.markdown("---")
             st.write("Możesz również wygenerować plik ręcznie i zapisać na swoim dysku:")
 
             if st.button("🔄 Odśwież dane przed pobraniem", use_container_width=True):
-                st.session_state["_manual_json_string"] = _build_clean_json_from_fresh_data()
+                _refresh_from_storage()
                 st.success("Dane odświeżone — możesz teraz pobrać plik poniżej.")
 
-            if "_manual_json_string" not in st.session_state:
-                # Pierwsze wejście w zakładkę: pokaż coś sensownego do pobrania, bazując na aktualnym session_state
-                fallback_clean = []
-                for s in st.session_state.songs:
-                    s_clean = s.copy()
-                    s_clean.pop("row", None)
-                    fallback_clean.append(s_clean)
-                st.session_state["_manual_json_string"] = json.dumps(fallback_clean, ensure_ascii=False, indent=2)
+            def _catalog_json():
+                return b"".join(encode_catalog(shared.catalog.values(), compact=False))
 
+            # jeden wspólny plik do pobrania na wersję katalogu, zamiast kopii w każdej sesji
             st.download_button(
                 label="📥 Pobierz bazę jako songs.json",
-                data=st.session_state["_manual_json_string"],
+                data=shared.derived("export_json", shared.version, _catalog_json),
                 file_name="songs.json",
                 mime="application/json",
                 use_container_width=True
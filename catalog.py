@@ -0,0 +1,553 @@
+import json
+import random
+import re
+import threading
+
+from chords import SongChords
+from progressions import ChordNeighbours
+from ratings import RatingIndex
+from search_engine import SearchEngine, fold
+from song_index import TagIndex, TagNeighbours, TermStats, WordIndex
+
+# ─────────────────────────────────────────────
+#  WIERSZ ARKUSZA ↔ PIOSENKA
+# ─────────────────────────────────────────────
+
+# <br>, <br/>, <br><br> i "---" to pozostałości konwersji z Worda (patrz clean_database.py)
+_JUNK_RE = re.compile(r"(<br\s*/?>\s*)+|---", re.IGNORECASE)
+
+
+def clean_text(text):
+    """Tekst linii bez <br> i "---", bez spacji na końcach — czyszczony raz, przy wczytaniu."""
+    return _JUNK_RE.sub("", text).strip()
+
+
+def parse_lyrics(lyrics_raw):
+    """Tekst z kolumny B: JSON (lista {"text", "chords"}) albo linie "tekst | akordy"."""
+    lyrics = []
+    if lyrics_raw.startswith("["):
+        try:
+            for item in json.loads(lyrics_raw):
+                if isinstance(item, dict):
+                    chords = item.get("chords", [])
+                    if isinstance(chords, str):
+                        chords = chords.split()
+                    lyrics.append({"text": clean_text(item.get("text", "")), "chords": chords})
+        except Exception:
+            lyrics.append({"text": clean_text(lyrics_raw), "chords": []})
+    else:
+        for line in lyrics_raw.split("\n"):
+            if "|" in line:
+                parts = line.split("|", 1)
+                lyrics.append({"text": clean_text(parts[0]), "chords": parts[1].strip().split() if parts[1].strip() else []})
+            else:
+                lyrics.append({"text": clean_text(line), "chords": []})
+    return lyrics
+
+
+def make_song(title, lyrics, ratings_sum=0, ratings_count=0, tags=(), row=None):
+    """Słownik piosenki w postaci używanej w całej aplikacji.
+
+    "search" to tytuł i tekst bez ogonków i wielkich liter, policzone raz przy wczytaniu
+    (korzysta z nich wyszukiwarka). Nie trafia do arkusza ani do publikowanego songs.json.
+    """
+    song = {
+        "title": title,
+        "lyrics": lyrics,
+        "ratings_sum": ratings_sum,
+        "ratings_count": ratings_count,
+        "tags": list(tags),
+        "search": {"title": fold(title), "lyrics": fold(" ".join(l["text"] for l in lyrics))},
+    }
+    if row is not None:
+        song["row"] = row
+    return song
+
+
+def public_song(song):
+    """Piosenka bez pól wewnętrznych ("row", "search") — do eksportu songs.json."""
+    return {k: v for k, v in song.items() if k not in ("row", "search")}
+
+
+def parse_song_row(row, row_number):
+    """Piosenka z wiersza A:E arkusza albo None dla pustego wiersza."""
+    if len(row) < 2 or not row[0].strip():
+        return None
+    tags_raw = row[4].strip() if len(row) > 4 else ""
+    return make_song(
+        clean_text(row[0]),
+        parse_lyrics(row[1].strip()),
+        int(row[2]) if len(row) > 2 and row[2].isdigit() else 0,
+        int(row[3]) if len(row) > 3 and row[3].isdigit() else 0,
+        [t.strip() for t in tags_raw.split(",") if t.strip()],
+        row_number,
+    )
+
+
+def format_lyrics(lyrics):
+    return "\n".join([f"{l['text']} | {' '.join(l.get('chords', []))}" for l in lyrics])
+
+
+def song_to_row(title, lyrics, ratings_sum=0, ratings_count=0, tags=()):
+    """Wartości kolumn A:E dla piosenki — ten sam format, który czyta parse_song_row."""
+    return [title, format_lyrics(lyrics), str(ratings_sum), str(ratings_count), ", ".join(tags)]
+
+
+# ─────────────────────────────────────────────
+#  KATALOG PIOSENEK ZE STAŁYMI ID
+# ─────────────────────────────────────────────
+
+class SongCatalog:
+    """Piosenki z arkusza pod stałymi id całkowitymi.
+
+    Id nie zależy od pozycji na liście: po przeładowaniu piosenka o tym samym tytule
+    dostaje to samo id co w poprzednim katalogu, więc usunięcie wiersza nie przesuwa
+    pozostałych piosenek. Mapy id→piosenka, tytuł→id i wiersz→id dają odczyt w O(1).
+
+    `version` rośnie przy każdej zmianie katalogu, a `song_version[id]` przy każdej
+    zmianie danej piosenki — po nich cache'e poznają, że coś jest nieaktualne.
+
+    Metody zmieniające katalog nigdy nie modyfikują słowników piosenek w miejscu
+    (wstawiają nowe), więc kopia z copy() jest niezmiennym migawkowym widokiem.
+    """
+
+    def __init__(self, songs=(), previous=None):
+        self.songs = {}
+        self.by_title = {}
+        self.by_row = {}
+        self.song_version = {}
+        self._order = None
+        self._positions = None
+        self._next_id = previous._next_id if previous else 0
+        self.version = previous.version + 1 if previous else 0
+        songs = list(songs)
+        matched = previous.match_ids(songs) if previous else [None] * len(songs)
+        for sid, s in zip(matched, songs):
+            if sid is None:
+                sid = self._new_id()
+            self._put(sid, s)
+            if previous and sid in previous.songs:
+                self.song_version[sid] = previous.song_version[sid] + (previous.songs[sid] != s)
+
+    def copy(self):
+        """Płytka kopia — do zmian metodą copy-on-write; piosenki są współdzielone."""
+        other = SongCatalog.__new__(SongCatalog)
+        other.songs = dict(self.songs)
+        other.by_title = dict(self.by_title)
+        other.by_row = dict(self.by_row)
+        other.song_version = dict(self.song_version)
+        other._order = self._order
+        other._positions = self._positions
+        other._next_id = self._next_id
+        other.version = self.version
+        return other
+
+    def _new_id(self):
+        sid = self._next_id
+        self._next_id += 1
+        return sid
+
+    def _put(self, sid, song):
+        if sid not in self.songs:
+            self._order = None
+            self._positions = None
+        self.songs[sid] = song
+        self.song_version[sid] = self.song_version.get(sid, -1) + 1
+        self.by_title.setdefault(song["title"], sid)
+        if "row" in song:
+            self.by_row[song["row"]] = sid
+
+    def _unmap(self, sid, song):
+        if self.by_title.get(song["title"]) == sid:
+            del self.by_title[song["title"]]
+            for other_id, other in self.songs.items():
+                if other_id != sid and other["title"] == song["title"]:
+                    self.by_title[song["title"]] = other_id
+                    break
+        if self.by_row.get(song.get("row")) == sid:
+            del self.by_row[song["row"]]
+
+    # ── dostęp ──
+
+    def __len__(self):
+        return len(self.songs)
+
+    def __contains__(self, sid):
+        return sid in self.songs
+
+    def __getitem__(self, sid):
+        return self.songs[sid]
+
+    def __iter__(self):
+        return iter(self.ids())
+
+    def get(self, sid, default=None):
+        return self.songs.get(sid, default)
+
+    def ids(self):
+        """Id w kolejności wierszy arkusza."""
+        if self._order is None:
+            self._order = list(self.songs)
+        return self._order
+
+    def positions(self):
+        """Mapa id → pozycja w ids()."""
+        if self._positions is None:
+            self._positions = {sid: i for i, sid in enumerate(self.ids())}
+        return self._positions
+
+    def items(self):
+        return self.songs.items()
+
+    def values(self):
+        return self.songs.values()
+
+    def id_for_title(self, title):
+        return self.by_title.get(title)
+
+    def id_for_row(self, row):
+        return self.by_row.get(row)
+
+    def match_ids(self, songs):
+        """Id tego katalogu dla kolejnych piosenek z `songs` (po tytule; powtórzone tytuły po kolei) albo None."""
+        by_title = {}
+        for sid, s in self.songs.items():
+            by_title.setdefault(s["title"], []).append(sid)
+        out = []
+        for s in songs:
+            ids = by_title.get(s["title"])
+            out.append(ids.pop(0) if ids else None)
+        return out
+
+    def diff(self, songs):
+        """Różnica względem świeżej listy piosenek.
+
+        Zwraca (nowe piosenki, [(id, nowa wersja)], usunięte id, [(id, nowy wiersz)]) —
+        samo przesunięcie wiersza nie liczy się jako zmiana treści.
+        """
+        added, changed, moved = [], [], []
+        seen = set()
+        for sid, s in zip(self.match_ids(songs), songs):
+            if sid is None:
+                added.append(s)
+                continue
+            seen.add(sid)
+            old = self.songs[sid]
+            if old.get("row") != s.get("row"):
+                moved.append((sid, s.get("row")))
+            if any(old.get(k) != v for k, v in s.items() if k != "row") or len(old) != len(s):
+                changed.append((sid, s))
+        removed = [sid for sid in self.songs if sid not in seen]
+        return added, changed, removed, moved
+
+    # ── zmiany ──
+
+    def add(self, song):
+        sid = self._new_id()
+        self._put(sid, song)
+        self.version += 1
+        return sid
+
+    def replace(self, sid, song):
+        """Podmienia piosenkę pod tym samym id, bez zmiany jej miejsca w kolejności."""
+        self._unmap(sid, self.songs[sid])
+        self._put(sid, song)
+        self.version += 1
+
+    def patch(self, sid, **fields):
+        """Zmienia pola piosenki (np. oceny) i podbija jej wersję."""
+        self.songs[sid] = {**self.songs[sid], **fields}
+        self.song_version[sid] += 1
+        self.version += 1
+
+    def set_row(self, sid, row):
+        song = self.songs[sid]
+        if self.by_row.get(song.get("row")) == sid:
+            del self.by_row[song["row"]]
+        self.songs[sid] = {**song, "row": row}
+        self.by_row[row] = sid
+
+    def remove(self, sid, shift_rows=True):
+        """Usuwa piosenkę; wiersze poniżej przesuwają się w górę jak w arkuszu (chyba że shift_rows=False)."""
+        song = self.songs.pop(sid)
+        self._unmap(sid, song)
+        self._order = None
+        self._positions = None
+        del self.song_version[sid]
+        self.version += 1
+        row = song.get("row")
+        if row is not None and shift_rows:
+            for other_id, other in self.songs.items():
+                if other.get("row", 0) > row:
+                    self.songs[other_id] = {**other, "row": other["row"] - 1}
+            self.by_row = {s["row"]: i for i, s in self.songs.items() if "row" in s}
+        return song
+
+
+# ─────────────────────────────────────────────
+#  PLAYLISTA (aktywny filtr)
+# ─────────────────────────────────────────────
+
+class Playlist:
+    """Lista id piosenek z mapą pozycji — następna/poprzednia/pozycja w O(1)."""
+
+    def __init__(self, ids, name="Wszystkie"):
+        self.ids = list(ids)
+        self.name = name
+        self.pos = {sid: i for i, sid in enumerate(self.ids)}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, sid):
+        return sid in self.pos
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def position(self, sid):
+        """Pozycja piosenki na playliście (od 0) albo None."""
+        return self.pos.get(sid)
+
+    def next_id(self, sid):
+        i = self.pos.get(sid)
+        if i is None:
+            return self.ids[0] if self.ids else None
+        return self.ids[(i + 1) % len(self.ids)]
+
+    def prev_id(self, sid):
+        i = self.pos.get(sid)
+        if i is None:
+            return self.ids[-1] if self.ids else None
+        return self.ids[(i - 1) % len(self.ids)]
+
+    def first_id(self):
+        return self.ids[0] if self.ids else None
+
+    def last_id(self):
+        return self.ids[-1] if self.ids else None
+
+    def random_id(self):
+        return random.choice(self.ids) if self.ids else None
+
+    def restricted_to(self, catalog):
+        """Ta sama playlista bez piosenek, których nie ma już w katalogu."""
+        if all(sid in catalog for sid in self.ids):
+            return self
+        return Playlist((sid for sid in self.ids if sid in catalog), self.name)
+
+
+class CatalogPlaylist(Playlist):
+    """Playlista "Wszystkie": cały wspólny katalog, bez własnej kopii id w sesji."""
+
+    def __init__(self, shared):
+        self.shared = shared
+        self.name = "Wszystkie"
+
+    @property
+    def ids(self):
+        return self.shared.catalog.ids()
+
+    @property
+    def pos(self):
+        return self.shared.catalog.positions()
+
+    def restricted_to(self, catalog):
+        return self
+
+
+# ─────────────────────────────────────────────
+#  WSPÓLNY KATALOG PROCESU
+# ─────────────────────────────────────────────
+
+class SharedCatalog:
+    """Jeden sparsowany katalog z indeksami na cały proces, wspólny dla wszystkich sesji.
+
+    `catalog` to zawsze niezmienna migawka — każda zmiana buduje nową kopię i podmienia
+    referencję, więc sesja może bez blokady czytać migawkę pobraną na początku reruna.
+    Indeksy są zmieniane w miejscu, dlatego zapytania do nich idą przez metody z blokadą.
+    Sesje trzymają tylko id bieżącej piosenki, playlistę i transpozycję.
+
+    `shift_rows` mówi, czy usunięcie piosenki przesuwa klucze ("row") następnych — tak
+    jest w arkuszu, a nie w bazie SQLite.
+    """
+
+    def __init__(self, songs=(), shift_rows=True):
+        self.lock = threading.RLock()
+        self.shift_rows = shift_rows
+        self.storage_revision = None
+        self.text_version = 0
+        self._derived = {}
+        self.terms = None
+        self._build(SongCatalog(songs))
+
+    def _build(self, catalog):
+        self.catalog = catalog
+        self.word_index = WordIndex.from_songs(catalog)
+        self.tag_index = TagIndex.from_songs(catalog)
+        self.tag_neighbours = TagNeighbours.from_songs(catalog)
+        self.ratings = RatingIndex.from_songs(catalog)
+        self.terms = TermStats.from_songs(catalog, previous=self.terms)
+        self.search_engine = SearchEngine.from_songs(catalog)
+        self.chords = {sid: SongChords(s["lyrics"]) for sid, s in catalog.items()}
+        self.chord_neighbours = ChordNeighbours.from_chords(self.chords)
+        self.text_version += 1
+
+    @property
+    def version(self):
+        return self.catalog.version
+
+    # ── odczyt ──
+
+    def search(self, query, k=10):
+        with self.lock:
+            return self.search_engine.search(query, k)
+
+    def lookup_prefix(self, word, field="lyrics"):
+        with self.lock:
+            return self.word_index.lookup_prefix(word, field)
+
+    def songs_with_tag(self, tag):
+        with self.lock:
+            return self.tag_index.songs_with(tag)
+
+    def most_common_tags(self, limit=None):
+        with self.lock:
+            return self.tag_index.most_common(limit)
+
+    def all_tags(self):
+        with self.lock:
+            return self.tag_index.all_tags()
+
+    def similar_by_tags(self, sid, k=TagNeighbours.K):
+        """(id, podobieństwo Jaccarda) piosenek o najbardziej zbliżonych tagach."""
+        with self.lock:
+            return self.tag_neighbours.similar(sid, k)
+
+    def similar_by_chords(self, sid, k=ChordNeighbours.K):
+        """(id, podobieństwo) piosenek o najbliższym przebiegu akordów, niezależnie od tonacji."""
+        with self.lock:
+            return self.chord_neighbours.similar(sid, k)
+
+    def top_songs(self, by="score", n=10):
+        """Id najlepszych piosenek: by="score" — średnia bayesowska, by="count" — liczba głosów."""
+        with self.lock:
+            return self.ratings.top(by, n)
+
+    def rating_totals(self):
+        with self.lock:
+            return self.ratings.totals()
+
+    def keywords(self, field="lyrics", limit=40, weighting="count"):
+        """Najważniejsze słowa tytułów albo tekstów — (słowo, liczba wystąpień)."""
+        with self.lock:
+            return self.terms.top(field, limit, weighting)
+
+    def song_chords(self, sid, song):
+        """Skompilowane akordy piosenki; liczone od nowa tylko, gdy zmienił się jej tekst."""
+        sc = self.chords.get(sid)
+        if sc is None or sc.lyrics is not song["lyrics"]:
+            sc = SongChords(song["lyrics"])
+        return sc
+
+    def derived(self, name, key, compute):
+        """Wartość wyliczona z katalogu (np. chmura słów, eksport JSON), liczona raz na `key`."""
+        with self.lock:
+            hit = self._derived.get(name)
+            if hit is not None and hit[0] == key:
+                return hit[1]
+            value = compute()
+            self._derived[name] = (key, value)
+            return value
+
+    # ── zmiany ──
+
+    def _index(self, sid, song):
+        self.word_index.add_song(sid, song)
+        self.tag_index.add_song(sid, song)
+        self.tag_neighbours.add_song(sid, song)
+        self.ratings.set(sid, song.get("ratings_sum", 0), song.get("ratings_count", 0))
+        self.terms.add_song(sid, song)
+        self.search_engine.add_song(sid, song)
+        self.chords[sid] = SongChords(song["lyrics"])
+        self.chord_neighbours.add(sid, self.chords[sid])
+
+    def _unindex(self, sid, song):
+        self.word_index.remove_song(sid, song)
+        self.tag_index.remove_song(sid, song)
+        self.tag_neighbours.remove_song(sid, song)
+        self.ratings.remove(sid)
+        self.terms.remove_song(sid, song)
+        self.search_engine.remove_song(sid)
+        self.chords.pop(sid, None)
+        self.chord_neighbours.remove(sid)
+
+    def replace_all(self, songs):
+        """Pełne przeładowanie: nowy katalog (id zachowane po tytułach) i przebudowa indeksów."""
+        with self.lock:
+            self._build(SongCatalog(songs, previous=self.catalog))
+
+    def add_song(self, song):
+        with self.lock:
+            catalog = self.catalog.copy()
+            sid = catalog.add(song)
+            self._index(sid, song)
+            self.text_version += 1
+            self.catalog = catalog
+            return sid
+
+    def replace_song(self, sid, song):
+        with self.lock:
+            catalog = self.catalog.copy()
+            self._unindex(sid, catalog[sid])
+            catalog.replace(sid, song)
+            self._index(sid, song)
+            self.text_version += 1
+            self.catalog = catalog
+
+    def remove_song(self, sid):
+        with self.lock:
+            catalog = self.catalog.copy()
+            self._unindex(sid, catalog[sid])
+            catalog.remove(sid, self.shift_rows)
+            self.text_version += 1
+            self.catalog = catalog
+
+    def patch_song(self, sid, **fields):
+        """Zmiana pól bez tekstu (oceny, tagi) — indeks tagów dostaje samą różnicę."""
+        with self.lock:
+            catalog = self.catalog.copy()
+            if "tags" in fields:
+                self.tag_index.set_tags(sid, catalog[sid].get("tags", []), fields["tags"])
+                self.tag_neighbours.set_tags(sid, fields["tags"])
+            if "ratings_sum" in fields or "ratings_count" in fields:
+                old = catalog[sid]
+                self.ratings.set(sid, fields.get("ratings_sum", old.get("ratings_sum", 0)),
+                                 fields.get("ratings_count", old.get("ratings_count", 0)))
+            catalog.patch(sid, **fields)
+            self.catalog = catalog
+
+    def reconcile(self, revision, songs):
+        """Nanosi zmiany z magazynu (rewizja `revision`); każda sesja widzi je od razu."""
+        with self.lock:
+            if revision == self.storage_revision:
+                return
+            added, changed, removed, moved = self.catalog.diff(songs)
+            if added or changed or removed or moved:
+                catalog = self.catalog.copy()
+                for sid in removed:
+                    self._unindex(sid, catalog[sid])
+                    # wiersze ze świeżych danych już uwzględniają usunięcia — bez przesuwania
+                    catalog.remove(sid, shift_rows=False)
+                for sid, row in moved:
+                    catalog.set_row(sid, row)
+                for sid, s in changed:
+                    self._unindex(sid, catalog[sid])
+                    catalog.replace(sid, s)
+                    self._index(sid, s)
+                for s in added:
+                    self._index(catalog.add(s), s)
+                if added or removed or changed:
+                    self.text_version += 1
+                self.catalog = catalog
+            self.storage_revision = revision
@@ -0,0 +1,222 @@
+import html
+import re
+import sys
+
+# ─────────────────────────────────────────────
+#  MODEL AKORDÓW (notacja polska)
+# ─────────────────────────────────────────────
+#
+#  Akord jest parsowany raz: pryma jako klasa wysokości 0–11, wielkość litery
+#  (wielka = dur, mała = moll), reszta jako współdzielony (interned) sufiks i opcjonalny
+#  bas po "/". Transpozycja to (pryma + kroki) % 12 i odczyt nazwy z tabeli, a gotowe
+#  napisy dla każdego z 12 przesunięć są pamiętane w obiekcie akordu.
+
+NOTES_MAJ = ["C", "Cis", "D", "Dis", "E", "F", "Fis", "G", "Gis", "A", "B", "H"]
+NOTES_MIN = ["c", "cis", "d", "dis", "e", "f", "fis", "g", "gis", "a", "b", "h"]
+_ALIASES_MAJ = {"Ais": "B", "Es": "Dis", "As": "Gis", "Des": "Cis", "Ges": "Fis", "Ces": "H"}
+_ALIASES_MIN = {"ais": "b", "es": "dis", "as": "gis", "des": "cis", "ges": "fis", "ces": "h"}
+
+_PITCH = {}
+for _i, _n in enumerate(NOTES_MAJ):
+    _PITCH[_n] = (_i, False)
+for _i, _n in enumerate(NOTES_MIN):
+    _PITCH[_n] = (_i, True)
+for _a, _n in _ALIASES_MAJ.items():
+    _PITCH[_a] = _PITCH[_n]
+for _a, _n in _ALIASES_MIN.items():
+    _PITCH[_a] = _PITCH[_n]
+
+# sufiksy zaczynające się literą, po których litera prymy nie jest częścią nazwy dźwięku
+# ("Esus4" to E sus4, a nie Es us4)
+_SUFFIX_WORDS = ("sus", "maj", "dim", "add", "aug", "m")
+_NOTE_RE = re.compile(r"([A-Ha-h])(is|es|s)?")
+# sklejone akordy z konwersji Worda, np. "CGaE" albo "aFEG"
+_GLUED_RE = re.compile(r"([A-Ha-h](?:is|es)?)([0-9+]*)")
+
+
+def parse_note(text):
+    """(klasa wysokości, moll?, reszta napisu) dla nazwy dźwięku na początku `text` albo None."""
+    m = _NOTE_RE.match(text)
+    if not m:
+        return None
+    letter, acc = m.groups()
+    if acc:
+        rest = text[m.end():]
+        name = letter + acc
+        if name in _PITCH and (not rest[:1].isalpha() or rest.startswith(_SUFFIX_WORDS)):
+            pitch, minor = _PITCH[name]
+            return pitch, minor, rest
+    rest = text[1:]
+    if letter in _PITCH and (not rest[:1].isalpha() or rest.startswith(_SUFFIX_WORDS)):
+        pitch, minor = _PITCH[letter]
+        return pitch, minor, rest
+    return None
+
+
+def split_glued(text):
+    """Sklejone akordy ("CGaE") jako lista napisów albo None, gdy to nie jest taka sekwencja."""
+    parts = []
+    pos = 0
+    while pos < len(text):
+        m = _GLUED_RE.match(text, pos)
+        if not m or m.group(1) not in _PITCH:
+            return None
+        parts.append(m.group(0))
+        pos = m.end()
+    return parts if len(parts) > 1 else None
+
+
+def note_name(pitch, minor):
+    return (NOTES_MIN if minor else NOTES_MAJ)[pitch % 12]
+
+
+class Chord:
+    """Sparsowany akord; `root` jest None dla napisów, które akordem nie są.
+
+    Sklejone akordy ("CGaE") mają listę `parts` i transponują się część po części.
+    """
+
+    __slots__ = ("text", "root", "minor", "suffix", "bass", "bass_minor", "parts", "_spelled")
+
+    def __init__(self, text):
+        self.text = text
+        self.root = self.minor = self.bass = self.bass_minor = None
+        self.suffix = ""
+        self.parts = None
+        self._spelled = None
+        parsed = parse_note(text)
+        if parsed is None:
+            glued = split_glued(text)
+            if glued:
+                self.parts = [compile_chord(p) for p in glued]
+                self.root, self.minor = self.parts[0].root, self.parts[0].minor
+            return
+        root, minor, rest = parsed
+        if "/" in rest:
+            rest, bass_text = rest.split("/", 1)
+            bass = parse_note(bass_text)
+            if bass is None or bass[2]:
+                return
+            self.bass, self.bass_minor = bass[0], bass[1]
+        self.root, self.minor = root, minor
+        self.suffix = sys.intern(rest)
+
+    def name(self, steps=0):
+        """Nazwa akordu przesuniętego o `steps` półtonów; bez przesunięcia — tak, jak go zapisano.
+
+        >>> [compile_chord(t).name() for t in ("Es", "As", "Des7", "CGaE")]
+        ['Es', 'As', 'Des7', 'CGaE']
+        >>> compile_chord("Es").name(12), compile_chord("Es").name(2)
+        ('Es', 'F')
+        """
+        steps %= 12
+        if self.root is None or steps == 0:
+            return self.text
+        if self._spelled is None:
+            self._spelled = [None] * 12
+        name = self._spelled[steps]
+        if name is None and self.parts:
+            name = self._spelled[steps] = "".join(p.name(steps) for p in self.parts)
+        elif name is None:
+            name = note_name(self.root + steps, self.minor) + self.suffix
+            if self.bass is not None:
+                name += "/" + note_name(self.bass + steps, self.bass_minor)
+            self._spelled[steps] = name
+        return name
+
+    def __repr__(self):
+        return f"Chord({self.text!r})"
+
+
+def chord_html(chord, steps=0):
+    """Akord jako <span class="ch"> z modelem w atrybutach data-* — przeglądarka może go transponować sama."""
+    if chord.parts:
+        return "".join(chord_html(p, steps) for p in chord.parts)
+    if chord.root is None:
+        return html.escape(chord.text)
+    # data-t: zapis autora, pokazywany bez transpozycji
+    attrs = (f'data-r="{chord.root}" data-m="{int(chord.minor)}" data-s="{html.escape(chord.suffix)}" '
+             f'data-t="{html.escape(chord.text)}"')
+    if chord.bass is not None:
+        attrs += f' data-b="{chord.bass}" data-bm="{int(chord.bass_minor)}"'
+    return f'<span class="ch" {attrs}>{html.escape(chord.name(steps))}</span>'
+
+
+_CHORDS = {}
+
+
+def compile_chord(text):
+    """Wspólny obiekt Chord dla danego napisu — każdy akord parsowany raz na proces."""
+    chord = _CHORDS.get(text)
+    if chord is None:
+        chord = _CHORDS[text] = Chord(sys.intern(text))
+    return chord
+
+
+# ─────────────────────────────────────────────
+#  AKORDY W TEKŚCIE (import z Worda)
+# ─────────────────────────────────────────────
+
+# akord jako osobne słowo: pryma, sufiksy (E+, a7, Gsus4, Cmaj7, d-, h0) i bas po "/" (D/Fis)
+_TOKEN_RE = re.compile(r"[A-Ha-h](?:is|es|s)?(?:[+\-°]|sus[24]?|maj|dim|add|aug|m|\d+|\(\d+\))*"
+                       r"(?:/[A-Ha-h](?:is|es|s)?)?")
+
+
+def is_chord_token(word):
+    """Czy słowo jest akordem w notacji polskiej — także z sufiksem albo sklejone ("CGaE")."""
+    chord = compile_chord(word)
+    if chord.root is None:
+        return False
+    return bool(chord.parts) or _TOKEN_RE.fullmatch(word) is not None
+
+
+def split_chords(text):
+    """(tekst, akordy) dla linii z Worda — akordy to ciąg słów-akordów na końcu linii."""
+    words = text.split()
+    chords = []
+    while words and is_chord_token(words[-1]):
+        chords.insert(0, words.pop())
+    # "sklejone akordy" bez zwykłego akordu obok albo z małych liter na styku z tekstem
+    # to zwykle słowa ("Ada", "ha", "ech")
+    if all(compile_chord(c).parts for c in chords):
+        words, chords = words + chords, []
+    while chords and chords[0].islower() and compile_chord(chords[0]).parts:
+        words.append(chords.pop(0))
+    return " ".join(words), chords
+
+
+def transpose_chord(chord, steps):
+    return compile_chord(chord).name(steps) if steps else chord
+
+
+def chord_to_index(chord):
+    return compile_chord(chord).root
+
+
+class SongChords:
+    """Akordy piosenki skompilowane raz: linie, pierwszy akord (tonacja) i zbiór akordów."""
+
+    __slots__ = ("lyrics", "lines", "first", "chord_set")
+
+    def __init__(self, lyrics):
+        self.lyrics = lyrics
+        self.lines = [[compile_chord(c) for c in l.get("chords", []) if c.strip()] for l in lyrics]
+        self.first = next((c for line in self.lines for c in line), None)
+        self.chord_set = frozenset(p.name() for line in self.lines for c in line for p in (c.parts or [c])
+                                   if p.root is not None)
+
+    @property
+    def key(self):
+        """Klasa wysokości pierwszego akordu (0 = C) albo None."""
+        return self.first.root if self.first is not None else None
+
+    def progression(self):
+        """Kolejne akordy jako (pryma, moll?), bez powtórzeń stojących obok siebie."""
+        seq = []
+        for line in self.lines:
+            for c in line:
+                for p in c.parts or [c]:
+                    item = (p.root, bool(p.minor))
+                    if p.root is not None and (not seq or seq[-1] != item):
+                        seq.append(item)
+        return seq
@@ -1,5 +1,6 @@
 import json
-import re
+
+from catalog import clean_text
 
 def clean_songs():
     filename = "songs.json"
@@ -9,17 +10,13 @@ def clean_songs():
             songs = json.load(f)
         
         cleaned_count = 0
-        
-        # To wyrażenie regularne szuka <br>, <br/>, <br  >, <br><br> itd.
-        # Usuwa też "---" oraz nadmiarowe spacje na końcach
-        pattern = re.compile(r'(<br\s*/?>\s*)+|---', re.IGNORECASE)
 
         for song in songs:
             for line in song.get("lyrics", []):
                 original_text = line["text"]
                 
-                # Usuwamy znaczniki i czyścimy końcówki tekstu
-                new_text = pattern.sub('', original_text).strip()
+                # Usuwamy <br>, "---" i spacje na końcach — ta sama reguła co przy wczytywaniu w aplikacji
+                new_text = clean_text(original_text)
                 
                 if original_text != new_text:
                     line["text"] = new_text
@@ -0,0 +1,250 @@
+import argparse
+import json
+import re
+import sys
+
+import numpy as np
+
+from catalog import parse_song_row, song_to_row
+from search_engine import fold
+
+# ─────────────────────────────────────────────
+#  WYSZUKIWANIE DUPLIKATÓW PIOSENEK (MinHash + LSH)
+# ─────────────────────────────────────────────
+#
+#  Tekst piosenki dzielimy na nakładające się trójki słów (shingle), a zbiór
+#  trójek streszczamy podpisem MinHash: NUM_PERM minimów po losowych funkcjach
+#  haszujących. Odsetek zgodnych pozycji dwóch podpisów przybliża podobieństwo
+#  Jaccarda ich zbiorów. Podpis dzielimy na BANDS pasm — piosenki, które mają
+#  identyczne choć jedno pasmo, trafiają do jednego kubełka i dopiero one są
+#  porównywane. Zamiast wszystkich par (50 tys. piosenek to ponad miliard par)
+#  sprawdzamy tylko kandydatów, więc całość działa w czasie bliskim liniowemu.
+#
+#  Dodatkowo piosenki o tym samym tytule po normalizacji ("Nr 122 – ...",
+#  dopiski "/mel. .../", "(muz. ...)") są zgłaszane bez względu na tekst.
+#
+#  Użycie:
+#      python find_duplicates.py                      # songs.json
+#      python find_duplicates.py inne.json --threshold 0.7
+#      python find_duplicates.py --sheet .streamlit/secrets.toml --plan plan.json
+
+SHINGLE_WORDS = 3
+NUM_PERM = 128
+BANDS = 32                  # 32 pasma po 4 pozycje: próg kandydata ok. 0.42
+DEFAULT_THRESHOLD = 0.6
+SEED = 2024
+
+_WORD_RE = re.compile(r"\w+")
+_TITLE_NOISE = [
+    re.compile(r"^\s*nr\.?\s*\d+\s*[–—-]?\s*", re.I),       # "Nr 122 – ..."
+    re.compile(r"/\s*mel\.[^/]*/?", re.I),                  # "/mel. Elkondorpasa/"
+    re.compile(r"\((?:mel|muz|sł|sl)\.[^)]*\)", re.I),      # "(mel. Guantanamera)"
+]
+
+
+def normalize_title(title):
+    """Tytuł bez numeru, dopisków o melodii i znaków przestankowych, złożony do ASCII."""
+    for pattern in _TITLE_NOISE:
+        title = pattern.sub(" ", title)
+    return " ".join(_WORD_RE.findall(fold(title)))
+
+
+def _mix(x):
+    """Mieszanie bitów 32-bitowych liczb (finalizer MurmurHash3), wektorowo."""
+    x = x ^ (x >> np.uint32(16))
+    x = x * np.uint32(0x85EBCA6B)
+    x = x ^ (x >> np.uint32(13))
+    x = x * np.uint32(0xC2B2AE35)
+    return x ^ (x >> np.uint32(16))
+
+
+_SHINGLE_MULT = (np.uint32(0x9E3779B1), np.uint32(0x85EBCA77), np.uint32(0xC2B2AE3D))
+
+
+def shingle_hashes(songs):
+    """Skróty trójek kolejnych słów tekstu wszystkich piosenek: (skróty, początki, liczby trójek).
+
+    Słowa dostają numery ze słownika, a skrót trójki to wymieszane numery jej słów,
+    liczone wektorowo dla całego korpusu naraz. Tekst krótszy niż trzy słowa daje
+    jedną trójkę dopełnioną zerami; piosenka bez tekstu nie ma żadnej.
+    """
+    k = SHINGLE_WORDS
+    vocab = {}
+    ids = []
+    offsets = []    # początek piosenki w `ids`
+    counts = []     # liczba trójek piosenki
+    for song in songs:
+        words = [vocab.setdefault(w, len(vocab) + 1) for w in _WORD_RE.findall(song["search"]["lyrics"])]
+        if words and len(words) < k:
+            words += [0] * (k - len(words))
+        offsets.append(len(ids))
+        counts.append(max(len(words) - k + 1, 0))
+        ids.extend(words)
+    counts = np.array(counts, dtype=np.int64)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    ids = np.array(ids, dtype=np.uint32)
+    windows = max(len(ids) - k + 1, 0)
+    hashed = np.zeros(windows, dtype=np.uint32)
+    for offset in range(k):
+        hashed ^= ids[offset:offset + windows] * _SHINGLE_MULT[offset]
+    # zostają trójki w całości wewnątrz jednej piosenki: j-ta zaczyna się na offsets[s] + j
+    valid = np.repeat(np.array(offsets, dtype=np.int64) - starts, counts) + np.arange(counts.sum())
+    return _mix(hashed[valid]), starts, counts
+
+
+def minhash_signatures(values, starts):
+    """Macierz podpisów (piosenki × NUM_PERM); `values` to skróty trójek kolejnych piosenek od `starts`."""
+    rng = np.random.default_rng(SEED)
+    seeds = rng.integers(0, 1 << 32, NUM_PERM, dtype=np.uint64).astype(np.uint32)
+    mults = rng.integers(0, 1 << 32, NUM_PERM, dtype=np.uint64).astype(np.uint32) | np.uint32(1)
+    signatures = np.empty((len(starts), NUM_PERM), dtype=np.uint32)
+    hashed = np.empty_like(values)
+    for i in range(NUM_PERM):
+        # i-ta permutacja: xor z ziarnem i mnożenie przez nieparzystą liczbę modulo 2^32
+        # (skróty są już wymieszane, więc to wystarcza), w miejscu, bez tablic pośrednich
+        np.bitwise_xor(values, seeds[i], out=hashed)
+        np.multiply(hashed, mults[i], out=hashed)
+        signatures[:, i] = np.minimum.reduceat(hashed, starts)
+    return signatures
+
+
+def lsh_candidates(signatures, bands=BANDS):
+    """Pary (i, j), i < j, które mają identyczne choć jedno pasmo podpisu."""
+    rows = signatures.shape[1] // bands
+    pairs = set()
+    for band in range(bands):
+        block = np.ascontiguousarray(signatures[:, band * rows:(band + 1) * rows])
+        keys = block.view(np.dtype((np.void, block.dtype.itemsize * rows))).ravel()
+        _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        if counts.max() < 2:
+            continue
+        order = np.argsort(inverse, kind="stable")
+        bounds = np.cumsum(counts)
+        for bucket in np.flatnonzero(counts > 1):
+            members = order[bounds[bucket] - counts[bucket]:bounds[bucket]].tolist()
+            for x in range(len(members)):
+                for y in range(x + 1, len(members)):
+                    pairs.add((members[x], members[y]))
+    return pairs
+
+
+def find_duplicates(songs, threshold=DEFAULT_THRESHOLD):
+    """Lista (i, j, podobieństwo, powód) par podobnych piosenek; i, j to pozycje w `songs`."""
+    values, starts, counts = shingle_hashes(songs)
+    with_text = np.flatnonzero(counts).tolist()
+    found = {}
+    if len(with_text) > 1:
+        signatures = minhash_signatures(values, starts[counts > 0])
+        for x, y in lsh_candidates(signatures):
+            similarity = float(np.mean(signatures[x] == signatures[y]))
+            if similarity >= threshold:
+                found[(with_text[x], with_text[y])] = (similarity, "tekst")
+    by_title = {}
+    for i, s in enumerate(songs):
+        key = normalize_title(s["title"])
+        if key:
+            by_title.setdefault(key, []).append(i)
+    for ids in by_title.values():
+        for x in range(len(ids)):
+            for y in range(x + 1, len(ids)):
+                if (ids[x], ids[y]) not in found:
+                    found[(ids[x], ids[y])] = (None, "tytuł")
+    return sorted(((i, j, sim, why) for (i, j), (sim, why) in found.items()),
+                  key=lambda p: (-(p[2] or 0), p[0], p[1]))
+
+
+def group_pairs(pairs):
+    """Łączy pary w grupy (union-find); grupa to posortowana lista pozycji."""
+    parent = {}
+
+    def root(i):
+        while parent.setdefault(i, i) != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j, _, _ in pairs:
+        parent[root(i)] = root(j)
+    groups = {}
+    for i in parent:
+        groups.setdefault(root(i), []).append(i)
+    return sorted((sorted(g) for g in groups.values()), key=lambda g: g[0])
+
+
+def merge_plan(songs, groups, keys):
+    """Dla każdej grupy: którą piosenkę zostawić i co przenieść z pozostałych (oceny, tagi)."""
+    plan = []
+    for group in groups:
+        keep = max(group, key=lambda i: (songs[i]["ratings_count"], len(songs[i]["lyrics"]), -i))
+        tags = []
+        for i in [keep] + [i for i in group if i != keep]:
+            tags.extend(t for t in songs[i]["tags"] if t not in tags)
+        plan.append({
+            "keep": {"key": keys[keep], "title": songs[keep]["title"]},
+            "remove": [{"key": keys[i], "title": songs[i]["title"]} for i in group if i != keep],
+            "tags": tags,
+            "ratings_sum": sum(songs[i]["ratings_sum"] for i in group),
+            "ratings_count": sum(songs[i]["ratings_count"] for i in group),
+        })
+    return plan
+
+
+# ─────────────────────────────────────────────
+#  ŹRÓDŁA DANYCH
+# ─────────────────────────────────────────────
+
+def load_json_songs(path):
+    """Piosenki z pliku JSON; kluczem jest numer piosenki w pliku (od 1)."""
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    songs, keys = [], []
+    for nr, s in enumerate(raw, 1):
+        song = parse_song_row(song_to_row(s.get("title", ""), s.get("lyrics", []), s.get("ratings_sum", 0),
+                                          s.get("ratings_count", 0), s.get("tags", [])), None)
+        if song is not None:
+            songs.append(song)
+            keys.append(nr)
+    return songs, keys
+
+
+def load_sheet_songs(credentials):
+    """Piosenki z arkusza; kluczem jest numer wiersza. `credentials` to secrets.toml albo JSON konta serwisowego."""
+    from sheet_sync import SheetSync, load_service_account, open_worksheet
+
+    songs = SheetSync(open_worksheet(load_service_account(credentials))).load()
+    return songs, [s["row"] for s in songs]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Szuka zdublowanych piosenek (MinHash + LSH).")
+    parser.add_argument("json_file", nargs="?", default="songs.json", help="plik z piosenkami (domyślnie songs.json)")
+    parser.add_argument("--sheet", metavar="CREDENTIALS", help="czytaj z arkusza; secrets.toml albo JSON konta serwisowego")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="minimalne podobieństwo tekstu (0–1)")
+    parser.add_argument("--plan", metavar="FILE", help="zapisz plan scalenia grup do pliku JSON")
+    args = parser.parse_args(argv)
+
+    if args.sheet:
+        songs, keys = load_sheet_songs(args.sheet)
+        source = "arkusz"
+    else:
+        songs, keys = load_json_songs(args.json_file)
+        source = args.json_file
+
+    pairs = find_duplicates(songs, args.threshold)
+    groups = group_pairs(pairs)
+    label = "wiersz" if args.sheet else "nr"
+    print(f"{source}: {len(songs)} piosenek, {len(pairs)} podobnych par w {len(groups)} grupach")
+    for i, j, sim, why in pairs:
+        score = f"{sim:.0%}" if sim is not None else " — "
+        print(f"  {score:>4} [{why}]  {label} {keys[i]}: {songs[i]['title']}  ↔  {label} {keys[j]}: {songs[j]['title']}")
+
+    if args.plan:
+        plan = {"source": source, "key": label, "threshold": args.threshold, "groups": merge_plan(songs, groups, keys)}
+        with open(args.plan, "w", encoding="utf-8") as f:
+            json.dump(plan, f, ensure_ascii=False, indent=2)
+        print(f"Plan scalenia ({len(groups)} grup) zapisany do {args.plan}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,233 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+
+from catalog import clean_text, format_lyrics, make_song, parse_lyrics
+from chords import split_chords
+from journal import JournaledDict, write_json_atomic
+
+# ─────────────────────────────────────────────
+#  PRZYROSTOWY IMPORT spiewnik.docx
+# ─────────────────────────────────────────────
+#
+#  Dokument jest parsowany w całości, ale do katalogu trafiają tylko różnice.
+#  Każda piosenka dostaje skrót treści (tytuł + linie tekstu z akordami po
+#  normalizacji — tej samej, którą przechodzi wiersz arkusza), a piosenki z Worda
+#  są parowane z katalogiem po tytule (k-ta piosenka o danym tytule z k-tą
+#  w katalogu). Z niesparowanych te o identycznym tekście to zmiana tytułu.
+#  Zmieniona piosenka dostaje nowy tytuł i tekst, a zachowuje tagi i oceny;
+#  niezmienione nie są ruszane wcale.
+#
+#  Użycie:
+#      python import_word.py                                   # spiewnik.docx → songs.json
+#      python import_word.py spiewnik.docx --pack songs.pack   # śpiewnik aplikacji offline
+#      python import_word.py --sheet .streamlit/secrets.toml --dry-run
+#      python import_word.py --sqlite spiewnik.db --delete     # także usunięcie piosenek spoza dokumentu
+
+
+def parse_docx(path):
+    """Piosenki z dokumentu Word: tytuł to akapit w stylu nagłówka albo pogrubiony."""
+    from docx import Document
+
+    songs = []
+    current = None
+    for para in Document(path).paragraphs:
+        text = para.text.strip()
+        if not text:
+            continue
+        if para.style.name.startswith("Heading") or (para.runs and para.runs[0].bold):
+            current = {"title": text, "lyrics": []}
+            songs.append(current)
+            continue
+        if current is not None:
+            text_clean, chords = split_chords(text)
+            current["lyrics"].append({"text": text_clean, "chords": chords})
+    return songs
+
+
+def content_hash(song):
+    """Skrót tytułu i tekstu z akordami, niezależny od tego, czy piosenka przeszła przez arkusz."""
+    # format A:E tam i z powrotem — tekst z "|" wygląda potem tak samo jak po zapisie do arkusza
+    lines = [[l["text"], l["chords"]] for l in parse_lyrics(format_lyrics(song["lyrics"]))]
+    data = json.dumps([clean_text(song["title"]), lines], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+def lyrics_hash(song):
+    return content_hash({"title": "", "lyrics": song["lyrics"]})
+
+
+def diff_songs(existing, parsed):
+    """Różnice katalogu i dokumentu: {"added": [j], "changed": [(i, j)], "removed": [i], "same": n}.
+
+    i to pozycja w `existing`, j w `parsed`.
+    """
+    by_title = {}
+    for i, song in enumerate(existing):
+        by_title.setdefault(clean_text(song["title"]), []).append(i)
+    matched, added = [], []
+    for j, song in enumerate(parsed):
+        candidates = by_title.get(clean_text(song["title"]))
+        if candidates:
+            matched.append((candidates.pop(0), j))
+        else:
+            added.append(j)
+    removed = sorted(i for ids in by_title.values() for i in ids)
+
+    # zmiana tytułu: ten sam tekst po obu stronach
+    removed_by_lyrics = {}
+    for i in removed:
+        removed_by_lyrics.setdefault(lyrics_hash(existing[i]), []).append(i)
+    renamed = []
+    for j in list(added):
+        ids = removed_by_lyrics.get(lyrics_hash(parsed[j]))
+        if ids:
+            renamed.append((ids.pop(0), j))
+            added.remove(j)
+    renamed_ids = {i for i, _ in renamed}
+    removed = [i for i in removed if i not in renamed_ids]
+
+    changed = [(i, j) for i, j in matched if content_hash(existing[i]) != content_hash(parsed[j])]
+    return {"added": added, "changed": sorted(changed + renamed), "removed": removed,
+            "same": len(matched) - len(changed)}
+
+
+def merge_song(old, new):
+    """Nowy tytuł i tekst, reszta (tagi, oceny, klucz w magazynie) z dotychczasowej piosenki."""
+    return {**old, "title": new["title"], "lyrics": new["lyrics"]}
+
+
+def new_song(song):
+    return {"title": song["title"], "lyrics": song["lyrics"], "tags": []}
+
+
+# ─────────────────────────────────────────────
+#  KATALOGI DOCELOWE
+# ─────────────────────────────────────────────
+#
+#  Każdy cel ma `songs` (piosenki katalogu) i apply(diff, parsed). Zmiany idą
+#  w kolejności: podmiany, usunięcia od końca (usunięcie przesuwa dalsze pozycje
+#  i wiersze arkusza), dopisanie nowych.
+
+class JsonTarget:
+    """songs.json — plik i tak jest zapisywany w całości, ale niezmienione piosenki zostają jak były."""
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.songs = json.load(f)
+        except FileNotFoundError:
+            self.songs = []
+
+    def apply(self, diff, parsed):
+        songs = list(self.songs)
+        for i, j in diff["changed"]:
+            songs[i] = merge_song(songs[i], parsed[j])
+        for i in reversed(diff["removed"]):
+            del songs[i]
+        songs.extend(new_song(parsed[j]) for j in diff["added"])
+        write_json_atomic(self.path, songs)
+
+
+class PackTarget:
+    """Spakowany śpiewnik aplikacji offline — jeden rekord dziennika na zmienioną piosenkę.
+
+    Oceny i tagi tej aplikacji są w ratings.json / user_tags.json pod tytułem,
+    więc przy zmianie tytułu są przenoszone pod nowy.
+    """
+
+    def __init__(self, path):
+        from songbook import SongbookStore
+
+        self.store = SongbookStore(path)
+        self.songs = list(self.store)
+        folder = os.path.dirname(path)
+        self.by_title = [JournaledDict(os.path.join(folder, name)) for name in ("ratings.json", "user_tags.json")]
+
+    def apply(self, diff, parsed):
+        for i, j in diff["changed"]:
+            old = self.songs[i]
+            self.store.put(i, merge_song(old, parsed[j]), title=old["title"])
+            if old["title"] != parsed[j]["title"]:
+                for store in self.by_title:
+                    value = store.get(old["title"])
+                    if value is not None and store.get(parsed[j]["title"]) is None:
+                        store.set(parsed[j]["title"], value)
+                        store.delete(old["title"])
+        for i in reversed(diff["removed"]):
+            self.store.delete(i, title=self.songs[i]["title"])
+        for j in diff["added"]:
+            self.store.add(new_song(parsed[j]))
+        self.store.close()
+
+
+class StorageTarget:
+    """Magazyn aplikacji (SongStorage: arkusz albo SQLite) — upsert/delete tylko zmienionych wierszy."""
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.songs = storage.load()
+
+    def apply(self, diff, parsed):
+        for i, j in diff["changed"]:
+            old = self.songs[i]
+            self.storage.upsert(merge_song(old, parsed[j]), old["row"])
+        for i in reversed(diff["removed"]):
+            self.storage.delete(self.songs[i]["row"])
+        for j in diff["added"]:
+            self.storage.upsert(make_song(parsed[j]["title"], parsed[j]["lyrics"]))
+        self.storage.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Przyrostowy import spiewnik.docx z zachowaniem tagów i ocen.")
+    parser.add_argument("docx", nargs="?", default="spiewnik.docx", help="dokument Word (domyślnie spiewnik.docx)")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--json", metavar="FILE", help="plik songs.json (domyślnie songs.json)")
+    target.add_argument("--pack", metavar="FILE", help="spakowany śpiewnik aplikacji offline (songs.pack)")
+    target.add_argument("--sheet", metavar="CREDENTIALS", help="arkusz; secrets.toml albo JSON konta serwisowego")
+    target.add_argument("--sqlite", metavar="FILE", help="lokalna baza SQLite aplikacji")
+    parser.add_argument("--delete", action="store_true", help="usuń też piosenki, których nie ma w dokumencie")
+    parser.add_argument("--dry-run", action="store_true", help="tylko pokaż różnice")
+    args = parser.parse_args(argv)
+
+    parsed = parse_docx(args.docx)
+    if args.pack:
+        target, name = PackTarget(args.pack), args.pack
+    elif args.sheet:
+        from sheet_sync import SheetSync, load_service_account, open_worksheet
+        target, name = StorageTarget(SheetSync(open_worksheet(load_service_account(args.sheet)))), "arkusz"
+    elif args.sqlite:
+        from storage import SQLiteStorage
+        target, name = StorageTarget(SQLiteStorage(args.sqlite)), args.sqlite
+    else:
+        target, name = JsonTarget(args.json or "songs.json"), args.json or "songs.json"
+
+    diff = diff_songs(target.songs, parsed)
+    print(f"{args.docx}: {len(parsed)} pieśni; {name}: {len(target.songs)} — "
+          f"bez zmian {diff['same']}, zmienione {len(diff['changed'])}, "
+          f"nowe {len(diff['added'])}, usunięte {len(diff['removed'])}")
+    for i, j in diff["changed"]:
+        old, new = target.songs[i]["title"], parsed[j]["title"]
+        print(f"  ~ {new}" if old == new else f"  ~ {old} → {new}")
+    for j in diff["added"]:
+        print(f"  + {parsed[j]['title']}")
+    for i in diff["removed"]:
+        print(f"  - {target.songs[i]['title']}")
+    if diff["removed"] and not args.delete:
+        # piosenki dodane w aplikacji nie mają odpowiednika w dokumencie — bez --delete zostają
+        print("  (piosenki spoza dokumentu zostają; usunięcie: --delete)")
+        diff = {**diff, "removed": []}
+
+    if args.dry_run or not (diff["changed"] or diff["added"] or diff["removed"]):
+        return 0
+    target.apply(diff, parsed)
+    print(f"Zapisano zmiany do {name}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,319 @@
+import contextlib
+import json
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:     # Windows
+    fcntl = None
+    import msvcrt
+
+# ─────────────────────────────────────────────
+#  DZIENNIK ZMIAN (snapshot + JSONL)
+# ─────────────────────────────────────────────
+#
+#  Plik danych jest bazą (snapshotem), a każda zmiana to jedna linia JSON dopisana
+#  na końcu dziennika — zapis kosztuje tyle, ile sama zmiana, a nie cała baza.
+#  Przy wczytaniu dziennik jest odtwarzany na bazie. Gdy urośnie ponad próg,
+#  stan jest zapisywany jako nowa baza (plik tymczasowy + os.replace) i dziennik
+#  zaczyna się od nowa.
+#
+#  Pierwsza linia dziennika to nagłówek z generacją bazy, do której się odnosi.
+#  Jeśli kompakcję przerwano po podmianie bazy, a przed wyczyszczeniem dziennika,
+#  nagłówek nie pasuje do nowej bazy i stary dziennik jest pomijany. Urwana
+#  ostatnia linia (awaria w trakcie dopisywania) jest ignorowana i obcinana przy
+#  następnym zapisie.
+#
+#  Kilka procesów (workerów Streamlit) na jednym katalogu: zapis odbywa się pod
+#  wyłączną blokadą pliku <baza>.lock, a wczytanie pod współdzieloną. Przed
+#  zapisem magazyn doczytuje cudze zmiany, więc nie nadpisuje ich starym stanem.
+#  refresh() przy każdym rerunie to tylko dwa wywołania stat: baza i dziennik są
+#  czytane ponownie dopiero, gdy zmieni się i-węzeł, rozmiar albo mtime, a gdy
+#  dziennik tylko urósł, doczytywany jest sam jego koniec.
+
+COMPACT_BYTES = 256 * 1024
+
+
+def journal_path_for(path):
+    return os.path.splitext(path)[0] + ".journal"
+
+
+def file_signature(path):
+    """(i-węzeł, rozmiar, mtime) pliku albo None, gdy pliku nie ma."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+@contextlib.contextmanager
+def file_lock(path, shared=False):
+    """Doradcza blokada <path>.lock między procesami; na Windows zawsze wyłączna.
+
+    Blokady nie wolno zagnieżdżać w jednym procesie — druga blokada tego samego
+    pliku czekałaby na pierwszą.
+    """
+    with open(f"{path}.lock", "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.01)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _header(generation):
+    return json.dumps({"generation": generation}).encode("utf-8") + b"\n"
+
+
+def _parse_lines(data):
+    """Pełne rekordy z początku `data` i długość przeczytanej części."""
+    records = []
+    pos = 0
+    while True:
+        nl = data.find(b"\n", pos)
+        if nl < 0:
+            break
+        try:
+            records.append(json.loads(data[pos:nl]))
+        except ValueError:
+            break
+        pos = nl + 1
+    return records, pos
+
+
+class Journal:
+    """Dziennik operacji w pliku JSONL; `end` to koniec ostatniego pełnego rekordu."""
+
+    def __init__(self, path):
+        self.path = path
+        self.end = 0
+
+    def read(self, generation):
+        """Rekordy dziennika dla bazy danej generacji (pusta lista dla innej generacji)."""
+        self.end = 0
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        records, end = _parse_lines(data)
+        if not records or records[0].get("generation") != generation:
+            return []
+        self.end = end
+        return records[1:]
+
+    def read_more(self):
+        """Rekordy dopisane za `end` (np. przez inne procesy) albo None, gdy dziennik trzeba czytać od nowa."""
+        if self.end == 0:
+            return None
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() < self.end:
+                    return None
+                f.seek(self.end)
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        records, end = _parse_lines(data)
+        self.end += end
+        return records
+
+    def append(self, record, generation):
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+        if self.end == 0:
+            # brak dziennika (albo dziennik starej bazy) — zaczynamy od nagłówka
+            with open(self.path, "wb") as f:
+                f.write(_header(generation) + line)
+                f.flush()
+                os.fsync(f.fileno())
+            self.end = len(_header(generation)) + len(line)
+            return
+        with open(self.path, "r+b") as f:
+            f.seek(self.end)
+            f.truncate()
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        self.end += len(line)
+
+    def reset(self, generation):
+        """Pusty dziennik dla nowej bazy, podmieniany atomowo."""
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(_header(generation))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self.end = len(_header(generation))
+
+    def size(self):
+        return self.end
+
+
+def write_json_atomic(path, data):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+# ─────────────────────────────────────────────
+#  MAGAZYN: BAZA + DZIENNIK
+# ─────────────────────────────────────────────
+
+class JournaledStore:
+    """Wspólna część magazynów z dziennikiem: blokady, doczytywanie cudzych zmian i kompakcja.
+
+    Podklasa podaje ścieżkę bazy (`path`), generację bazy (`generation`) oraz
+    _load_base(), _apply(rekord) i _write_base(). `revision` rośnie przy każdej
+    zmianie stanu — własnej albo doczytanej z dysku.
+    """
+
+    generation = 0
+
+    def __init__(self, path, journal_path, compact_bytes=COMPACT_BYTES):
+        self.path = path
+        self.compact_bytes = compact_bytes
+        self.journal = Journal(journal_path)
+        self.lock = threading.RLock()
+        self.revision = 0
+        self._signatures = None
+        with self.lock, file_lock(self.path, shared=True):
+            self._load()
+
+    def _current_signatures(self):
+        return file_signature(self.path), file_signature(self.journal.path)
+
+    def _load(self):
+        self._signatures = self._current_signatures()
+        self._load_base()
+        for record in self.journal.read(self.generation):
+            self._apply(record)
+        self.revision += 1
+
+    def _catch_up(self):
+        """Uzgadnia stan z dyskiem (pod blokadą pliku): koniec dziennika albo całość od nowa."""
+        signatures = self._current_signatures()
+        if signatures == self._signatures:
+            return False
+        (old_base, old_journal), (base, journal) = self._signatures, signatures
+        if base == old_base and journal and old_journal and journal[0] == old_journal[0]:
+            records = self.journal.read_more()
+            if records is not None:
+                for record in records:
+                    self._apply(record)
+                self._signatures = signatures
+                self.revision += 1
+                return True
+        self._close_base()
+        self._load()
+        return True
+
+    def refresh(self):
+        """Doczytuje zmiany innych procesów; bez zmian na dysku to tylko dwa wywołania stat."""
+        with self.lock:
+            if self._current_signatures() == self._signatures:
+                return False
+            with file_lock(self.path, shared=True):
+                return self._catch_up()
+
+    def _write(self, make_record):
+        """Zapis pod wyłączną blokadą: doczytanie cudzych zmian, rekord z `make_record()`, dopisanie."""
+        with self.lock, file_lock(self.path):
+            self._catch_up()
+            record = make_record()
+            if record is None:
+                return None
+            self.journal.append(record, self.generation)
+            self._apply(record)
+            if self.journal.size() > self.compact_bytes:
+                self._compact()
+            self._signatures = self._current_signatures()
+            self.revision += 1
+            return record
+
+    def _compact(self):
+        try:
+            self._write_base()
+        except OSError:
+            # np. plik zmapowany przez inny proces na Windows — kompakcja przy następnym zapisie
+            return
+        self.journal.reset(self.generation)
+
+    def compact(self):
+        """Zapisuje bieżący stan jako nową bazę i zaczyna pusty dziennik."""
+        with self.lock, file_lock(self.path):
+            self._catch_up()
+            self._compact()
+            self._signatures = self._current_signatures()
+
+    def _close_base(self):
+        pass
+
+
+class JournaledDict(JournaledStore):
+    """Słownik w pliku JSON (np. ratings.json) z dziennikiem operacji set/del.
+
+    Operacje zapisują całą nową wartość klucza, więc są idempotentne — ponowne
+    odtworzenie dziennika na nowszej bazie niczego nie psuje, a baza może
+    pozostać zwykłym słownikiem JSON bez numeru generacji.
+    """
+
+    def __init__(self, path, compact_bytes=COMPACT_BYTES):
+        super().__init__(path, journal_path_for(path), compact_bytes)
+
+    def _load_base(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.data = json.load(f)
+        except (OSError, ValueError):
+            # brak pliku albo uszkodzony JSON — pusty słownik, jak dawniej load_json w aplikacji
+            self.data = {}
+
+    def _apply(self, record):
+        if record["op"] == "set":
+            self.data[record["key"]] = record["value"]
+        elif record["op"] == "del":
+            self.data.pop(record["key"], None)
+
+    def _write_base(self):
+        write_json_atomic(self.path, self.data)
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def set(self, key, value):
+        self._write(lambda: {"op": "set", "key": key, "value": value})
+
+    def update(self, key, change, default=None):
+        """Nowa wartość `change(stara)` liczona pod blokadą, na stanie z cudzymi zmianami.
+
+        Gdy `change` zwróci None, nic nie jest zapisywane.
+        """
+        def make_record():
+            value = change(self.data.get(key, default))
+            return None if value is None else {"op": "set", "key": key, "value": value}
+        record = self._write(make_record)
+        return record["value"] if record else None
+
+    def delete(self, key):
+        self._write(lambda: {"op": "del", "key": key})
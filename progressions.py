@@ -0,0 +1,129 @@
+import numpy as np
+
+# ─────────────────────────────────────────────
+#  PODOBNE PROGRESJE AKORDÓW
+# ─────────────────────────────────────────────
+#
+#  Odcisk piosenki nie zależy od tonacji: każde przejście między akordami to
+#  (interwał prymy 0–11, moll?, moll?), a n-gramy kolejnych przejść (n = 1..3) są
+#  haszowane do wektora DIM liczb. Wektory leżą w jednej macierzy NumPy, więc
+#  podobieństwo (cosinus) piosenki do całego śpiewnika to jedno mnożenie
+#  macierz × wektor, a lista sąsiadów jest pamiętana do zmiany akordów.
+
+DIM = 512
+NGRAMS = (1, 2, 3)
+
+
+def interval_tokens(progression):
+    """Przejścia między kolejnymi akordami jako liczby 0–47."""
+    return [((b[0] - a[0]) % 12) * 4 + a[1] * 2 + b[1] for a, b in zip(progression, progression[1:])]
+
+
+def fingerprint(progression, dim=DIM):
+    """Znormalizowany wektor n-gramów przejść (waga 1 + ln(liczba)); zerowy, gdy akordów brak."""
+    vec = np.zeros(dim, dtype=np.float32)
+    tokens = interval_tokens(progression)
+    for n in NGRAMS:
+        for i in range(len(tokens) - n + 1):
+            feature = n
+            for t in tokens[i:i + n]:
+                feature = feature * 48 + t
+            vec[(feature * 2654435761) % (1 << 32) % dim] += 1
+    used = vec > 0
+    vec[used] = 1 + np.log(vec[used])
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+class ChordNeighbours:
+    """Piosenki o podobnym przebiegu akordów: macierz odcisków i pamięć list K sąsiadów.
+
+    Lista sąsiadów piosenki jest liczona przy pierwszym odczycie (jedno mnożenie
+    przez macierz, bez porównywania par w Pythonie). Nowa lub zmieniona piosenka
+    jest dopisywana do zapamiętanych list, w których mieści się w pierwszej K;
+    listy, z których mogła wypaść, są liczone od nowa przy następnym odczycie.
+    """
+
+    K = 10
+
+    def __init__(self, dim=DIM):
+        self.dim = dim
+        self.matrix = np.zeros((64, dim), dtype=np.float32)
+        self.row = {}           # id → wiersz macierzy
+        self.ids = []           # wiersz → id (None = wolny)
+        self.free = []
+        self.neighbours = {}    # id → [(podobieństwo, -id)] malejąco
+
+    @classmethod
+    def from_chords(cls, chords):
+        idx = cls()
+        for sid, sc in chords.items():
+            idx.add(sid, sc)
+        return idx
+
+    def _take_row(self):
+        if self.free:
+            return self.free.pop()
+        row = len(self.ids)
+        if row == len(self.matrix):
+            grown = np.zeros((2 * len(self.matrix), self.dim), dtype=np.float32)
+            grown[:row] = self.matrix
+            self.matrix = grown
+        self.ids.append(None)
+        return row
+
+    def add(self, sid, song_chords):
+        vec = fingerprint(song_chords.progression(), self.dim)
+        row = self._take_row()
+        self.matrix[row] = vec
+        self.row[sid] = row
+        self.ids[row] = sid
+        cached = [other for other in self.neighbours if other != sid]
+        if not cached or not vec.any():
+            return
+        sims = self.matrix[[self.row[other] for other in cached]] @ vec
+        for other, sim in zip(cached, sims.tolist()):
+            ranked = self.neighbours[other]
+            entry = (sim, -sid)
+            if sim > 0 and (len(ranked) < self.K or entry > ranked[-1]):
+                ranked.append(entry)
+                ranked.sort(reverse=True)
+                del ranked[self.K:]
+
+    def remove(self, sid):
+        row = self.row.pop(sid, None)
+        if row is None:
+            return
+        self.matrix[row] = 0
+        self.ids[row] = None
+        self.free.append(row)
+        self.neighbours.pop(sid, None)
+        for other, ranked in list(self.neighbours.items()):
+            if any(e[1] == -sid for e in ranked):
+                del self.neighbours[other]
+
+    def _top(self, row, k):
+        n = len(self.ids)
+        sims = self.matrix[:n] @ self.matrix[row]
+        sims[row] = 0
+        if k < n:
+            candidates = np.argpartition(-sims, k)[:k]
+        else:
+            candidates = np.arange(n)
+        entries = [(float(sims[i]), -self.ids[i]) for i in candidates.tolist()
+                   if sims[i] > 0 and self.ids[i] is not None]
+        entries.sort(reverse=True)
+        return entries
+
+    def similar(self, sid, k=K):
+        """Lista (id, podobieństwo 0–1) piosenek o najbliższym przebiegu akordów."""
+        row = self.row.get(sid)
+        if row is None:
+            return []
+        if k > self.K:
+            ranked = self._top(row, k)
+        else:
+            ranked = self.neighbours.get(sid)
+            if ranked is None:
+                ranked = self.neighbours[sid] = self._top(row, self.K)
+        return [(-e[1], e[0]) for e in ranked[:k]]
@@ -0,0 +1,191 @@
+import base64
+import hashlib
+import json
+import os
+import zlib
+
+import requests
+
+from catalog import public_song
+
+# ─────────────────────────────────────────────
+#  PUBLIKACJA songs.json NA GITHUBIE
+# ─────────────────────────────────────────────
+#
+#  Katalog jest kodowany strumieniowo: piosenka po piosence trafia jednocześnie
+#  do skrótu SHA-256, do kodera base64 (treść dla API GitHuba) i opcjonalnie do
+#  kompresora gzip — bez kopii list piosenek i bez kilku pełnych napisów JSON
+#  w pamięci. Przed wysyłką sha pliku w repozytorium (zapytanie o dokładnie tę
+#  ścieżkę) jest porównywany z sha blobu gita naszej treści i wysyłka jest pomijana
+#  tylko wtedy, gdy są równe — plik zmieniony na GitHubie poza aplikacją zostanie
+#  nadpisany. Ostatnia publikacja jest zapisywana w małym pliku stanu.
+#
+#  Klient HTTP jest podawany z zewnątrz (`session`, domyślnie requests.Session),
+#  a adres API można zmienić — w testach zamiast GitHuba może stać lokalny serwer.
+
+API_URL = "https://api.github.com"
+_INTERNAL = ("row", "search")
+
+
+def encode_catalog(songs, compact=True):
+    """Kawałki (bytes) pliku songs.json: zwarty JSON albo z wcięciami jak json.dumps(indent=2)."""
+    if compact:
+        dumps = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+        yield b"["
+        for i, song in enumerate(songs):
+            fields = [f"{dumps(k)}:{dumps(v)}" for k, v in song.items() if k not in _INTERNAL]
+            yield ("," if i else "").encode("utf-8") + ("{" + ",".join(fields) + "}").encode("utf-8")
+        yield b"]"
+        return
+    first = True
+    for song in songs:
+        text = json.dumps(public_song(song), ensure_ascii=False, indent=2).replace("\n", "\n  ")
+        yield (("[\n  " if first else ",\n  ") + text).encode("utf-8")
+        first = False
+    yield b"\n]" if not first else b"[]"
+
+
+class _Base64Stream:
+    """Przyrostowe base64: niepełne trójki bajtów czekają na następny kawałek."""
+
+    def __init__(self):
+        self.parts = []
+        self.rest = b""
+
+    def update(self, data):
+        data = self.rest + data
+        cut = len(data) - len(data) % 3
+        self.parts.append(base64.b64encode(data[:cut]))
+        self.rest = data[cut:]
+
+    def finish(self):
+        self.parts.append(base64.b64encode(self.rest))
+        return b"".join(self.parts)
+
+
+def git_blob_sha(data):
+    """sha, pod którym git (i API GitHuba) zna plik o treści `data`."""
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def prepare(songs, compact=True, gzip_sidecar=False):
+    """Jedno przejście po katalogu: skrót treści, treść w base64 i (opcjonalnie) gzip w base64.
+
+    `sha` / `gzip_sha` to sha blobów gita do porównania z plikami w repozytorium.
+    """
+    digest = hashlib.sha256()
+    content = _Base64Stream()
+    gz = zlib.compressobj(9, zlib.DEFLATED, 31) if gzip_sidecar else None
+    gz_content = _Base64Stream() if gzip_sidecar else None
+    size = gzip_size = 0
+    for chunk in encode_catalog(songs, compact):
+        size += len(chunk)
+        digest.update(chunk)
+        content.update(chunk)
+        if gz is not None:
+            packed = gz.compress(chunk)
+            gzip_size += len(packed)
+            gz_content.update(packed)
+    result = {"hash": digest.hexdigest(), "size": size, "content": content.finish()}
+    result["sha"] = git_blob_sha(base64.b64decode(result["content"]))
+    if gz is not None:
+        packed = gz.flush()
+        gz_content.update(packed)
+        result["gzip"] = gz_content.finish()
+        result["gzip_size"] = gzip_size + len(packed)
+        result["gzip_sha"] = git_blob_sha(base64.b64decode(result["gzip"]))
+    return result
+
+
+def _load_state(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        return state if isinstance(state, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_state(path, state):
+    tmp = f"{path}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+class GitHubPublisher:
+    """Wysyła songs.json (i opcjonalnie songs.json.gz) przez API GitHuba, tylko gdy plik w repozytorium jest inny."""
+
+    def __init__(self, repo, token, path="songs.json", session=None, api_url=API_URL, state_path=None):
+        self.repo = repo
+        self.path = path
+        self.session = session if session is not None else requests.Session()
+        self.api_url = api_url.rstrip("/")
+        self.headers = {"Authorization": f"token {token}", "Accept": "application/vnd.github.v3+json"}
+        self.state_path = state_path
+        self.state = _load_state(state_path) if state_path else {}
+
+    def _url(self, path):
+        return f"{self.api_url}/repos/{self.repo}/contents/{path}"
+
+    def remote_sha(self, path):
+        """sha blobu pliku `path` w repozytorium albo None, gdy go nie ma (lub API nie odpowiedziało)."""
+        # typ "object" działa też dla plików powyżej 1 MB (wtedy bez treści w odpowiedzi)
+        res = self.session.get(self._url(path), headers={**self.headers, "Accept": "application/vnd.github.object+json"})
+        if res.status_code != 200:
+            return None
+        info = res.json()
+        return info.get("sha") if isinstance(info, dict) else None
+
+    def _send(self, path, content_b64, message, sha):
+        head = {"message": message}
+        if sha:
+            head["sha"] = sha
+        # treść (największa część) jest doklejana do gotowych bajtów, bez json.dumps całego ładunku
+        body = json.dumps(head)[:-1].encode("utf-8") + b', "content": "' + content_b64 + b'"}'
+        return self.session.put(self._url(path), headers={**self.headers, "Content-Type": "application/json"},
+                                data=body)
+
+    def _put(self, path, content_b64, message, sha):
+        key = f"sha:{path}"
+        res = self._send(path, content_b64, message, sha)
+        if res.status_code in (409, 422):
+            # plik zmieniono poza aplikacją (albo nie znaliśmy sha) — aktualny sha i jeszcze jedna próba
+            res = self._send(path, content_b64, message, self.remote_sha(path))
+        if res.status_code in (200, 201):
+            self.state[key] = res.json().get("content", {}).get("sha")
+            return True, res.text
+        return False, res.text
+
+    def publish(self, songs, compact=True, gzip_sidecar=False, message="Aktualizacja bazy utworów via Streamlit"):
+        """Publikuje katalog; zwraca {"status": "published"|"skipped"|"error", "hash", "size", ...}."""
+        prepared = prepare(songs, compact, gzip_sidecar)
+        version = prepared["hash"] + ("" if compact else ":pretty")
+        result = {"hash": prepared["hash"], "size": prepared["size"], "gzip_size": prepared.get("gzip_size")}
+        # pominięcie tylko wtedy, gdy w repozytorium leży dokładnie ta treść
+        main_sha = self.remote_sha(self.path)
+        main_done = main_sha == prepared["sha"]
+        gzip_sha = self.remote_sha(self.path + ".gz") if gzip_sidecar else None
+        gzip_done = not gzip_sidecar or gzip_sha == prepared["gzip_sha"]
+        if main_done and gzip_done:
+            return {**result, "status": "skipped"}
+        if not main_done:
+            ok, text = self._put(self.path, prepared["content"], message, main_sha)
+            if not ok:
+                return {**result, "status": "error", "error": text}
+            self.state["hash"] = version
+        if not gzip_done:
+            ok, text = self._put(self.path + ".gz", prepared["gzip"], message, gzip_sha)
+            if not ok:
+                self._save()
+                return {**result, "status": "error", "error": text}
+            self.state["gzip_hash"] = version
+        self._save()
+        return {**result, "status": "published"}
+
+    def _save(self):
+        if self.state_path:
+            _save_state(self.state_path, self.state)
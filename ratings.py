@@ -0,0 +1,106 @@
+import heapq
+
+# ─────────────────────────────────────────────
+#  OCENY: SUMY I RANKINGI
+# ─────────────────────────────────────────────
+#
+#  Sumy ocen całego śpiewnika i rankingi są aktualizowane przy każdej ocenie,
+#  a nie liczone od nowa przy każdym renderze. Ranking to kopiec z leniwym
+#  usuwaniem: zmiana oceny dokłada nowy wpis (O(log n)), a wpisy nieaktualne są
+#  pomijane i wyrzucane przy odczycie.
+#
+#  "Wynik" piosenki to średnia bayesowska: do jej ocen doliczamy PRIOR_VOTES
+#  wirtualnych głosów o wartości PRIOR_MEAN, więc jedna piątka nie wystarczy,
+#  żeby wyprzedzić piosenkę z dziesięcioma czwórkami. Stała wartość a priori
+#  (zamiast bieżącej średniej wszystkich ocen) sprawia, że ocena jednej piosenki
+#  nie zmienia wyników pozostałych.
+
+PRIOR_MEAN = 3.0
+PRIOR_VOTES = 5
+
+
+def bayesian_score(ratings_sum, ratings_count, prior_mean=PRIOR_MEAN, prior_votes=PRIOR_VOTES):
+    return (prior_mean * prior_votes + ratings_sum) / (prior_votes + ratings_count)
+
+
+class RatingIndex:
+    """Sumy ocen i rankingi ocenionych piosenek: "count" (liczba głosów) i "score" (średnia bayesowska)."""
+
+    RANKINGS = ("count", "score")
+
+    def __init__(self):
+        self.ratings = {}       # id → (suma, liczba) — tylko ocenione piosenki
+        self.total_sum = 0
+        self.total_count = 0
+        self.heaps = {name: [] for name in self.RANKINGS}
+
+    @classmethod
+    def from_songs(cls, songs):
+        idx = cls()
+        for sid, s in songs.items():
+            r_sum, r_count = s.get("ratings_sum", 0), s.get("ratings_count", 0)
+            if r_count > 0:
+                idx.ratings[sid] = (r_sum, r_count)
+                idx.total_sum += r_sum
+                idx.total_count += r_count
+        idx._rebuild()
+        return idx
+
+    def _entry(self, name, sid, r_sum, r_count):
+        key = r_count if name == "count" else bayesian_score(r_sum, r_count)
+        return -key, sid, r_sum, r_count
+
+    def _rebuild(self):
+        for name in self.RANKINGS:
+            heap = self.heaps[name] = [self._entry(name, sid, *r) for sid, r in self.ratings.items()]
+            heapq.heapify(heap)
+
+    def set(self, sid, ratings_sum, ratings_count):
+        """Nowe oceny piosenki; O(log n)."""
+        if self.ratings.get(sid) == (ratings_sum, ratings_count):
+            return
+        self.remove(sid)
+        if ratings_count <= 0:
+            return
+        self.ratings[sid] = (ratings_sum, ratings_count)
+        self.total_sum += ratings_sum
+        self.total_count += ratings_count
+        for name in self.RANKINGS:
+            heapq.heappush(self.heaps[name], self._entry(name, sid, ratings_sum, ratings_count))
+        if len(self.heaps["count"]) > 2 * len(self.ratings) + 64:
+            self._rebuild()
+
+    def remove(self, sid):
+        old = self.ratings.pop(sid, None)
+        if old is not None:
+            self.total_sum -= old[0]
+            self.total_count -= old[1]
+
+    # ── zapytania ──
+
+    def top(self, by="score", n=10):
+        """Id n najlepszych piosenek wg rankingu `by`; remisy rozstrzyga mniejsze id."""
+        heap = self.heaps[by]
+        found, seen = [], set()
+        while heap and len(found) < n:
+            entry = heapq.heappop(heap)
+            sid = entry[1]
+            if sid not in seen and self.ratings.get(sid) == entry[2:]:
+                seen.add(sid)
+                found.append(entry)
+        for entry in found:
+            heapq.heappush(heap, entry)
+        return [entry[1] for entry in found]
+
+    def average(self, sid):
+        r_sum, r_count = self.ratings.get(sid, (0, 0))
+        return r_sum / r_count if r_count else 0.0
+
+    def totals(self):
+        """Liczba ocenionych piosenek, liczba ocen i średnia wszystkich ocen."""
+        return {
+            "rated": len(self.ratings),
+            "count": self.total_count,
+            "sum": self.total_sum,
+            "average": self.total_sum / self.total_count if self.total_count else 0.0,
+        }
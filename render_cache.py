@@ -0,0 +1,80 @@
+import threading
+from collections import OrderedDict
+
+# ─────────────────────────────────────────────
+#  CACHE WYRENDEROWANYCH PIOSENEK (LRU)
+# ─────────────────────────────────────────────
+
+
+class RenderCache:
+    """HTML piosenki pod kluczem (id, wersja piosenki, transpozycja), wspólny dla sesji.
+
+    Najdawniej używane wpisy wypadają po przekroczeniu `max_entries`. Gdy piosenka
+    dostanie nową wersję (ocena, tagi, edycja), jej stare wpisy są usuwane przy
+    pierwszym odczycie nowej — pozostałe piosenki zostają w cache'u.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()    # (id, wersja, transpozycja) → html
+        self.by_song = {}               # id → klucze jego wpisów
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, sid, version, transposition, build):
+        """HTML z cache'u albo zbudowany przez `build()` i zapamiętany."""
+        key = (sid, version, transposition)
+        with self.lock:
+            html = self.entries.get(key)
+            if html is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return html
+            self.misses += 1
+            self._drop(sid, keep_version=version)
+        html = build()
+        with self.lock:
+            self.entries[key] = html
+            self.by_song.setdefault(sid, set()).add(key)
+            while len(self.entries) > self.max_entries:
+                old, _ = self.entries.popitem(last=False)
+                self._forget(old)
+                self.evictions += 1
+        return html
+
+    def _forget(self, key):
+        keys = self.by_song.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.by_song[key[0]]
+
+    def _drop(self, sid, keep_version=None):
+        for key in list(self.by_song.get(sid, ())):
+            if key[1] != keep_version:
+                del self.entries[key]
+                self._forget(key)
+
+    def invalidate(self, sid):
+        """Usuwa wszystkie wpisy piosenki (np. po usunięciu jej z katalogu)."""
+        with self.lock:
+            self._drop(sid)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.by_song.clear()
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
@@ -0,0 +1,257 @@
+import heapq
+import math
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import Counter, OrderedDict
+
+# ─────────────────────────────────────────────
+#  WYSZUKIWARKA: bez polskich znaków, z literówkami, z rankingiem BM25
+# ─────────────────────────────────────────────
+
+_PL_FOLD = str.maketrans("ąćęłńóśźżĄĆĘŁŃÓŚŹŻ", "acelnoszzACELNOSZZ")
+_WORD_RE = re.compile(r"\w+")
+
+
+def fold(text):
+    """Małe litery bez ogonków: "Żółta" → "zolta"."""
+    text = text.translate(_PL_FOLD).lower()
+    if text.isascii():
+        return text
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+
+def fold_tokens(text):
+    return _WORD_RE.findall(fold(text))
+
+
+def trigrams(term):
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b, limit):
+    """Odległość Damerau-Levenshteina (z przestawieniem sąsiednich liter); > limit → limit + 1."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if prev2 is not None and i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+class SearchEngine:
+    """Indeks BM25F po tytułach i tekstach + indeks trigramów słownika do dopasowań z literówkami.
+
+    Trafienie w tytule waży `title_weight` razy więcej niż w tekście. Ostatnie słowo
+    zapytania traktowane jest też jako prefiks (użytkownik jeszcze pisze).
+    """
+
+    FIELDS = ("title", "lyrics")
+    MAX_PREFIX_TERMS = 10
+    MIN_PREFIX_LEN = 2
+    MAX_FUZZY_TERMS = 5
+    MIN_SHARED_TRIGRAMS = 2
+    MAX_CACHED_IMPACTS = 512
+
+    def __init__(self, title_weight=3.0, k1=1.2, b=0.75):
+        self.weights = {"title": title_weight, "lyrics": 1.0}
+        self.k1 = k1
+        self.b = b
+        self.postings = {}          # słowo → {id: {pole: tf}}
+        self.doc_len = {}           # id → {pole: liczba słów}
+        self.doc_terms = {}         # id → zbiór słów (do usuwania)
+        self.total_len = {f: 0 for f in self.FIELDS}
+        self.trigram_terms = {}     # trigram → zbiór słów
+        self._vocab = None
+        self._impacts = OrderedDict()   # słowo → {id: gotowy wkład BM25}, LRU czyszczone przy zmianach
+
+    @classmethod
+    def from_songs(cls, songs, **kwargs):
+        engine = cls(**kwargs)
+        for sid, s in songs.items():
+            engine.add_song(sid, s)
+        return engine
+
+    # ── budowa / aktualizacja ──
+
+    def _fields(self, song):
+        folded = song.get("search")
+        if folded:
+            # tytuł i tekst złożone już przy wczytaniu (catalog.make_song)
+            return {field: _WORD_RE.findall(folded[field]) for field in self.FIELDS}
+        return {
+            "title": fold_tokens(song["title"]),
+            "lyrics": fold_tokens(" ".join(l["text"] for l in song["lyrics"])),
+        }
+
+    def add_song(self, sid, song):
+        if sid in self.doc_len:
+            self.remove_song(sid)
+        self._impacts.clear()
+        lens = {}
+        terms = set()
+        for field, words in self._fields(song).items():
+            lens[field] = len(words)
+            self.total_len[field] += len(words)
+            for term, tf in Counter(words).items():
+                docs = self.postings.get(term)
+                if docs is None:
+                    docs = self.postings[term] = {}
+                    for g in trigrams(term):
+                        self.trigram_terms.setdefault(g, set()).add(term)
+                    self._vocab = None
+                docs.setdefault(sid, {})[field] = tf
+                terms.add(term)
+        self.doc_len[sid] = lens
+        self.doc_terms[sid] = terms
+
+    def remove_song(self, sid):
+        lens = self.doc_len.pop(sid, None)
+        if lens is None:
+            return
+        self._impacts.clear()
+        for field, n in lens.items():
+            self.total_len[field] -= n
+        for term in self.doc_terms.pop(sid, ()):
+            docs = self.postings[term]
+            del docs[sid]
+            if not docs:
+                del self.postings[term]
+                for g in trigrams(term):
+                    bucket = self.trigram_terms.get(g)
+                    if bucket:
+                        bucket.discard(term)
+                        if not bucket:
+                            del self.trigram_terms[g]
+                self._vocab = None
+
+    # ── rozwijanie słów zapytania ──
+
+    def _prefix_terms(self, prefix):
+        if self._vocab is None:
+            self._vocab = sorted(self.postings)
+        out = []
+        i = bisect_left(self._vocab, prefix)
+        while i < len(self._vocab) and self._vocab[i].startswith(prefix):
+            out.append(self._vocab[i])
+            i += 1
+        if len(out) > self.MAX_PREFIX_TERMS:
+            out = heapq.nlargest(self.MAX_PREFIX_TERMS, out, key=lambda t: len(self.postings[t]))
+        return out
+
+    def _fuzzy_terms(self, term):
+        """Słowa ze słownika z literówką względem `term`: kandydaci z trigramów, weryfikacja odległością edycyjną."""
+        if len(term) < 3:
+            return []
+        limit = 1 if len(term) <= 5 else 2
+        shared = Counter()
+        for g in trigrams(term):
+            for cand in self.trigram_terms.get(g, ()):
+                if abs(len(cand) - len(term)) <= limit:
+                    shared[cand] += 1
+        scored = []
+        for cand, n in shared.items():
+            if n < self.MIN_SHARED_TRIGRAMS:
+                continue
+            dist = edit_distance(term, cand, limit)
+            if dist <= limit:
+                scored.append((1 - dist / (len(term) + 1), cand))
+        return heapq.nlargest(self.MAX_FUZZY_TERMS, scored)
+
+    def expand(self, term, is_last=False):
+        """Lista (słowo ze słownika, waga) dla jednego słowa zapytania."""
+        expansions = {}
+        if term in self.postings:
+            expansions[term] = 1.0
+        if is_last and len(term) >= self.MIN_PREFIX_LEN:
+            for t in self._prefix_terms(term):
+                expansions.setdefault(t, 0.8)
+        if not expansions:
+            for sim, t in self._fuzzy_terms(term):
+                expansions[t] = sim
+        return list(expansions.items())
+
+    # ── ranking ──
+
+    def _cached(self, key):
+        impacts = self._impacts.get(key)
+        if impacts is not None:
+            self._impacts.move_to_end(key)
+        return impacts
+
+    def _remember(self, key, impacts):
+        # każdy nowy prefiks wpisywanego słowa to osobny wpis — najdawniej użyte wypadają
+        self._impacts[key] = impacts
+        while len(self._impacts) > self.MAX_CACHED_IMPACTS:
+            self._impacts.popitem(last=False)
+
+    def _term_impacts(self, term):
+        """Wkład BM25F słowa dla każdej piosenki — liczony raz i trzymany do następnej zmiany korpusu."""
+        impacts = self._cached(term)
+        if impacts is not None:
+            return impacts
+        n = len(self.doc_len)
+        docs = self.postings[term]
+        idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+        avg = {f: (self.total_len[f] / n) or 1.0 for f in self.FIELDS}
+        k1, b = self.k1, self.b
+        impacts = {}
+        for sid, tfs in docs.items():
+            lens = self.doc_len[sid]
+            wtf = 0.0
+            for field, tf in tfs.items():
+                wtf += self.weights[field] * tf / (1 - b + b * lens[field] / avg[field])
+            impacts[sid] = idf * wtf * (k1 + 1) / (wtf + k1)
+        self._remember(term, impacts)
+        return impacts
+
+    def _query_term_impacts(self, qt, is_last):
+        """Wkład jednego słowa zapytania po rozwinięciu (prefiks / literówki), też z cache."""
+        key = (qt, is_last)
+        best = self._cached(key)
+        if best is not None:
+            return best
+        expansions = self.expand(qt, is_last)
+        if len(expansions) == 1 and expansions[0][1] == 1.0:
+            best = self._term_impacts(expansions[0][0])
+        else:
+            best = {}
+            for term, weight in expansions:
+                for sid, s in self._term_impacts(term).items():
+                    s *= weight
+                    if s > best.get(sid, 0.0):
+                        best[sid] = s
+        self._remember(key, best)
+        return best
+
+    def search(self, query, k=10):
+        """Najlepsze `k` wyników jako lista (id piosenki, wynik), od najlepszego."""
+        terms = fold_tokens(query)
+        if not terms or not self.doc_len:
+            return []
+        per_term = [self._query_term_impacts(qt, is_last=(i == len(terms) - 1)) for i, qt in enumerate(terms)]
+        per_term.sort(key=len)
+        # piosenki pasujące do wszystkich słów zapytania idą przed częściowymi
+        full = set(per_term[0]).intersection(*per_term[1:])
+        if len(full) >= k:
+            return heapq.nlargest(k, ((sid, sum(d[sid] for d in per_term)) for sid in full), key=lambda x: x[1])
+        scores = {}
+        matched = Counter()
+        for best in per_term:
+            for sid, s in best.items():
+                scores[sid] = scores.get(sid, 0.0) + s
+                matched[sid] += 1
+        # najpierw liczba dopasowanych słów, dopiero w jej obrębie wynik
+        coord = len(terms)
+        top = heapq.nlargest(k, scores.items(), key=lambda x: (matched[x[0]], x[1]))
+        return [(sid, s * matched[sid] / coord) for sid, s in top]
@@ -0,0 +1,437 @@
+import hashlib
+import json
+import threading
+import time
+
+import gspread
+from google.oauth2.service_account import Credentials
+
+from catalog import parse_song_row, song_to_row
+from storage import SongStorage
+
+# ─────────────────────────────────────────────
+#  SYNCHRONIZACJA PRZYROSTOWA Z ARKUSZEM
+# ─────────────────────────────────────────────
+#
+#  Kolumna F ("Rev") trzyma skrót treści A:E danego wiersza. Aplikacja wpisuje go
+#  przy każdym zapisie, a przy synchronizacji czyta tylko wąskie kolumny A i F.
+#  Pobierane są jedynie wiersze, których tytuł albo Rev różni się od zapamiętanych.
+#  Pełny odczyt arkusza robimy tylko, gdy zmieni się liczba wierszy, przy
+#  "Odśwież bazę" oraz co FULL_SYNC_EVERY synchronizacji (łapie ręczne edycje
+#  tekstu w arkuszu, które nie ruszyły ani tytułu, ani Rev).
+#
+#  Zapisy komórek trafiają najpierw do kolejki (write-behind): lokalna kopia jest
+#  zmieniana od razu, a arkusz dostaje wszystkie oczekujące komórki jednym
+#  batch_update po FLUSH_DELAY sekundach albo po przekroczeniu MAX_PENDING_CELLS.
+#  Kolejne zapisy tej samej komórki nadpisują się w kolejce, więc do arkusza
+#  idzie tylko ostatnia wartość. Wartości idą jako USER_ENTERED (jak dawny pełny
+#  zapis wiersza z raw=False); Rev dostaje apostrof, żeby skrót został tekstem.
+#
+#  Opcjonalny wątek w tle (start_background) co kilkadziesiąt sekund robi
+#  synchronizację przyrostową; `revision` rośnie przy każdej zmianie lokalnej
+#  kopii, więc sesje sprawdzają jedną liczbą, czy mają coś do uzgodnienia.
+#
+#  Zamiast arkusza można podać funkcję, która go otwiera — połączenie powstaje
+#  wtedy dopiero przy pierwszym użyciu (np. w wątku w tle), a aplikacja może
+#  w tym czasie pokazywać katalog z migawki na dysku. `loaded` mówi, czy kopia
+#  arkusza została już choć raz wczytana.
+#
+#  Sparsowane wiersze są pamiętane pod skrótem komórek A:E (row_rev), więc pełny
+#  odczyt parsuje ponownie tylko wiersze, których treść się zmieniła.
+#
+#  Dwie blokady: `io_lock` szereguje rozmowy z arkuszem (synchronizacja, zapis,
+#  dodanie/usunięcie wiersza — numery wierszy nie zmieniają się w trakcie), a `lock`
+#  chroni tylko lokalną kopię i jest brany na chwilę, żeby podmienić wyniki.
+#  snapshot() i status() biorą wyłącznie `lock`, więc nie czekają na sieć.
+
+_MISSING = object()
+
+DATA_COLS = "ABCDE"
+REV_COL = "F"
+REV_HEADER = "Rev"
+
+
+SPREADSHEET_KEY = "1RG82ZtUZfNsOjXI7xHKDnwbnDUl2SwE5oDLMNJNYdkw"
+WORKSHEET = "Songs"
+
+
+def open_worksheet(service_account_info):
+    """Otwiera arkusz "Songs"; wywoływane dopiero przy pierwszym użyciu (także z wątku w tle)."""
+    creds = Credentials.from_service_account_info(
+        service_account_info,
+        scopes=["https://www.googleapis.com/auth/spreadsheets"],
+    )
+    client = gspread.authorize(creds)
+    return client.open_by_key(SPREADSHEET_KEY).worksheet(WORKSHEET)
+
+
+def load_service_account(credentials):
+    """Dane konta serwisowego dla skryptów: z secrets.toml ([gcp_service_account]) albo z pliku JSON."""
+    if credentials.endswith(".toml"):
+        import tomllib
+        with open(credentials, "rb") as f:
+            return tomllib.load(f)["gcp_service_account"]
+    with open(credentials, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def row_rev(values):
+    """Krótki skrót treści A:E wiersza."""
+    return hashlib.sha1("\x1f".join(values).encode("utf-8")).hexdigest()[:12]
+
+
+def _pad(row, n=len(DATA_COLS)):
+    row = list(row[:n])
+    return row + [""] * (n - len(row))
+
+
+def _column(value_range):
+    return [r[0] if r else "" for r in value_range]
+
+
+def _col_offset(col, offset):
+    return chr(ord(col) + offset)
+
+
+def cells_to_ranges(row_idx, cells):
+    """Komórki wiersza {kolumna: wartość} jako zakresy batch_update — sąsiednie kolumny w jednym zakresie."""
+    data = []
+    run = []
+    for col in sorted(cells):
+        if run and ord(col) != ord(run[-1]) + 1:
+            data.append({"range": f"{run[0]}{row_idx}:{run[-1]}{row_idx}", "values": [[cells[c] for c in run]]})
+            run = []
+        run.append(col)
+    if run:
+        data.append({"range": f"{run[0]}{row_idx}:{run[-1]}{row_idx}", "values": [[cells[c] for c in run]]})
+    return data
+
+
+class SheetSync(SongStorage):
+    """Zapamiętana kopia arkusza "Songs" odświeżana o same zmienione wiersze."""
+
+    SHIFTS_ROWS = True
+    FULL_SYNC_EVERY = 30
+    MAX_DELTA_FRACTION = 0.5
+    FLUSH_DELAY = 2.0
+    RETRY_DELAY = 10.0
+    MAX_PENDING_CELLS = 50
+
+    def __init__(self, ws):
+        if callable(ws):
+            self._connect, self._ws = ws, None
+        else:
+            self._connect, self._ws = None, ws
+        self.rows = []      # surowe wartości A:E, od wiersza 2
+        self.revs = []      # wartość kolumny F w arkuszu
+        self.songs = []     # sparsowane piosenki (None dla pustych wierszy)
+        self._parsed = {}       # skrót A:E → sparsowana piosenka bez "row"
+        self._parsed_prev = {}  # pamięć sprzed pełnego odczytu
+        self.pending = {}   # numer wiersza → {kolumna: wartość} czekające na zapis
+        self.lock = threading.RLock()       # lokalna kopia
+        self.io_lock = threading.RLock()    # wywołania API arkusza; zawsze przed `lock`
+        self._timer = None
+        self._since_full = None
+        self._background = None
+        self.revision = 0
+        self.stats = {"full": 0, "delta": 0, "rows_fetched": 0, "flushes": 0, "cells_written": 0, "cells_coalesced": 0,
+                      "rows_parsed": 0, "parse_hits": 0}
+        self.last_flush = {"time": None, "cells": 0, "error": None}
+        self.last_sync_error = None
+        self.loaded = False
+
+    @property
+    def ws(self):
+        if self._ws is None:
+            self._ws = self._connect()
+        return self._ws
+
+    def invalidate(self):
+        """Następna synchronizacja pobierze cały arkusz."""
+        self._since_full = None
+
+    def sync(self):
+        """Aktualna lista piosenek; z arkusza pobiera tylko to, co się zmieniło."""
+        with self.io_lock:
+            if self._since_full is None or self._since_full >= self.FULL_SYNC_EVERY or not self._delta():
+                self.flush()
+                self._full()
+        with self.lock:
+            return [s for s in self.songs if s is not None]
+
+    def snapshot(self):
+        """(revision, lista piosenek) z lokalnej kopii — bez wywołań API."""
+        with self.lock:
+            return self.revision, [s for s in self.songs if s is not None]
+
+    def start_background(self, interval):
+        """Uruchamia wątek, który co `interval` sekund dociąga zmiany z arkusza."""
+        if self._background is not None:
+            return
+        self._background = threading.Thread(target=self._background_loop, args=(interval,), daemon=True)
+        self._background.start()
+
+    def _background_loop(self, interval):
+        while True:
+            # dopóki arkusz nie został wczytany (start z migawki), nie czekamy na pierwszy odczyt
+            if self.loaded:
+                time.sleep(interval)
+            try:
+                self.sync()
+                self.last_sync_error = None
+            except Exception as e:
+                self.last_sync_error = str(e)
+                if not self.loaded:
+                    time.sleep(interval)
+
+    # ── odczyt ──
+
+    def _set_row(self, i, values, rev):
+        values = _pad(values)
+        while len(self.rows) <= i:
+            self.rows.append(_pad([]))
+            self.revs.append("")
+            self.songs.append(None)
+        if self.rows[i] != values:
+            self.revision += 1
+        self.rows[i] = values
+        self.revs[i] = rev
+        self.songs[i] = self._parse(values, i + 2)
+
+    def _parse(self, values, row_number):
+        """parse_song_row z pamięcią po skrócie komórek — niezmieniony wiersz nie jest parsowany ponownie."""
+        key = row_rev(values)
+        song = self._parsed.get(key, _MISSING)
+        if song is _MISSING:
+            song = self._parsed_prev.get(key, _MISSING)
+            if song is _MISSING:
+                song = parse_song_row(values, None)
+                self.stats["rows_parsed"] += 1
+            else:
+                self.stats["parse_hits"] += 1
+            self._parsed[key] = song
+        else:
+            self.stats["parse_hits"] += 1
+        if song is None:
+            return None
+        return {**song, "row": row_number}
+
+    def _used_rows(self):
+        n = len(self.rows)
+        while n and not self.rows[n - 1][0] and not self.revs[n - 1]:
+            n -= 1
+        return n
+
+    def _full(self):
+        values = self.ws.get_all_values()
+        header = values[0] if values else []
+        with self.lock:
+            self.rows, self.revs, self.songs = [], [], []
+            # po pełnym odczycie w pamięci zostają tylko wiersze obecne w arkuszu
+            self._parsed_prev, self._parsed = self._parsed, {}
+            self.revision += 1
+            for i, row in enumerate(values[1:]):
+                self._set_row(i, row, row[5] if len(row) > 5 else "")
+            self._parsed_prev = {}
+            # także zmiany zapisane lokalnie w trakcie pobierania
+            for row_idx, cells in self.pending.items():
+                self._apply_local(row_idx, cells)
+            self._since_full = 0
+            self.loaded = True
+            self.stats["full"] += 1
+            self.stats["rows_fetched"] += len(self.rows)
+            backfill = self._backfill_data(range(len(self.rows)), header_missing=len(header) < 6 or not header[5])
+        self._backfill(backfill)
+
+    def _delta(self):
+        """Dociąga zmienione wiersze; False, gdy struktura arkusza się zmieniła i trzeba pełnego odczytu."""
+        titles, revs = (_column(r) for r in self.ws.batch_get(["A2:A", f"{REV_COL}2:{REV_COL}"]))
+        n = max(len(titles), len(revs))
+        titles += [""] * (n - len(titles))
+        revs += [""] * (n - len(revs))
+        with self.lock:
+            if n != self._used_rows():
+                return False
+            # wiersze z kolejki są lokalnie nowsze niż w arkuszu — nie nadpisujemy ich
+            changed = [i for i in range(n) if (titles[i] != self.rows[i][0] or revs[i] != self.revs[i])
+                       and i + 2 not in self.pending]
+        if len(changed) > n * self.MAX_DELTA_FRACTION:
+            return False
+        if changed:
+            fetched = self.ws.batch_get([f"A{i + 2}:{REV_COL}{i + 2}" for i in changed])
+            with self.lock:
+                fresh = []
+                for i, value_range in zip(changed, fetched):
+                    if i + 2 in self.pending:
+                        continue    # zmieniony lokalnie w trakcie pobierania
+                    row = value_range[0] if value_range else []
+                    self._set_row(i, row, row[5] if len(row) > 5 else "")
+                    fresh.append(i)
+                self.stats["rows_fetched"] += len(changed)
+                backfill = self._backfill_data(fresh)
+            self._backfill(backfill)
+        with self.lock:
+            self._since_full += 1
+            self.stats["delta"] += 1
+        return True
+
+    def _backfill_data(self, indices, header_missing=False):
+        """Zakresy Rev do uzupełnienia w wierszach bez aktualnego skrótu (np. po ręcznej edycji); pod `lock`."""
+        data = []
+        if header_missing:
+            data.append({"range": f"{REV_COL}1", "values": [[REV_HEADER]]})
+        for i in indices:
+            # wiersz z kolejki dostanie Rev razem ze swoimi komórkami przy flush
+            if self.songs[i] is None or i + 2 in self.pending:
+                continue
+            rev = row_rev(self.rows[i])
+            if rev != self.revs[i]:
+                self.revs[i] = rev
+                data.append({"range": f"{REV_COL}{i + 2}", "values": [[rev]]})
+        return data
+
+    def _backfill(self, data):
+        if data:
+            self.ws.batch_update(data)
+
+    # ── zapis ──
+
+    def write_cells(self, row_idx, start_col, values):
+        """Zmienia komórki wiersza od kolumny `start_col`: lokalnie od razu, w arkuszu przy najbliższym flush."""
+        values = [str(v) for v in values]
+        with self.lock:
+            cells = self.pending.setdefault(row_idx, {})
+            for offset, v in enumerate(values):
+                col = _col_offset(start_col, offset)
+                if col in cells:
+                    self.stats["cells_coalesced"] += 1
+                cells[col] = v
+            self._apply_local(row_idx, cells)
+            full = sum(len(c) for c in self.pending.values()) >= self.MAX_PENDING_CELLS
+            if not full:
+                self._schedule(self.FLUSH_DELAY)
+        if full:
+            self.flush()
+
+    def _apply_local(self, row_idx, cells):
+        i = row_idx - 2
+        if 0 <= i < len(self.rows):
+            row = list(self.rows[i])
+            for col, v in cells.items():
+                row[DATA_COLS.index(col)] = v
+            self._set_row(i, row, row_rev(row))
+
+    def _schedule(self, delay):
+        if self._timer is None:
+            self._timer = threading.Timer(delay, self._timer_flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _timer_flush(self):
+        with self.lock:
+            if self._timer is threading.current_thread():
+                self._timer = None
+        self.flush()
+
+    def flush(self):
+        """Wysyła całą kolejkę jednym batch_update; przy błędzie zmiany wracają do kolejki.
+
+        Kolejka jest przejmowana pod `lock`, a wysyłana już bez niego — zapisy z UI
+        w tym czasie trafiają do nowej kolejki.
+        """
+        with self.io_lock:
+            with self.lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                if not self.pending:
+                    return True
+                batch, self.pending = self.pending, {}
+                data = []
+                n_cells = 0
+                for row_idx, cells in sorted(batch.items()):
+                    i = row_idx - 2
+                    cells = dict(cells)
+                    rev = self.revs[i] if 0 <= i < len(self.revs) else ""
+                    cells[REV_COL] = f"'{rev}" if rev else ""
+                    data.extend(cells_to_ranges(row_idx, cells))
+                    n_cells += len(cells)
+            try:
+                self.ws.batch_update(data, value_input_option="USER_ENTERED")
+            except Exception as e:
+                with self.lock:
+                    for row_idx, cells in batch.items():
+                        newer = self.pending.get(row_idx, {})
+                        self.pending[row_idx] = {**cells, **newer}
+                    self.last_flush = {"time": time.time(), "cells": 0, "error": str(e)}
+                    self._schedule(self.RETRY_DELAY)
+                return False
+            with self.lock:
+                self.stats["flushes"] += 1
+                self.stats["cells_written"] += n_cells
+                self.last_flush = {"time": time.time(), "cells": n_cells, "error": None}
+            return True
+
+    def status(self):
+        """Stan kolejki zapisów dla UI."""
+        with self.lock:
+            return {"pending": sum(len(c) for c in self.pending.values()), **self.last_flush}
+
+    def _flush_before_reshape(self):
+        # numery wierszy w kolejce przestałyby się zgadzać po dodaniu/usunięciu wiersza
+        if not self.flush():
+            raise RuntimeError(f"nie udało się zapisać oczekujących zmian: {self.last_flush['error']}")
+
+    def append_row(self, values):
+        """Dopisuje wiersz za ostatnim zajętym; zwraca jego numer."""
+        values = [str(v) for v in values]
+        rev = row_rev(_pad(values))
+        with self.io_lock:
+            self._flush_before_reshape()
+            self.ws.append_row(values + [rev])
+            with self.lock:
+                i = self._used_rows()
+                self._set_row(i, values, rev)
+                return i + 2
+
+    def delete_row(self, row_idx):
+        with self.io_lock:
+            self._flush_before_reshape()
+            self.ws.delete_rows(row_idx)
+            with self.lock:
+                i = row_idx - 2
+                if 0 <= i < len(self.rows):
+                    del self.rows[i], self.revs[i], self.songs[i]
+                    self.revision += 1
+                    for j in range(i, len(self.songs)):
+                        if self.songs[j] is not None:
+                            self.songs[j] = {**self.songs[j], "row": j + 2}
+                # zapisy z UI w trakcie usuwania mają numery sprzed przesunięcia
+                self.pending = {r - 1 if r > row_idx else r: c for r, c in self.pending.items() if r != row_idx}
+
+    # ── interfejs SongStorage ──
+
+    def load(self):
+        return self.sync()
+
+    def get(self, row):
+        with self.lock:
+            i = row - 2
+            return self.songs[i] if 0 <= i < len(self.songs) else None
+
+    def update_ratings(self, row, ratings_sum, ratings_count):
+        self.write_cells(row, "C", [ratings_sum, ratings_count])
+
+    def update_tags(self, row, tags):
+        self.write_cells(row, "E", [", ".join(tags)])
+
+    def upsert(self, song, row=None):
+        values = song_to_row(song["title"], song["lyrics"], song.get("ratings_sum", 0),
+                             song.get("ratings_count", 0), song.get("tags", []))
+        if row is None:
+            return self.append_row(values)
+        self.write_cells(row, "A", values)
+        return row
+
+    def delete(self, row):
+        self.delete_row(row)
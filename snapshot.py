@@ -0,0 +1,96 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+# ─────────────────────────────────────────────
+#  MIGAWKA KATALOGU NA DYSKU
+# ─────────────────────────────────────────────
+#
+#  Ostatni dobry, sparsowany katalog zapisany obok songs.json. Przy zimnym starcie
+#  aplikacja rysuje pierwszą stronę z migawki, a arkusz sprawdza w tle; gdy arkusz
+#  jest nieosiągalny, migawka służy jako baza w trybie offline.
+#
+#  Plik ma numer schematu i skrót treści — migawka z innym schematem albo
+#  z niezgodnym skrótem (ucięty zapis, ręczna edycja) jest ignorowana.
+
+SCHEMA_VERSION = 2
+
+
+def _canonical(songs):
+    return json.dumps(songs, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+
+def songs_hash(songs):
+    """Skrót treści listy piosenek, niezależny od kolejności kluczy i formatowania."""
+    return hashlib.sha1(_canonical(songs).encode("utf-8")).hexdigest()
+
+
+def load_snapshot(path):
+    """(piosenki, metadane) z migawki albo (None, None), gdy pliku brak lub jest nieważny."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None, None
+    if not isinstance(data, dict) or data.get("schema") != SCHEMA_VERSION:
+        return None, None
+    songs = data.get("songs")
+    if not isinstance(songs, list) or songs_hash(songs) != data.get("hash"):
+        return None, None
+    return songs, {"hash": data["hash"], "saved": data.get("saved")}
+
+
+def save_snapshot(path, songs):
+    """Zapisuje migawkę atomowo (plik tymczasowy + rename); zwraca skrót treści."""
+    digest = songs_hash(songs)
+    data = {"schema": SCHEMA_VERSION, "hash": digest, "saved": time.time(), "songs": songs}
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+    return digest
+
+
+class SnapshotStore:
+    """Migawka jednego pliku: odczyt przy starcie, zapis co najwyżej raz na MIN_INTERVAL sekund.
+
+    Zapis jest pomijany, gdy skrót treści nie zmienił się od ostatniego zapisu.
+    """
+
+    MIN_INTERVAL = 30.0
+
+    def __init__(self, path):
+        self.path = path
+        self.hash = None
+        self.saved = None
+        self.version = None
+        self._last_try = 0.0
+        self.lock = threading.Lock()
+
+    def load(self):
+        songs, meta = load_snapshot(self.path)
+        if songs is not None:
+            self.hash = meta["hash"]
+            self.saved = meta["saved"]
+        return songs
+
+    def save(self, songs, version=None):
+        with self.lock:
+            self._last_try = time.time()
+            self.version = version
+            if songs_hash(songs) == self.hash:
+                return False
+            try:
+                self.hash = save_snapshot(self.path, songs)
+            except OSError:
+                return False
+            self.saved = time.time()
+            return True
+
+    def maybe_save(self, version, get_songs):
+        """Zapisuje, jeśli katalog ma nową wersję, a od ostatniej próby minęło MIN_INTERVAL."""
+        if version == self.version or time.time() - self._last_try < self.MIN_INTERVAL:
+            return False
+        return self.save(get_songs(), version)
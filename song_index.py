@@ -0,0 +1,387 @@
+import heapq
+import math
+import re
+from bisect import bisect_left
+from collections import Counter
+
+# ─────────────────────────────────────────────
+#  INDEKS ODWROTNY SŁÓW (tytuły + tekst)
+# ─────────────────────────────────────────────
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Dzieli tekst na małe słowa — ta sama definicja słowa co w chmurach (\\w+)."""
+    return _WORD_RE.findall(text.lower())
+
+
+def _song_words(song, field):
+    if field == "title":
+        return tokenize(song["title"])
+    words = []
+    for l in song["lyrics"]:
+        words.extend(tokenize(l["text"]))
+    return words
+
+
+class WordIndex:
+    """Indeks odwrotny: słowo → zbiór id piosenek, osobno dla tytułów i tekstu.
+
+    Służy chmurom słów (piosenki ze słowem zaczynającym się od klikniętego);
+    wyszukiwanie z rankingiem jest w search_engine.SearchEngine.
+    """
+
+    FIELDS = ("title", "lyrics")
+
+    def __init__(self):
+        self.postings = {f: {} for f in self.FIELDS}
+        self._vocab = {f: None for f in self.FIELDS}
+
+    @classmethod
+    def from_songs(cls, songs):
+        idx = cls()
+        for sid, s in songs.items():
+            idx.add_song(sid, s)
+        return idx
+
+    def add_song(self, sid, song):
+        for field in self.FIELDS:
+            postings = self.postings[field]
+            for w in set(_song_words(song, field)):
+                postings.setdefault(w, set()).add(sid)
+            self._vocab[field] = None
+
+    def remove_song(self, sid, song):
+        for field in self.FIELDS:
+            postings = self.postings[field]
+            for w in set(_song_words(song, field)):
+                docs = postings.get(w)
+                if docs and sid in docs:
+                    docs.discard(sid)
+                    if not docs:
+                        del postings[w]
+            self._vocab[field] = None
+
+    # ── zapytania ──
+
+    def _sorted_vocab(self, field):
+        if self._vocab[field] is None:
+            self._vocab[field] = sorted(self.postings[field])
+        return self._vocab[field]
+
+    def lookup_prefix(self, prefix, field="lyrics"):
+        """Posortowane id piosenek zawierających słowo zaczynające się od `prefix`."""
+        prefix = prefix.lower()
+        vocab = self._sorted_vocab(field)
+        postings = self.postings[field]
+        found = set()
+        i = bisect_left(vocab, prefix)
+        while i < len(vocab) and vocab[i].startswith(prefix):
+            found |= postings[vocab[i]]
+            i += 1
+        return sorted(found)
+
+
+# ─────────────────────────────────────────────
+#  STATYSTYKI SŁÓW (chmury słów)
+# ─────────────────────────────────────────────
+
+STOPWORDS = {"się","i","w","z","na","do","że","o","a","to","jak","nie","co","mnie","mi","ci","za","ale","bo","jest","tylko","przez","jeszcze","kiedy","już","dla","od","ten","ta"}
+
+
+class TermStats:
+    """Częstości słów w korpusie: wektor słów każdej piosenki liczony raz, sumy aktualizowane różnicą.
+
+    Dla każdego pola trzymane są: liczba wystąpień słowa w całym śpiewniku (cf),
+    liczba piosenek, w których występuje (df), i suma 1 + ln(tf) po piosenkach.
+    Ranking do chmury jest liczony leniwie i pamiętany do następnej zmiany.
+    Waga "tfidf" obniża słowa obecne w większości piosenek — przerywniki, których
+    nie ma na liście STOPWORDS.
+    """
+
+    FIELDS = ("title", "lyrics")
+    MIN_LEN = 4
+
+    def __init__(self, stopwords=STOPWORDS):
+        self.stopwords = frozenset(stopwords)
+        self.vectors = {}       # id → (tytuł, tekst, {pole: Counter})
+        self.cf = {f: Counter() for f in self.FIELDS}
+        self.df = {f: Counter() for f in self.FIELDS}
+        self.log_tf = {f: {} for f in self.FIELDS}
+        self._ranked = {}
+
+    @classmethod
+    def from_songs(cls, songs, previous=None):
+        """Statystyki katalogu; wektory niezmienionych piosenek są brane z `previous`."""
+        stats = cls() if previous is None else cls(previous.stopwords)
+        for sid, s in songs.items():
+            old = previous.vectors.get(sid) if previous is not None else None
+            if old is not None and old[0] is s["title"] and old[1] is s["lyrics"]:
+                stats._add_vector(sid, old)
+            else:
+                stats.add_song(sid, s)
+        return stats
+
+    def _terms(self, song, field):
+        if field == "lyrics":
+            # linie z <br> to pozostałości konwersji z Worda — chmura słów zawsze je pomijała
+            song = {"lyrics": [l for l in song["lyrics"] if "<br>" not in l["text"]]}
+        return Counter(w for w in _song_words(song, field)
+                       if len(w) >= self.MIN_LEN and w not in self.stopwords)
+
+    def _add_vector(self, sid, vector):
+        self.vectors[sid] = vector
+        for field, counts in vector[2].items():
+            cf, df, log_tf = self.cf[field], self.df[field], self.log_tf[field]
+            for w, n in counts.items():
+                cf[w] += n
+                df[w] += 1
+                log_tf[w] = log_tf.get(w, 0.0) + 1.0 + math.log(n)
+        self._ranked.clear()
+
+    def add_song(self, sid, song):
+        self._add_vector(sid, (song["title"], song["lyrics"], {f: self._terms(song, f) for f in self.FIELDS}))
+
+    def remove_song(self, sid, song=None):
+        vector = self.vectors.pop(sid, None)
+        if vector is None:
+            return
+        for field, counts in vector[2].items():
+            cf, df, log_tf = self.cf[field], self.df[field], self.log_tf[field]
+            for w, n in counts.items():
+                df[w] -= 1
+                if df[w] <= 0:
+                    del cf[w], df[w], log_tf[w]
+                else:
+                    cf[w] -= n
+                    log_tf[w] -= 1.0 + math.log(n)
+        self._ranked.clear()
+
+    # ── zapytania ──
+
+    def _scores(self, field, weighting):
+        if weighting == "count":
+            return self.cf[field]
+        n_docs = len(self.vectors)
+        df = self.df[field]
+        return {w: s * math.log((1 + n_docs) / (1 + df[w])) for w, s in self.log_tf[field].items()}
+
+    def top(self, field="lyrics", limit=40, weighting="count"):
+        """Lista (słowo, liczba wystąpień) najważniejszych słów pola, od najważniejszego.
+
+        `weighting`: "count" — po liczbie wystąpień, "tfidf" — po wadze TF-IDF.
+        """
+        key = (field, weighting, limit)
+        ranked = self._ranked.get(key)
+        if ranked is None:
+            scores = self._scores(field, weighting)
+            cf = self.cf[field]
+            best = heapq.nlargest(limit, scores, key=lambda w: (scores[w], cf[w]))
+            ranked = self._ranked[key] = [(w, cf[w]) for w in best]
+        return ranked
+
+
+# ─────────────────────────────────────────────
+#  INDEKS TAGÓW
+# ─────────────────────────────────────────────
+
+class TagIndex:
+    """Tag → posortowana lista id piosenek, aktualizowana przy każdym dodaniu/usunięciu tagu.
+
+    Ranking i alfabetyczna lista tagów są liczone leniwie i trzymane do następnej zmiany,
+    więc zwykły rerun nie przechodzi po piosenkach.
+    """
+
+    def __init__(self):
+        self.postings = {}
+        self._ranked = None
+        self._sorted = None
+
+    @classmethod
+    def from_songs(cls, songs):
+        idx = cls()
+        for sid, s in songs.items():
+            idx.add_song(sid, s)
+        return idx
+
+    def _changed(self):
+        self._ranked = None
+        self._sorted = None
+
+    def add_tag(self, sid, tag):
+        ids = self.postings.setdefault(tag, [])
+        i = bisect_left(ids, sid)
+        if i == len(ids) or ids[i] != sid:
+            ids.insert(i, sid)
+            self._changed()
+
+    def remove_tag(self, sid, tag):
+        ids = self.postings.get(tag)
+        if not ids:
+            return
+        i = bisect_left(ids, sid)
+        if i < len(ids) and ids[i] == sid:
+            del ids[i]
+            if not ids:
+                del self.postings[tag]
+            self._changed()
+
+    def add_song(self, sid, song):
+        for t in song.get("tags", []):
+            self.add_tag(sid, t)
+
+    def remove_song(self, sid, song):
+        for t in song.get("tags", []):
+            self.remove_tag(sid, t)
+
+    def set_tags(self, sid, old_tags, new_tags):
+        """Aktualizuje indeks o różnicę między starą a nową listą tagów piosenki."""
+        old, new = set(old_tags), set(new_tags)
+        for t in old - new:
+            self.remove_tag(sid, t)
+        for t in new - old:
+            self.add_tag(sid, t)
+
+    # ── zapytania ──
+
+    def songs_with(self, tag):
+        """Posortowane id piosenek z tagiem (kopia — bezpieczna jako playlista)."""
+        return list(self.postings.get(tag, ()))
+
+    def count(self, tag):
+        return len(self.postings.get(tag, ()))
+
+    def most_common(self, limit=None):
+        """Lista (tag, liczba piosenek) od najpopularniejszego."""
+        if self._ranked is None:
+            self._ranked = sorted(((t, len(ids)) for t, ids in self.postings.items()), key=lambda x: (-x[1], x[0]))
+        return self._ranked[:limit] if limit else self._ranked
+
+    def all_tags(self):
+        if self._sorted is None:
+            self._sorted = sorted(self.postings)
+        return self._sorted
+
+    def __bool__(self):
+        return bool(self.postings)
+
+
+# ─────────────────────────────────────────────
+#  PODOBIEŃSTWO PO TAGACH
+# ─────────────────────────────────────────────
+
+def _popcount(mask):
+    return bin(mask).count("1")
+
+
+if hasattr(int, "bit_count"):
+    _popcount = int.bit_count
+
+
+def _bits(mask):
+    """Numery ustawionych bitów maski."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class TagNeighbours:
+    """Piosenki podobne po tagach: zbiór tagów jako maska bitowa, podobieństwo Jaccarda.
+
+    Lista K najbliższych sąsiadów piosenki jest liczona przy pierwszym odczycie
+    i pamiętana. Zmiana tagów jednej piosenki poprawia tylko listy piosenek, które
+    mają z nią wspólny tag: nowy wpis jest wstawiany, a lista, z której piosenka
+    mogła wypaść, jest liczona od nowa przy następnym odczycie.
+    """
+
+    K = 20
+
+    def __init__(self):
+        self.bits = {}          # tag → numer bitu
+        self.masks = {}         # id → maska tagów
+        self.members = {}       # numer bitu → id piosenek z tym tagiem
+        self.neighbours = {}    # id → [(podobieństwo, wspólne tagi, -id)] malejąco
+
+    @classmethod
+    def from_songs(cls, songs):
+        idx = cls()
+        for sid, s in songs.items():
+            idx.add_song(sid, s)
+        return idx
+
+    def mask(self, tags):
+        """Maska bitowa zbioru tagów; nieznane tagi dostają nowe bity."""
+        mask = 0
+        for t in tags:
+            bit = self.bits.get(t)
+            if bit is None:
+                bit = self.bits[t] = len(self.bits)
+            mask |= 1 << bit
+        return mask
+
+    def _candidates(self, mask):
+        found = set()
+        for bit in _bits(mask):
+            found |= self.members.get(bit, set())
+        return found
+
+    def _entry(self, mask, sid):
+        other = self.masks[sid]
+        common = _popcount(mask & other)
+        return common / _popcount(mask | other), common, -sid
+
+    def add_song(self, sid, song):
+        mask = self.mask(song.get("tags", []))
+        self.masks[sid] = mask
+        for bit in _bits(mask):
+            self.members.setdefault(bit, set()).add(sid)
+        for other in self._candidates(mask):
+            ranked = self.neighbours.get(other)
+            if other == sid or ranked is None:
+                continue
+            entry = self._entry(self.masks[other], sid)
+            if len(ranked) < self.K or entry > ranked[-1]:
+                ranked.append(entry)
+                ranked.sort(reverse=True)
+                del ranked[self.K:]
+
+    def remove_song(self, sid, song=None):
+        mask = self.masks.pop(sid, 0)
+        self.neighbours.pop(sid, None)
+        for bit in _bits(mask):
+            ids = self.members[bit]
+            ids.discard(sid)
+            if not ids:
+                del self.members[bit]
+        for other in self._candidates(mask):
+            ranked = self.neighbours.get(other)
+            if ranked is not None and any(e[2] == -sid for e in ranked):
+                del self.neighbours[other]
+
+    def set_tags(self, sid, tags):
+        self.remove_song(sid)
+        self.add_song(sid, {"tags": tags})
+
+    # ── zapytania ──
+
+    def query(self, tags, k=K, exclude=None):
+        """Doraźne zapytanie: k piosenek najbliższych zbiorowi tagów (kopiec, bez pamięci)."""
+        if isinstance(tags, int):
+            mask = tags
+        else:
+            mask = sum(1 << self.bits[t] for t in set(tags) if t in self.bits)
+        entries = (self._entry(mask, other) for other in self._candidates(mask) if other != exclude)
+        return [(-e[2], e[0]) for e in heapq.nlargest(k, entries)]
+
+    def similar(self, sid, k=K):
+        """Lista (id, podobieństwo) piosenek najbliższych piosence `sid`, od najbliższej."""
+        mask = self.masks.get(sid, 0)
+        if k > self.K:
+            return self.query(mask, k, exclude=sid)
+        ranked = self.neighbours.get(sid)
+        if ranked is None:
+            entries = (self._entry(mask, other) for other in self._candidates(mask) if other != sid)
+            ranked = self.neighbours[sid] = heapq.nlargest(self.K, entries)
+        return [(-e[2], e[0]) for e in ranked[:k]]
@@ -0,0 +1,324 @@
+import contextlib
+import copy
+import json
+import mmap
+import os
+import shutil
+import sys
+import time
+
+from journal import COMPACT_BYTES, Journal, JournaledStore, file_lock, journal_path_for
+
+# ─────────────────────────────────────────────
+#  SPAKOWANY ŚPIEWNIK (dane + indeks przesunięć)
+# ─────────────────────────────────────────────
+#
+#  songs.pack — piosenki jako zwarte rekordy JSON, jedna na linię, a za nimi
+#  indeks: linia JSON z listą [tytuł, przesunięcie, długość] dla każdej piosenki
+#  i numerem generacji pliku, oraz ostatnia linia z przesunięciem tego indeksu.
+#
+#  Plik jest otwierany przez mmap, więc lista tytułów pochodzi z samego indeksu,
+#  a dekodowana jest tylko piosenka, którą akurat pokazujemy. Dane i indeks są
+#  w jednym pliku zapisywanym obok i podmienianym przez os.replace, więc czytelnik
+#  zawsze widzi albo całą starą, albo całą nową wersję.
+#
+#  Konwersja z/do songs.json:
+#      python songbook.py pack songs.json            # → songs.pack
+#      python songbook.py unpack songs.pack out.json
+#
+#  Gdy songs.json jest nowszy od paczki ze zmianami z aplikacji (w dzienniku albo
+#  już skompaktowanymi), paczka jest budowana od nowa, ale stara paczka i dziennik
+#  zostają jako songs-<data>.pack / songs-<data>.journal — do odzyskania przez unpack.
+
+FORMAT = 2
+
+
+def write_packed(songs, pack_path, generation=0, edited=False):
+    """Zapisuje listę piosenek jako plik danych z indeksem; zwraca liczbę piosenek.
+
+    `edited` oznacza paczkę z kompakcji, czyli zawierającą zmiany spoza songs.json.
+    """
+    entries = []
+    offset = 0
+    tmp = f"{pack_path}.tmp"
+    with open(tmp, "wb") as f:
+        for song in songs:
+            record = json.dumps(song, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            f.write(record + b"\n")
+            entries.append([song.get("title", ""), offset, len(record)])
+            offset += len(record) + 1
+        index = {"format": FORMAT, "generation": generation, "edited": edited, "songs": entries}
+        f.write(json.dumps(index, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n")
+        f.write(b"%d\n" % offset)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, pack_path)
+    return len(entries)
+
+
+class PackedSongbook:
+    """Śpiewnik tylko do odczytu: tytuły z indeksu, piosenki dekodowane z mmap na żądanie."""
+
+    def __init__(self, pack_path):
+        self.pack_path = pack_path
+        self._file = open(pack_path, "rb")
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            tail = self._mm.rfind(b"\n", 0, len(self._mm) - 1) + 1
+            start = int(self._mm[tail:])
+            index = json.loads(self._mm[start:tail - 1])
+        except ValueError:
+            self.close()
+            raise ValueError(f"Uszkodzony plik śpiewnika: {pack_path}")
+        if index.get("format") != FORMAT:
+            self.close()
+            raise ValueError(f"Nieznany format śpiewnika: {index.get('format')!r}")
+        self.generation = index["generation"]
+        self.edited = index.get("edited", False)
+        self.entries = index["songs"]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def title(self, i):
+        return self.entries[i][0]
+
+    def titles(self):
+        return [e[0] for e in self.entries]
+
+    def get(self, i):
+        """Piosenka nr i, zdekodowana z pliku danych."""
+        _, offset, length = self.entries[i]
+        return json.loads(self._mm[offset:offset + length])
+
+    def __iter__(self):
+        for i in range(len(self.entries)):
+            yield self.get(i)
+
+    def close(self):
+        if getattr(self, "_mm", None) is not None:
+            self._mm.close()
+            self._mm = None
+        self._file.close()
+
+
+# ─────────────────────────────────────────────
+#  ŚPIEWNIK Z DZIENNIKIEM ZMIAN
+# ─────────────────────────────────────────────
+
+class SongbookStore(JournaledStore):
+    """Spakowany śpiewnik + dziennik zmian (songs.journal): edycja, dodanie i usunięcie
+    dopisują jeden rekord, a nie przepisują całego pliku.
+
+    Operacje odwołują się do pozycji piosenek, więc nie są idempotentne — dziennik
+    jest odtwarzany tylko na bazie o generacji z jego nagłówka. Pozycja widziana
+    przez sesję mogła się przesunąć przez zmiany innych procesów, dlatego put()
+    i delete() przyjmują też tytuł i szukają po nim, gdy pozycja już nie pasuje.
+    """
+
+    def __init__(self, pack_path, compact_bytes=COMPACT_BYTES):
+        self.base = None
+        super().__init__(pack_path, journal_path_for(pack_path), compact_bytes)
+
+    @property
+    def generation(self):
+        return self.base.generation
+
+    def _load_base(self):
+        self.base = PackedSongbook(self.path)
+        self.slots = list(range(len(self.base)))    # numer piosenki w bazie albo piosenka z dziennika
+        self._titles = self.base.titles()
+        self._keys = [(self.generation, n) for n in range(len(self.base))]
+        self._replayed = 0
+
+    def _close_base(self):
+        # stary mmap zamykamy przed podmianą pliku (Windows nie podmieni otwartego pliku)
+        if self.base is not None:
+            self.base.close()
+
+    def _write_base(self):
+        songs = list(self)
+        self._close_base()
+        try:
+            write_packed(songs, self.path, self.generation + 1, edited=True)
+        except OSError:
+            self.base = PackedSongbook(self.path)
+            raise
+        self._load_base()
+
+    def _apply(self, record):
+        op = record["op"]
+        # k-ty rekord dziennika danej generacji jest ten sam w każdym procesie
+        self._replayed += 1
+        key = (self.generation, "j", self._replayed)
+        if op == "put":
+            self.slots[record["i"]] = record["song"]
+            self._titles[record["i"]] = record["song"].get("title", "")
+            self._keys[record["i"]] = key
+        elif op == "add":
+            self.slots.append(record["song"])
+            self._titles.append(record["song"].get("title", ""))
+            self._keys.append(key)
+        elif op == "del":
+            del self.slots[record["i"]]
+            del self._titles[record["i"]]
+            del self._keys[record["i"]]
+
+    def _locate(self, i, title):
+        """Aktualna pozycja piosenki widzianej pod `i` z tytułem `title` (IndexError, gdy jej nie ma)."""
+        if title is None or (0 <= i < len(self._titles) and self._titles[i] == title):
+            self.slots[i]
+            return i
+        try:
+            return self._titles.index(title)
+        except ValueError:
+            raise IndexError(f"Nie ma już piosenki {title!r}")
+
+    def __len__(self):
+        return len(self.slots)
+
+    def titles(self):
+        """Tytuły wszystkich piosenek (lista tylko do odczytu)."""
+        return self._titles
+
+    def keys(self):
+        """Klucz piosenki na każdej pozycji (lista tylko do odczytu); zmienia się tylko razem z piosenką.
+
+        Pozwala aktualizować pochodne struktury (np. statystyki słów) o samą różnicę.
+        """
+        return self._keys
+
+    def get(self, i):
+        with self.lock:
+            slot = self.slots[i]
+            return self.base.get(slot) if isinstance(slot, int) else copy.deepcopy(slot)
+
+    def __iter__(self):
+        for i in range(len(self.slots)):
+            yield self.get(i)
+
+    def put(self, i, song, title=None):
+        self._write(lambda: {"op": "put", "i": self._locate(i, title), "song": song})
+
+    def add(self, song):
+        self._write(lambda: {"op": "add", "song": song})
+
+    def delete(self, i, title=None):
+        self._write(lambda: {"op": "del", "i": self._locate(i, title)})
+
+    def close(self):
+        with self.lock:
+            self._close_base()
+
+
+# ─────────────────────────────────────────────
+#  KONWERSJA Z/DO songs.json
+# ─────────────────────────────────────────────
+
+def _replace_songbook(songs, pack_path):
+    generation = 0
+    if os.path.exists(pack_path):
+        try:
+            old = PackedSongbook(pack_path)
+            generation = old.generation + 1
+            old.close()
+        except ValueError:
+            pass
+    count = write_packed(songs, pack_path, generation)
+    Journal(journal_path_for(pack_path)).reset(generation)
+    return count
+
+
+def pack_songs(songs, pack_path):
+    """Nowy śpiewnik z listy piosenek; dziennik poprzedniej paczki przestaje obowiązywać."""
+    with file_lock(pack_path):
+        return _replace_songbook(songs, pack_path)
+
+
+def pack_json(json_path, pack_path):
+    with open(json_path, "r", encoding="utf-8") as f:
+        return pack_songs(json.load(f), pack_path)
+
+
+def has_offline_edits(pack_path):
+    """Czy paczka zawiera zmiany spoza songs.json — w dzienniku albo już skompaktowane."""
+    try:
+        book = PackedSongbook(pack_path)
+    except (OSError, ValueError):
+        return False
+    try:
+        return book.edited or bool(Journal(journal_path_for(pack_path)).read(book.generation))
+    finally:
+        book.close()
+
+
+def backup_songbook(pack_path):
+    """Kopia paczki i dziennika z datą w nazwie (songs-<data>.pack); zwraca ścieżkę kopii paczki."""
+    root, ext = os.path.splitext(pack_path)
+    backup = f"{root}-{time.strftime('%Y%m%d-%H%M%S')}{ext}"
+    shutil.copy2(pack_path, backup)
+    if os.path.exists(journal_path_for(pack_path)):
+        shutil.copy2(journal_path_for(pack_path), journal_path_for(backup))
+    return backup
+
+
+def ensure_packed(json_path, pack_path, store=None):
+    """Buduje paczkę z songs.json, gdy jej nie ma albo songs.json jest nowszy — jeden proces naraz.
+
+    Zwraca ścieżkę kopii starej paczki, gdy przebudowa zastąpiła zmiany z aplikacji, inaczej None.
+    `store` to otwarty SongbookStore tej paczki — na czas przebudowy jego mmap jest zamykany
+    (Windows nie podmieni zmapowanego pliku), a potem paczka jest wczytywana od nowa.
+    """
+    if not is_stale(json_path, pack_path):
+        return None
+    with store.lock if store is not None else contextlib.nullcontext(), file_lock(pack_path):
+        if not is_stale(json_path, pack_path):
+            return None
+        songs = []
+        if os.path.exists(json_path):
+            with open(json_path, "r", encoding="utf-8") as f:
+                songs = json.load(f)
+        backup = backup_songbook(pack_path) if has_offline_edits(pack_path) else None
+        if store is not None:
+            store._close_base()
+        try:
+            _replace_songbook(songs, pack_path)
+        finally:
+            if store is not None:
+                store._load()
+        return backup
+
+
+def unpack_json(pack_path, json_path):
+    """Eksport do songs.json, razem ze zmianami z dziennika."""
+    book = SongbookStore(pack_path)
+    try:
+        songs = list(book)
+    finally:
+        book.close()
+    tmp = f"{json_path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(songs, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, json_path)
+    return len(songs)
+
+
+def is_stale(json_path, pack_path):
+    """Czy songs.json jest nowszy od spakowanego śpiewnika (albo paczki jeszcze nie ma)."""
+    if not os.path.exists(pack_path):
+        return True
+    return os.path.exists(json_path) and os.path.getmtime(json_path) > os.path.getmtime(pack_path)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in ("pack", "unpack"):
+        print("Użycie: python songbook.py pack songs.json [songs.pack] | unpack songs.pack [songs.json]")
+        sys.exit(1)
+    if sys.argv[1] == "pack":
+        src = sys.argv[2]
+        dst = sys.argv[3] if len(sys.argv) > 3 else os.path.splitext(src)[0] + ".pack"
+        print(f"Zapisano {pack_json(src, dst)} piosenek do {dst}")
+    else:
+        src = sys.argv[2]
+        dst = sys.argv[3] if len(sys.argv) > 3 else os.path.splitext(src)[0] + ".json"
+        print(f"Zapisano {unpack_json(src, dst)} piosenek do {dst}")
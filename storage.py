@@ -0,0 +1,222 @@
+import json
+import sqlite3
+import threading
+
+from catalog import make_song, parse_song_row, song_to_row
+
+# ─────────────────────────────────────────────
+#  MAGAZYN PIOSENEK (interfejs + SQLite)
+# ─────────────────────────────────────────────
+#
+#  Aplikacja rozmawia z danymi tylko przez metody SongStorage. Piosenki mają pole
+#  "row" — klucz w magazynie: numer wiersza w arkuszu albo id w bazie SQLite.
+#  W arkuszu usunięcie przesuwa numery wierszy poniżej (SHIFTS_ROWS = True),
+#  w SQLite klucze są stałe.
+#
+#  `revision` rośnie przy każdej zmianie danych, a snapshot() zwraca aktualną
+#  listę piosenek bez sięgania do źródła — po nich katalog sesji wie, czy ma
+#  coś do uzgodnienia.
+
+
+class SongStorage:
+    """Wspólny interfejs magazynów: arkusz Google (SheetSync) i lokalna baza (SQLiteStorage)."""
+
+    SHIFTS_ROWS = False
+
+    revision = 0
+    loaded = True
+    last_sync_error = None
+
+    def load(self):
+        """Aktualna lista piosenek."""
+        raise NotImplementedError
+
+    def snapshot(self):
+        """(revision, lista piosenek) z pamięci."""
+        raise NotImplementedError
+
+    def get(self, row):
+        """Piosenka o kluczu `row` albo None."""
+        raise NotImplementedError
+
+    def update_ratings(self, row, ratings_sum, ratings_count):
+        raise NotImplementedError
+
+    def update_tags(self, row, tags):
+        raise NotImplementedError
+
+    def upsert(self, song, row=None):
+        """Zapisuje piosenkę (nową, gdy `row` jest None); zwraca jej klucz."""
+        raise NotImplementedError
+
+    def delete(self, row):
+        raise NotImplementedError
+
+    # ── opcjonalne: odświeżanie i kolejka zapisów ──
+
+    def invalidate(self):
+        pass
+
+    def start_background(self, interval):
+        pass
+
+    def flush(self):
+        return True
+
+    def status(self):
+        return {"pending": 0, "time": None, "cells": 0, "error": None}
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS songs (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    title         TEXT    NOT NULL,
+    lyrics        TEXT    NOT NULL,
+    ratings_sum   INTEGER NOT NULL DEFAULT 0,
+    ratings_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS songs_title ON songs(title);
+CREATE INDEX IF NOT EXISTS songs_ratings ON songs(ratings_count);
+CREATE TABLE IF NOT EXISTS song_tags (
+    song_id  INTEGER NOT NULL REFERENCES songs(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    tag      TEXT    NOT NULL,
+    PRIMARY KEY (song_id, position)
+);
+CREATE INDEX IF NOT EXISTS song_tags_tag ON song_tags(tag);
+"""
+
+
+def _normalize(song, row):
+    """Piosenka w tej samej postaci, w jakiej wraca z arkusza (format A:E tam i z powrotem)."""
+    return parse_song_row(song_to_row(song["title"], song["lyrics"], song.get("ratings_sum", 0),
+                                      song.get("ratings_count", 0), song.get("tags", [])), row)
+
+
+class SQLiteStorage(SongStorage):
+    """Piosenki w lokalnej bazie SQLite: zapis w transakcji, odczyt z kopii w pamięci.
+
+    Kopia jest przeładowywana, gdy bazę zmieni inny proces (PRAGMA data_version),
+    więc kilka procesów może pracować na jednym pliku.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(_SCHEMA)
+        self.lock = threading.RLock()
+        self.songs = {}         # id → piosenka, w kolejności id
+        self.revision = 0
+        self._data_version = None
+
+    def _changed_elsewhere(self):
+        version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        changed = version != self._data_version
+        self._data_version = version
+        return changed
+
+    def _read_all(self):
+        tags = {}
+        for song_id, tag in self.conn.execute("SELECT song_id, tag FROM song_tags ORDER BY song_id, position"):
+            tags.setdefault(song_id, []).append(tag)
+        self.songs = {}
+        for song_id, title, lyrics, r_sum, r_count in self.conn.execute(
+                "SELECT id, title, lyrics, ratings_sum, ratings_count FROM songs ORDER BY id"):
+            self.songs[song_id] = make_song(title, json.loads(lyrics), r_sum, r_count, tags.get(song_id, []), song_id)
+        self.revision += 1
+
+    def _refresh(self):
+        if self._changed_elsewhere():
+            self._read_all()
+
+    def invalidate(self):
+        with self.lock:
+            self._data_version = None
+
+    def load(self):
+        with self.lock:
+            self._refresh()
+            return list(self.songs.values())
+
+    def snapshot(self):
+        with self.lock:
+            self._refresh()
+            return self.revision, list(self.songs.values())
+
+    def get(self, row):
+        with self.lock:
+            self._refresh()
+            return self.songs.get(row)
+
+    # ── zapis ──
+
+    def _write_song(self, row, song):
+        """Zapisuje piosenkę (w transakcji wołającego); nowy wiersz, gdy `row` jest None."""
+        if row is None:
+            row = self.conn.execute("INSERT INTO songs (title, lyrics) VALUES ('', '[]')").lastrowid
+        song = _normalize(song, row)
+        self.conn.execute(
+            "UPDATE songs SET title = ?, lyrics = ?, ratings_sum = ?, ratings_count = ? WHERE id = ?",
+            (song["title"], json.dumps(song["lyrics"], ensure_ascii=False),
+             song["ratings_sum"], song["ratings_count"], row))
+        self._write_tags(row, song["tags"])
+        return song
+
+    def _write_tags(self, song_id, tags):
+        self.conn.execute("DELETE FROM song_tags WHERE song_id = ?", (song_id,))
+        self.conn.executemany("INSERT INTO song_tags (song_id, position, tag) VALUES (?, ?, ?)",
+                              [(song_id, i, t) for i, t in enumerate(tags)])
+
+    def _committed(self, song_id, song):
+        """Po udanej transakcji poprawia kopię w pamięci zamiast czytać całą bazę."""
+        self._refresh()
+        if song is None:
+            self.songs.pop(song_id, None)
+        else:
+            self.songs[song_id] = song
+        self.revision += 1
+
+    def update_ratings(self, row, ratings_sum, ratings_count):
+        ratings_sum, ratings_count = int(ratings_sum), int(ratings_count)
+        with self.lock:
+            self._refresh()
+            with self.conn:
+                self.conn.execute("UPDATE songs SET ratings_sum = ?, ratings_count = ? WHERE id = ?",
+                                  (ratings_sum, ratings_count, row))
+            self._committed(row, {**self.songs[row], "ratings_sum": ratings_sum, "ratings_count": ratings_count})
+
+    def update_tags(self, row, tags):
+        with self.lock:
+            self._refresh()
+            song = _normalize({**self.songs[row], "tags": tags}, row)
+            with self.conn:
+                self._write_tags(row, song["tags"])
+            self._committed(row, song)
+
+    def upsert(self, song, row=None):
+        with self.lock:
+            with self.conn:
+                song = self._write_song(row, song)
+            self._committed(song["row"], song)
+            return song["row"]
+
+    def delete(self, row):
+        with self.lock:
+            with self.conn:
+                self.conn.execute("DELETE FROM songs WHERE id = ?", (row,))
+            self._committed(row, None)
+
+    def import_songs(self, songs):
+        """Wgrywa listę piosenek (np. z songs.json albo migawki) jedną transakcją."""
+        with self.lock:
+            with self.conn:
+                for song in songs:
+                    self._write_song(None, song)
+            self._data_version = None
+            self._refresh()
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM songs").fetchone()[0]